@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+asyncio対応の画像クリックツール
+複数の待機を1つのキャプチャループで処理するため、条件ごとにスレッドを立てる必要がありません
+
+使用例:
+    async def main():
+        async with AsyncImageClicker(confidence=0.8) as clicker:
+            name, match = await clicker.wait_for_any(["ok.png", "cancel.png"], timeout=30)
+            if name:
+                await clicker.click(name)
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from image_clicker import ChangeTracker, ImageClicker
+from poll_scheduler import PollScheduler
+
+
+class _Waiter:
+    """wait_for_any 1回分の待機"""
+    
+    def __init__(self, image_names, future):
+        self.image_names = list(image_names)
+        self.future = future
+
+
+class AsyncImageClicker:
+    """
+    awaitで使えるImageClicker
+    
+    キャプチャと照合は1本の作業スレッドで行い、イベントループは止めません。
+    同時に待機している条件はすべて同じフレームに対して照合され、
+    画面のキャプチャはポーリング1回につき1回だけです。
+    """
+    
+    def __init__(self, clicker=None, **options):
+        """
+        Args:
+            clicker (ImageClicker): 使用するImageClicker（省略時は options から作成）
+            **options: ImageClickerの引数（confidence, capture, engine など）
+        """
+        self.clicker = clicker if clicker is not None else ImageClicker(**options)
+        # 自分で作った ImageClicker は close() で閉じる（渡されたものは呼び出し側が閉じる）
+        self._owns_clicker = clicker is None
+        self.scheduler = PollScheduler(self.clicker.scheduler.latency_target,
+                                       self.clicker.scheduler.cpu_budget)
+        self.polls = 0
+        
+        # キャプチャ・照合・クリックはすべてこの1スレッドで直列に実行する
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="image-clicker")
+        self._waiters = []
+        self._trackers = {}  # 画像ファイル名 -> ChangeTracker（同じ画像を待つ待機で共有）
+        self._loop_task = None
+        self._wakeup = None
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, *exc):
+        await self.close()
+    
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+    
+    async def locate(self, image_name, hint=None):
+        """
+        画像を画面上で1回だけ検索
+        
+        Returns:
+            Match: 見つかった場合は一致結果、それ以外はNone
+        """
+        return await self._run(self.clicker.locate, image_name, None, hint)
+    
+    async def wait_for_any(self, image_names, timeout=10):
+        """
+        いずれかの画像が表示されるまで待機
+        
+        Args:
+            image_names (list): 候補の画像ファイル名のリスト（imagesフォルダ内）
+            timeout (float): タイムアウト時間（秒）
+        
+        Returns:
+            tuple: (画像ファイル名, Match)。タイムアウト時は (None, None)
+        """
+        # 存在しない画像はここでエラーにする
+        for name in image_names:
+            await self._run(self.clicker.get_template, name)
+            self.clicker.metrics.count('attempts', name)
+        
+        future = asyncio.get_running_loop().create_future()
+        waiter = _Waiter(image_names, future)
+        self._waiters.append(waiter)
+        self._ensure_loop()
+        
+        try:
+            name, match = await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            for name in image_names:
+                self.clicker.metrics.count('timeouts', name)
+            return None, None
+        else:
+            self.clicker.metrics.count('hits', name)
+            return name, match
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+    
+    async def wait_for(self, image_name, timeout=10):
+        """画像が表示されるまで待機し、Match（タイムアウト時はNone）を返す"""
+        _, match = await self.wait_for_any([image_name], timeout)
+        return match
+    
+    async def click(self, image_name, timeout=10, expect=None):
+        """
+        画像が表示されるまで待機してクリック
+        
+        高速クリックモードでは ImageClicker.click_image と同じく、待機せずにクリックして
+        クリックが効いたことを確認します（失敗の理由は clicker.last_failure に残ります）。
+        
+        Args:
+            expect (str): 高速クリックモードで、クリック後に現れるはずの画像ファイル名
+        
+        Returns:
+            bool: クリックが成功したかどうか（高速クリックモードでは効果を確認できたかどうか）
+        """
+        match = await self.wait_for(image_name, timeout)
+        if match is None:
+            self.clicker.last_failure = 'not_found'
+            return False
+        
+        if self.clicker.fast:
+            return await self._run(self.clicker.fast_click, image_name, match, None, expect)
+        
+        with self.clicker.phase('wait_time', image_name):
+            await asyncio.sleep(self.clicker.wait_time)
+        x, y = match.center
+        self.clicker.last_failure = None
+        await self._run(self.clicker.click_at, x, y, image_name)
+        return True
+    
+    def _ensure_loop(self):
+        """キャプチャループが動いていなければ開始し、動いていれば待機を中断させる"""
+        if self._loop_task is None or self._loop_task.done():
+            self._wakeup = asyncio.Event()
+            self._loop_task = asyncio.get_running_loop().create_task(self._capture_loop())
+        else:
+            # 新しい条件はすぐに照合したいので、ポーリング間の待機を打ち切る
+            self._wakeup.set()
+    
+    async def _capture_loop(self):
+        """待機中の条件がある間、画面を取得してまとめて照合する"""
+        while True:
+            waiters = [w for w in self._waiters if not w.future.done()]
+            if not waiters:
+                break
+            
+            names = sorted({name for w in waiters for name in w.image_names})
+            # 誰も待っていない画像の追跡状態は捨てる
+            self._trackers = {name: self._trackers.get(name) or ChangeTracker() for name in names}
+            
+            # 照合中に追加された条件の通知を消さないように、キャプチャの前に戻しておく
+            self._wakeup.clear()
+            poll_start = time.perf_counter()
+            results, changed = await self._run(self._poll, names)
+            self.polls += 1
+            self.scheduler.record(time.perf_counter() - poll_start, changed)
+            
+            for waiter in waiters:
+                found = [(name, results[name]) for name in waiter.image_names if results.get(name)]
+                if found and not waiter.future.done():
+                    waiter.future.set_result(max(found, key=lambda item: item[1].score))
+            
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.scheduler.next_interval())
+            except asyncio.TimeoutError:
+                pass
+    
+    def _poll(self, names):
+        """作業スレッドで実行: 1回キャプチャして各画像を照合"""
+        frame = self.clicker.capture_frame()
+        results = {}
+        changed = False
+        
+        for name in names:
+            tracker = self._trackers[name]
+            regions = tracker.regions(frame)
+            if regions == []:
+                continue
+            changed = True
+            match, _ = self.clicker.locate_with_ring(name, frame, None, regions)
+            if match:
+                results[name] = match
+                tracker.reset()
+            else:
+                self.clicker.metrics.count('misses', name)
+                tracker.mark_negative(frame)
+        
+        return results, changed
+    
+    async def close(self):
+        """キャプチャループを止めて作業スレッドを終了し、自分で作った ImageClicker を閉じる"""
+        for waiter in self._waiters:
+            if not waiter.future.done():
+                waiter.future.cancel()
+        self._waiters.clear()
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            try:
+                await self._loop_task
+            except asyncio.CancelledError:
+                pass
+            self._loop_task = None
+        self._executor.shutdown(wait=True)
+        if self._owns_clicker:
+            self.clicker.close()
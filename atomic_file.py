@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+ファイルの置き換え書き込み
+同じフォルダの一時ファイルに書いてから os.replace で置き換えるので、書き込み中に中断しても、
+別のプロセスが同時に読んでいても、読み手には書き込み前か後のどちらかの内容だけが見えます
+
+使用例:
+    atomic_write("images/.positions.json", json.dumps(entries))
+    with atomic_open("workflows/login.icwf", 'wb') as f:
+        f.write(header)
+"""
+
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+
+def _current_umask():
+    # umask は読み出すだけの関数がないので、設定し直して元に戻す（起動時に1回だけ行う）
+    umask = os.umask(0o022)
+    os.umask(umask)
+    return umask
+
+
+_UMASK = _current_umask()
+
+
+def _file_mode(path):
+    """置き換え後のファイルの権限（既存のファイルがあればその権限、なければ通常のファイルと同じ）"""
+    try:
+        return os.stat(path).st_mode & 0o777
+    except OSError:
+        return 0o666 & ~_UMASK
+
+
+@contextmanager
+def atomic_open(path, mode='w'):
+    """
+    一時ファイルを開き、with ブロックを正常に抜けたら path を置き換える
+    
+    例外で抜けた場合は一時ファイルを消し、path は変更しません。
+    
+    Args:
+        path (str | Path): 書き込むファイル（フォルダは存在している必要がある）
+        mode (str): 'w'（UTF-8のテキスト）または 'wb'
+    """
+    path = Path(path)
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        f = os.fdopen(fd, mode, encoding=None if 'b' in mode else 'utf-8')
+    except BaseException:
+        # ファイルオブジェクトにならなかった fd は自分で閉じる
+        os.close(fd)
+        os.unlink(temp_path)
+        raise
+    
+    try:
+        with f:
+            # mkstemp は所有者だけが読める権限で作るので、通常のファイルと同じ権限にする
+            os.chmod(temp_path, _file_mode(path))
+            yield f
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def atomic_write(path, data):
+    """
+    ファイルの内容を置き換える
+    
+    Args:
+        path (str | Path): 書き込むファイル
+        data (bytes | str): 書き込む内容（str は UTF-8 で書き込む）
+    """
+    with atomic_open(path, 'wb' if isinstance(data, (bytes, bytearray, memoryview)) else 'w') as f:
+        f.write(data)
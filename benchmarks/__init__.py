@@ -0,0 +1,6 @@
+"""
+画像クリックツールのベンチマーク
+
+使い方:
+    python -m benchmarks.matcher_bench --output bench_results.json
+"""
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+仮想ディスプレイでの並列実行のベンチマーク
+Xvfb の仮想ディスプレイごとに合成画面のウィンドウを起動し、ボタンを順にクリックするワークフローを
+run_workflows.py --displays と同じ DisplayPool で実行して、ワーカー数ごとのスループットをJSONで出力します
+Xvfb が見つからない環境では計測をスキップして正常終了します
+
+使い方:
+    python -m benchmarks.display_bench --output display_results.json
+    python -m benchmarks.display_bench --workers 1,2,4,8 --workflows 16 --steps 8
+"""
+
+import argparse
+import json
+import multiprocessing
+import platform
+import shlex
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import cv2
+
+import run_workflows
+from benchmarks.synthetic import make_scene
+from display_pool import XVFB_SCREEN, DisplayPool
+
+
+def environment_info(args):
+    """計測環境の情報"""
+    return {
+        'timestamp': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': multiprocessing.cpu_count(),
+        'opencv': cv2.__version__,
+        'xvfb': shutil.which(args.xvfb),
+        'screen': args.screen,
+        'capture': args.capture,
+    }
+
+
+def show(image_path):
+    """画像を枠なしのウィンドウで画面の左上に表示する（各ディスプレイで --launch する対象アプリ）"""
+    import tkinter as tk
+    
+    root = tk.Tk()
+    root.overrideredirect(True)
+    photo = tk.PhotoImage(file=image_path)
+    root.geometry(f"{photo.width()}x{photo.height()}+0+0")
+    tk.Label(root, image=photo, borderwidth=0, highlightthickness=0).pack()
+    root.mainloop()
+
+
+def make_fixture(directory, screen, workflows, steps, seed):
+    """
+    合成画面・テンプレート・ワークフローを directory に書き出す
+    
+    Returns:
+        tuple: (合成画面のパス, 画像フォルダ, ワークフローJSONのパスのリスト)
+    """
+    width, height = (int(v) for v in screen.split('x')[:2])
+    scene, planted = make_scene(width, height, steps, seed)
+    scene_path = directory / "scene.png"
+    cv2.imwrite(str(scene_path), scene)
+    
+    images_dir = directory / "images"
+    images_dir.mkdir()
+    for template in planted:
+        cv2.imwrite(str(images_dir / template.name), template.image)
+    
+    workflows_dir = directory / "workflows"
+    workflows_dir.mkdir()
+    steps_data = [{'step': index, 'type': 'click', 'data': {'image': template.name, 'timeout': 10}}
+                  for index, template in enumerate(planted)]
+    paths = []
+    for index in range(workflows):
+        path = workflows_dir / f"bench_{index:03d}.json"
+        path.write_text(json.dumps({'name': path.stem, 'workflow': steps_data}), encoding='utf-8')
+        paths.append(path)
+    return scene_path, images_dir, paths
+
+
+def run_case(workers, paths, run_args, screen, xvfb):
+    """ワーカー数 workers で全ワークフローを実行（Xvfb の起動時間は含めない）"""
+    with DisplayPool(workers, screen=screen, xvfb=xvfb) as pool:
+        start = time.perf_counter()
+        results = pool.run(paths, run_args)
+        elapsed = time.perf_counter() - start
+    errors = sorted({r['error'] for r in results if r['error']})
+    return {
+        'workers': workers,
+        'workflows': len(paths),
+        'succeeded': sum(1 for r in results if r['success']),
+        'elapsed_s': round(elapsed, 3),
+        'workflows_per_s': round(len(paths) / elapsed, 3),
+        'displays': sorted({r['display'] for r in results if r.get('display')}),
+        'errors': errors[:5],
+    }
+
+
+def _csv(value):
+    return [int(v) for v in value.split(',') if v.strip()]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="仮想ディスプレイでの並列実行のベンチマーク")
+    parser.add_argument('--workers', type=_csv, default=[1, 2, 4], help="計測するワーカー数（カンマ区切り）")
+    parser.add_argument('--workflows', type=int, default=8, help="実行するワークフロー数")
+    parser.add_argument('--steps', type=int, default=4, help="ワークフローごとのクリック数")
+    parser.add_argument('--screen', default=XVFB_SCREEN, help="仮想ディスプレイの画面（幅x高さx色深度）")
+    parser.add_argument('--xvfb', default="Xvfb", help="Xvfb の実行ファイル")
+    parser.add_argument('--capture', choices=['auto', 'x11', 'pyautogui'], default='x11',
+                        help="ワーカーのキャプチャバックエンド")
+    parser.add_argument('--launch-wait', type=float, default=1.0, help="ウィンドウの起動を待つ時間（秒）")
+    parser.add_argument('--seed', type=int, default=0, help="合成画面の乱数シード")
+    parser.add_argument('--output', default="display_results.json", help="結果を書き出すJSONファイル")
+    parser.add_argument('--show', help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.show:
+        show(args.show)
+        return
+    
+    report = {'environment': environment_info(args), 'results': []}
+    
+    if shutil.which(args.xvfb) is None:
+        report['skipped'] = f"{args.xvfb} が見つかりません"
+        print(f"[display] スキップ ({report['skipped']})")
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            scene_path, images_dir, paths = make_fixture(Path(directory), args.screen,
+                                                         args.workflows, args.steps, args.seed)
+            # 対象アプリはワーカーの中で起動されるので、このモジュールを同じインタープリタで呼び出す
+            launch = shlex.join([sys.executable, "-m", "benchmarks.display_bench", "--show", str(scene_path)])
+            run_args = run_workflows.parse_args([
+                *(str(path) for path in paths),
+                '--displays', str(max(args.workers)),
+                '--xvfb-screen', args.screen,
+                '--launch', launch,
+                '--launch-wait', str(args.launch_wait),
+                '--images-dir', str(images_dir),
+                '--capture', args.capture,
+                '--wait-time', '0',
+                '--quiet',
+            ])
+            
+            for workers in args.workers:
+                result = run_case(workers, paths, run_args, args.screen, args.xvfb)
+                report['results'].append(result)
+                baseline = report['results'][0]['workflows_per_s']
+                result['speedup'] = round(result['workflows_per_s'] / baseline, 2) if baseline else None
+                print(f"[display] workers={workers}: {result['workflows_per_s']}件/秒 "
+                      f"(x{result['speedup']}) 成功={result['succeeded']}/{result['workflows']} "
+                      f"{result['elapsed_s']:.2f}秒")
+                for error in result['errors']:
+                    print(f"    エラー: {error}")
+    
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"結果を保存しました: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+テンプレートマッチングのベンチマーク
+合成画面に位置が既知のテンプレートを配置し、エンジン・キャプチャバックエンドごとに
+検索時間、複数テンプレートのスループット、ピークメモリ、正解率を計測してJSONで出力します
+
+使い方:
+    python -m benchmarks.matcher_bench --output bench_results.json
+    python -m benchmarks.matcher_bench --resolutions 4k --counts 1,500 --engines pyramid
+    python -m benchmarks.matcher_bench --resolutions 4k --counts 100 --workers 1,4,16
+    python -m benchmarks.matcher_bench --crossover --resolutions 1080p   # 空間照合とFFTの分岐点
+"""
+
+import argparse
+import json
+import multiprocessing
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from benchmarks.synthetic import RESOLUTIONS, make_scene
+from image_clicker import ENGINES, FFT_MIN_AREA, FFT_MIN_AREA_GRAY, Frame, Template, _engine_fft, match_template
+from capture_backends import BACKENDS, create_backend
+from parallel_matcher import ParallelMatcher
+
+
+# 正解とみなす中心座標のずれ（ピクセル）
+CENTER_TOLERANCE = 1
+
+# 空間照合とFFTの分岐点を探すテンプレートの一辺の長さ
+CROSSOVER_SIDES = [16, 24, 32, 48, 64, 96, 128, 192, 256, 384, 512]
+
+
+def peak_rss_mb():
+    """このプロセスのピークメモリ使用量（MB）。取得できないOSではNone"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linuxはキロバイト単位、macOSはバイト単位
+    if sys.platform == 'darwin':
+        rss /= 1024
+    return round(rss / 1024, 1)
+
+
+def summarize(samples_ms):
+    """ミリ秒のサンプル列を統計値にまとめる"""
+    ordered = sorted(samples_ms)
+    return {
+        'mean_ms': round(statistics.mean(ordered), 3),
+        'p50_ms': round(ordered[len(ordered) // 2], 3),
+        'p95_ms': round(ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)], 3),
+        'max_ms': round(ordered[-1], 3),
+    }
+
+
+def is_correct(match, planted):
+    """検索結果が正解位置と一致しているか"""
+    if match is None:
+        return False
+    x, y = match.center
+    tx, ty = planted.center
+    return abs(x - tx) <= CENTER_TOLERANCE and abs(y - ty) <= CENTER_TOLERANCE
+
+
+def run_matcher_case(resolution, count, engine, samples, confidence, seed, workers=1):
+    """1つの (解像度, テンプレート数, エンジン, プロセス数) の組み合わせを計測"""
+    width, height = RESOLUTIONS[resolution]
+    screen, planted = make_scene(width, height, count, seed)
+    templates = {p.name: Template(Path(p.name), p.image) for p in planted}
+    
+    # 単一テンプレートの検索時間（毎回新しいFrameで、縮小画像などのキャッシュなし）
+    latencies = []
+    for p in planted[:samples]:
+        frame = Frame(screen)
+        start = time.perf_counter()
+        frame.match(templates[p.name], engine=engine)
+        latencies.append((time.perf_counter() - start) * 1000)
+    
+    # 1枚のFrameに対して全テンプレートを照合
+    if workers > 1:
+        with ParallelMatcher(workers, min_work=0) as matcher:
+            # プロセスの起動時間は計測に含めない
+            matcher.locate_many(Frame(screen[:256, :256]), {planted[0].name: templates[planted[0].name]})
+            frame = Frame(screen)
+            start = time.perf_counter()
+            results = matcher.locate_many(frame, templates, confidence, engine=engine)
+            elapsed = time.perf_counter() - start
+    else:
+        frame = Frame(screen)
+        start = time.perf_counter()
+        results = frame.locate_many(templates, confidence=confidence, engine=engine)
+        elapsed = time.perf_counter() - start
+    
+    correct = sum(is_correct(results[p.name], p) for p in planted)
+    
+    return {
+        'kind': 'matcher',
+        'resolution': resolution,
+        'width': width,
+        'height': height,
+        'templates': count,
+        'engine': engine,
+        'workers': workers,
+        'locate': summarize(latencies),
+        'locate_many_s': round(elapsed, 4),
+        'templates_per_s': round(count / elapsed, 2) if elapsed > 0 else None,
+        'accuracy': round(correct / count, 4),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def run_crossover_case(resolution, side, grayscale, samples, seed):
+    """
+    一辺 side の正方形テンプレートを空間照合（cv2.matchTemplate）とFFTで照合して時間を比較
+    
+    fft_cold は画面側のDFTを毎回計算した場合、fft_warm は同じフレームで同じ大きさの区分の
+    テンプレートを照合済みで、画面側のDFTと積分画像がキャッシュされている場合の時間です。
+    """
+    width, height = RESOLUTIONS[resolution]
+    screen, _ = make_scene(width, height, 1, seed)
+    rng = np.random.default_rng(seed)
+    # 単色の切り出しはFFTを使わず通常の照合になるため、候補の中から最も模様の多い位置を使う
+    candidates = [(int(rng.integers(0, width - side)), int(rng.integers(0, height - side))) for _ in range(32)]
+    x, y = max(candidates, key=lambda c: float(screen[c[1]:c[1] + side, c[0]:c[0] + side].std()))
+    template = Template(Path(f"crossover_{side}.png"), screen[y:y + side, x:x + side].copy())
+    
+    spatial_ms, cold_ms, warm_ms = [], [], []
+    correct = 0
+    for _ in range(samples):
+        frame = Frame(screen)
+        start = time.perf_counter()
+        match_template(frame.array(grayscale), template.array(grayscale))
+        spatial_ms.append((time.perf_counter() - start) * 1000)
+        
+        start = time.perf_counter()
+        position, _ = _engine_fft(frame, template, grayscale)
+        cold_ms.append((time.perf_counter() - start) * 1000)
+        correct += position == (x, y)
+        
+        start = time.perf_counter()
+        _engine_fft(frame, template, grayscale)
+        warm_ms.append((time.perf_counter() - start) * 1000)
+    
+    return {
+        'kind': 'crossover',
+        'resolution': resolution,
+        'side': side,
+        'area': side * side,
+        'grayscale': grayscale,
+        'spatial': summarize(spatial_ms),
+        'fft_cold': summarize(cold_ms),
+        'fft_warm': summarize(warm_ms),
+        'fft_accuracy': round(correct / samples, 4),
+    }
+
+
+def crossover_summary(results):
+    """
+    解像度・色ごとに、それ以上の面積ではFFTが常に空間照合より速くなる最小の面積
+    
+    画面側のDFTはキャッシュの上限を超えると捨てられるので、キャッシュなし（fft_cold）の時間で比べます。
+    """
+    summary = []
+    keys = dict.fromkeys((r['resolution'], r['grayscale']) for r in results)
+    for resolution, grayscale in keys:
+        cases = sorted((r for r in results if (r['resolution'], r['grayscale']) == (resolution, grayscale)),
+                       key=lambda r: r['area'])
+        crossover = None
+        for case in reversed(cases):
+            if case['fft_cold']['p50_ms'] >= case['spatial']['p50_ms']:
+                break
+            crossover = case['area']
+        summary.append({
+            'resolution': resolution,
+            'grayscale': grayscale,
+            'crossover_area': crossover,
+            'fft_min_area': FFT_MIN_AREA_GRAY if grayscale else FFT_MIN_AREA,
+        })
+    return summary
+
+
+def run_capture_case(backend_name, resolution, samples, engine, confidence, seed):
+    """キャプチャバックエンドの取得時間と、取得から検索までの時間を計測"""
+    width, height = RESOLUTIONS[resolution]
+    screen, planted = make_scene(width, height, 1, seed)
+    result = {
+        'kind': 'capture',
+        'backend': backend_name,
+        'resolution': resolution if backend_name == 'replay' else 'screen',
+        'engine': engine,
+    }
+    
+    with tempfile.TemporaryDirectory() as frames_dir:
+        if backend_name == 'replay':
+            cv2.imwrite(str(Path(frames_dir) / "frame.png"), screen)
+            options = {'source': frames_dir}
+        else:
+            options = {}
+        
+        try:
+            backend = create_backend(backend_name, **options)
+        except Exception as e:
+            # ディスプレイが無い環境などでは計測をスキップ
+            result['skipped'] = f"{type(e).__name__}: {e}"
+            return result
+        
+        with backend:
+            grab_ms = []
+            end_to_end_ms = []
+            template = Template(Path(planted[0].name), planted[0].image)
+            correct = 0
+            
+            for _ in range(samples):
+                start = time.perf_counter()
+                frame = Frame.capture(backend=backend)
+                grabbed = time.perf_counter()
+                match = frame.locate(template, confidence=confidence, engine=engine)
+                done = time.perf_counter()
+                grab_ms.append((grabbed - start) * 1000)
+                end_to_end_ms.append((done - start) * 1000)
+                correct += is_correct(match, planted[0])
+            
+            result['width'] = frame.width
+            result['height'] = frame.height
+            result['grab'] = summarize(grab_ms)
+            result['capture_and_locate'] = summarize(end_to_end_ms)
+            # 合成画面を再生するreplay以外では画面内容が異なるので正解率は出さない
+            if backend_name == 'replay':
+                result['accuracy'] = round(correct / samples, 4)
+    
+    result['peak_rss_mb'] = peak_rss_mb()
+    return result
+
+
+def run_isolated(func, *args):
+    """ピークメモリをケースごとに測るため、別プロセスで実行"""
+    # Pool のワーカーはデーモンで子プロセスを作れないため、並列照合のケース用に Executor を使う
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(1, mp_context=context) as pool:
+        return pool.submit(func, *args).result()
+
+
+def environment_info():
+    """計測環境の情報"""
+    return {
+        'timestamp': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': multiprocessing.cpu_count(),
+        'opencv': cv2.__version__,
+        'opencv_threads': cv2.getNumThreads(),
+        'numpy': np.__version__,
+    }
+
+
+def _csv(value):
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="テンプレートマッチングのベンチマーク")
+    parser.add_argument('--resolutions', type=_csv, default=list(RESOLUTIONS),
+                        help="計測する解像度（カンマ区切り: 1080p,1440p,4k）")
+    parser.add_argument('--counts', type=lambda v: [int(c) for c in _csv(v)], default=[1, 10, 100],
+                        help="画面に配置するテンプレート数（カンマ区切り、1～500）")
+    parser.add_argument('--engines', type=_csv, default=list(ENGINES),
+                        help="計測するマッチングエンジン（カンマ区切り）")
+    parser.add_argument('--backends', type=_csv, default=list(BACKENDS),
+                        help="計測するキャプチャバックエンド（カンマ区切り）")
+    parser.add_argument('--workers', type=lambda v: [int(c) for c in _csv(v)], default=[1],
+                        help="locate_manyに使うプロセス数（カンマ区切り、1は並列化なし）")
+    parser.add_argument('--samples', type=int, default=10,
+                        help="検索時間・取得時間を計測する回数")
+    parser.add_argument('--confidence', type=float, default=0.8, help="信頼度")
+    parser.add_argument('--seed', type=int, default=0, help="合成画面の乱数シード")
+    parser.add_argument('--crossover', action='store_true',
+                        help="空間照合とFFTの分岐点だけを計測（テンプレート数・バックエンドの計測は行わない）")
+    parser.add_argument('--sides', type=lambda v: [int(c) for c in _csv(v)], default=CROSSOVER_SIDES,
+                        help="--crossover で計測するテンプレートの一辺の長さ（カンマ区切り）")
+    parser.add_argument('--no-isolate', action='store_true',
+                        help="全ケースを同じプロセスで実行（ピークメモリは累積値になる）")
+    parser.add_argument('--output', default="bench_results.json", help="結果を書き出すJSONファイル")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    run = (lambda func, *a: func(*a)) if args.no_isolate else run_isolated
+    
+    report = {'environment': environment_info(), 'results': []}
+    
+    if args.crossover:
+        for resolution in args.resolutions:
+            for grayscale in (False, True):
+                for side in args.sides:
+                    result = run_crossover_case(resolution, side, grayscale, args.samples, args.seed)
+                    report['results'].append(result)
+                    print(f"[crossover] {resolution} {side}x{side} {'gray' if grayscale else 'color'}: "
+                          f"spatial p50={result['spatial']['p50_ms']:.1f}ms "
+                          f"fft p50={result['fft_cold']['p50_ms']:.1f}ms "
+                          f"(キャッシュあり {result['fft_warm']['p50_ms']:.1f}ms)")
+        report['crossover'] = crossover_summary(report['results'])
+        for entry in report['crossover']:
+            print(f"[crossover] {entry['resolution']} {'gray' if entry['grayscale'] else 'color'}: "
+                  f"分岐点の面積={entry['crossover_area']} (FFT_MIN_AREA={entry['fft_min_area']})")
+        args.counts = []
+        args.backends = []
+    
+    for resolution in args.resolutions:
+        for count in args.counts:
+            for engine in args.engines:
+                for workers in args.workers:
+                    result = run(run_matcher_case, resolution, count, engine,
+                                 args.samples, args.confidence, args.seed, workers)
+                    report['results'].append(result)
+                    print(f"[matcher] {resolution} templates={count} engine={engine} workers={workers}: "
+                          f"locate p50={result['locate']['p50_ms']:.1f}ms "
+                          f"{result['templates_per_s']}個/秒 "
+                          f"正解率={result['accuracy']:.2%} RSS={result['peak_rss_mb']}MB")
+    
+    for backend in args.backends:
+        # 実画面を取得するバックエンドは解像度を選べないので1回だけ計測
+        resolutions = args.resolutions if backend == 'replay' else args.resolutions[:1]
+        for resolution in resolutions:
+            result = run(run_capture_case, backend, resolution, args.samples,
+                         args.engines[0], args.confidence, args.seed)
+            report['results'].append(result)
+            if 'skipped' in result:
+                print(f"[capture] {backend}: スキップ ({result['skipped']})")
+                continue
+            print(f"[capture] {backend} {result['width']}x{result['height']}: "
+                  f"grab p50={result['grab']['p50_ms']:.1f}ms "
+                  f"取得+検索 p50={result['capture_and_locate']['p50_ms']:.1f}ms")
+    
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"結果を保存しました: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+起動時間のベンチマーク
+CLIの `--help` やreplayバックエンドでの1回の検索など、短いコマンドの実行時間を別プロセスで計測し、
+`python -X importtime` の結果から読み込みに時間がかかっているモジュールを集計してJSONで出力します
+
+使い方:
+    python -m benchmarks.startup_bench
+    python -m benchmarks.startup_bench --runs 20 --target-ms 100 --output startup.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# 目標とする起動時間（ミリ秒）
+DEFAULT_TARGET_MS = 100
+
+# 並列実行の確認で同時に実行するワークフロー数
+PARALLEL_WORKFLOWS = 6
+
+
+def make_replay_fixture(directory):
+    """replayで検索するための合成画面・テンプレートと、それをクリックするワークフローを作成"""
+    import cv2
+    from benchmarks.synthetic import make_scene
+    
+    screen, planted = make_scene(1920, 1080, 1, seed=0)
+    images_dir = Path(directory) / "images"
+    images_dir.mkdir()
+    cv2.imwrite(str(Path(directory) / "screen.png"), screen)
+    cv2.imwrite(str(images_dir / "target.png"), planted[0].image)
+    
+    workflows_dir = Path(directory) / "workflows"
+    workflows_dir.mkdir()
+    workflow = {'workflow': [{'step': 0, 'type': 'click', 'data': {'image': "target.png", 'timeout': 5}}]}
+    for index in range(PARALLEL_WORKFLOWS + 1):
+        workflow['name'] = f"parallel_{index}"
+        (workflows_dir / f"parallel_{index}.json").write_text(json.dumps(workflow), encoding='utf-8')
+    return images_dir, Path(directory) / "screen.png", workflows_dir
+
+
+def commands(fixture):
+    """計測するコマンド（名前 -> 引数リスト）"""
+    images_dir, screen, workflows_dir = fixture
+    python = sys.executable
+    locate = [python, str(ROOT / "image_clicker.py"), "target.png",
+              "--images-dir", str(images_dir), "--capture", "replay", "--replay", str(screen), "--locate"]
+    # 遅延インポートしたモジュールを複数のスレッドが同時に使い始める場合（失敗すると終了コードが0以外になる）
+    parallel = [python, str(ROOT / "run_workflows.py"), str(workflows_dir),
+                "--images-dir", str(images_dir), "--capture", "replay", "--replay", str(screen),
+                "--wait-time", "0", "--quiet", "--parallel", str(PARALLEL_WORKFLOWS)]
+    return {
+        'python': [python, "-c", "pass"],
+        'image_clicker --help': [python, str(ROOT / "image_clicker.py"), "--help"],
+        'run_workflows --help': [python, str(ROOT / "run_workflows.py"), "--help"],
+        'import gui_app': [python, "-c", "import gui_app"],
+        'locate (replay, opencv)': locate,
+        'locate (replay, pyramid)': locate + ["--engine", "pyramid"],
+        f'run_workflows --parallel {PARALLEL_WORKFLOWS} (replay)': parallel,
+    }
+
+
+def time_command(args, runs):
+    """コマンドを runs 回実行して所要時間（ミリ秒）を集計"""
+    samples = []
+    failed = 0
+    for _ in range(runs):
+        start = time.perf_counter()
+        completed = subprocess.run(args, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        samples.append((time.perf_counter() - start) * 1000)
+        failed += completed.returncode != 0
+    return {
+        'min_ms': round(min(samples), 1),
+        'median_ms': round(statistics.median(samples), 1),
+        'max_ms': round(max(samples), 1),
+        'returncode': completed.returncode,
+        'failed_runs': failed,
+    }
+
+
+def parse_importtime(stderr):
+    """-X importtime の出力を (モジュール名, 自身の時間us, 累積時間us, 深さ) のリストに変換"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        self_us, cumulative_us, name = int(parts[0]), int(parts[1]), parts[2]
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((name.strip(), self_us, cumulative_us, depth))
+    return entries
+
+
+def import_profile(args, top):
+    """コマンドを -X importtime 付きで実行し、時間のかかったモジュールを返す"""
+    completed = subprocess.run([args[0], "-X", "importtime"] + args[1:], cwd=ROOT,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    entries = parse_importtime(completed.stderr)
+    return {
+        # 深さ0のモジュールの累積時間の合計が、インポートにかかった時間全体
+        'total_ms': round(sum(e[2] for e in entries if e[3] == 0) / 1000, 1),
+        'modules': len(entries),
+        'heaviest_self': [{'module': name, 'self_ms': round(s / 1000, 2), 'cumulative_ms': round(c / 1000, 2)}
+                          for name, s, c, _ in sorted(entries, key=lambda e: e[1], reverse=True)[:top]],
+        'loaded': sorted({name.split(".")[0] for name, *_ in entries}),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="起動時間のベンチマーク")
+    parser.add_argument('--runs', type=int, default=10, help="各コマンドの実行回数")
+    parser.add_argument('--top', type=int, default=15, help="表示する重いモジュールの数")
+    parser.add_argument('--target-ms', type=float, default=DEFAULT_TARGET_MS,
+                        help="目標の起動時間（ミリ秒）。--help と replay の検索が対象")
+    parser.add_argument('--output', default="startup_results.json", help="結果を書き出すJSONファイル")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    
+    # バイトコードが無いと毎回コンパイルが走るので、先に作っておく
+    subprocess.run([sys.executable, "-m", "compileall", "-q", str(ROOT)], cwd=ROOT,
+                   stdout=subprocess.DEVNULL)
+    
+    report = {
+        'environment': {
+            'timestamp': datetime.now().isoformat(),
+            'python': sys.version.split()[0],
+            'dont_write_bytecode': bool(os.environ.get('PYTHONDONTWRITEBYTECODE')),
+        },
+        'target_ms': args.target_ms,
+        'results': [],
+    }
+    
+    with tempfile.TemporaryDirectory() as directory:
+        fixture = make_replay_fixture(directory)
+        for name, command in commands(fixture).items():
+            timing = time_command(command, args.runs)
+            profile = import_profile(command, args.top)
+            result = {'command': name, **timing, 'imports': profile}
+            if name != 'python' and 'parallel' not in name:
+                result['target_met'] = timing['median_ms'] <= args.target_ms
+            report['results'].append(result)
+            
+            heaviest = ", ".join(f"{m['module']} {m['self_ms']}ms" for m in profile['heaviest_self'][:3])
+            print(f"{name}: median={timing['median_ms']}ms min={timing['min_ms']}ms "
+                  f"(importtime合計 {profile['total_ms']}ms: {heaviest})")
+            if timing['failed_runs']:
+                print(f"    失敗: {timing['failed_runs']} / {args.runs} 回が終了コード0以外で終了しました")
+    
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"結果を保存しました: {args.output}")
+    
+    # 失敗したコマンドがあればCIで検出できるように終了コードで知らせる
+    return 1 if any(r['failed_runs'] for r in report['results']) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+ベンチマーク用の合成画面と合成テンプレートを生成
+ウィンドウ・タイトルバー・文字列を並べたUI風の画面に、位置が既知のボタンを配置します
+"""
+
+import math
+
+import cv2
+import numpy as np
+
+
+# ベンチマークで使う画面解像度
+RESOLUTIONS = {
+    '1080p': (1920, 1080),
+    '1440p': (2560, 1440),
+    '4k': (3840, 2160),
+}
+
+
+class PlantedTemplate:
+    """画面に配置したテンプレートと正解位置"""
+    
+    def __init__(self, name, image, left, top):
+        self.name = name
+        self.image = image
+        self.left = left
+        self.top = top
+        self.height, self.width = image.shape[:2]
+    
+    @property
+    def center(self):
+        """正解の中心座標 (x, y)"""
+        return (self.left + self.width // 2, self.top + self.height // 2)
+
+
+def _random_color(rng, low=0, high=256):
+    return tuple(int(c) for c in rng.integers(low, high, 3))
+
+
+def make_background(width, height, rng):
+    """ウィンドウや文字が散らばったUI風の背景を生成"""
+    screen = np.full((height, width, 3), 236, np.uint8)
+    
+    # デスクトップ上のウィンドウ
+    for _ in range(max(width * height // 150000, 4)):
+        w = int(rng.integers(width // 8, width // 2))
+        h = int(rng.integers(height // 8, height // 2))
+        x = int(rng.integers(0, width - w))
+        y = int(rng.integers(0, height - h))
+        cv2.rectangle(screen, (x, y), (x + w, y + h), _random_color(rng, 200), -1)
+        cv2.rectangle(screen, (x, y), (x + w, y + 28), _random_color(rng, 40, 160), -1)
+        cv2.rectangle(screen, (x, y), (x + w, y + h), (90, 90, 90), 1)
+        
+        # ウィンドウ内の文字列
+        for line_y in range(y + 50, y + h - 10, 22):
+            text = "".join(chr(int(c)) for c in rng.integers(97, 123, int(rng.integers(5, 30))))
+            cv2.putText(screen, text, (x + 10, line_y), cv2.FONT_HERSHEY_SIMPLEX,
+                        0.5, (30, 30, 30), 1, cv2.LINE_AA)
+    
+    return screen
+
+
+def make_button(width, height, label, rng):
+    """ラベルとアイコン付きの一意なボタン画像を生成"""
+    button = np.empty((height, width, 3), np.uint8)
+    button[:] = _random_color(rng, 120)
+    cv2.rectangle(button, (0, 0), (width - 1, height - 1), _random_color(rng, 0, 100), 1)
+    
+    # 左端のアイコン（ランダムな模様でボタンごとに区別できるようにする）
+    icon = min(height - 6, width // 3)
+    if icon >= 4:
+        pattern = rng.integers(0, 256, (4, 4, 3), dtype=np.uint8)
+        button[3:3 + icon, 3:3 + icon] = cv2.resize(pattern, (icon, icon),
+                                                    interpolation=cv2.INTER_NEAREST)
+    
+    scale = max(min(height / 40, 0.6), 0.3)
+    cv2.putText(button, label, (icon + 6, height - height // 3), cv2.FONT_HERSHEY_SIMPLEX,
+                scale, (0, 0, 0), 1, cv2.LINE_AA)
+    return button
+
+
+def make_scene(width, height, count, seed=0):
+    """
+    合成画面を生成し、count個のテンプレートを重ならないように配置
+    
+    Args:
+        width (int): 画面の幅
+        height (int): 画面の高さ
+        count (int): 配置するテンプレート数（1～500程度）
+        seed (int): 乱数シード（同じ値なら同じ画面になる）
+    
+    Returns:
+        tuple: (BGR画面画像, PlantedTemplateのリスト)
+    """
+    rng = np.random.default_rng(seed)
+    screen = make_background(width, height, rng)
+    
+    # 画面を格子に分割し、各セルに1つずつ配置する
+    cols = max(int(math.ceil(math.sqrt(count * width / height))), 1)
+    rows = int(math.ceil(count / cols))
+    cell_w, cell_h = width // cols, height // rows
+    max_w = min(cell_w - 4, 160)
+    max_h = min(cell_h - 4, 56)
+    if max_w < 24 or max_h < 16:
+        raise ValueError(f"{width}x{height} に {count} 個のテンプレートは配置できません")
+    
+    cells = rng.permutation(rows * cols)[:count]
+    templates = []
+    for index, cell in enumerate(cells):
+        w = int(rng.integers(max(max_w // 2, 24), max_w + 1))
+        h = int(rng.integers(max(max_h // 2, 16), max_h + 1))
+        row, col = divmod(int(cell), cols)
+        left = col * cell_w + int(rng.integers(0, cell_w - w + 1))
+        top = row * cell_h + int(rng.integers(0, cell_h - h + 1))
+        
+        button = make_button(w, h, f"#{index}", rng)
+        screen[top:top + h, left:left + w] = button
+        templates.append(PlantedTemplate(f"template_{index:03d}.png", button, left, top))
+    
+    return screen, templates
@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+"""
+画面キャプチャのバックエンド
+ImageClickerが画面を取得する方法（とクリックの送り先）を切り替えます
+
+- pyautogui: 従来どおり pyautogui.screenshot() を使用（全OS対応）
+- x11:       X11の共有メモリ拡張(MIT-SHM)で直接取得（Linux、高速）。クリックはXTest拡張で同じディスプレイに送る
+- replay:    PNG画像のディレクトリからフレームを順に返す（ディスプレイ不要）
+"""
+
+import ctypes
+import os
+import sys
+import time
+from pathlib import Path
+
+from lazy_modules import lazy_import
+
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+
+# クリックなどの操作の後に待つ時間（秒）。pyautogui.PAUSE にも設定する
+CLICK_PAUSE = 0.25
+
+
+def import_pyautogui():
+    """
+    pyautoguiを読み込んで共通設定を適用
+    
+    pyautoguiはインポート時にディスプレイへ接続するため、実際に必要になるまで読み込まない
+    """
+    import pyautogui
+    
+    # フェイルセーフを有効化（マウスを画面の隅に移動するとプログラムが停止）
+    pyautogui.FAILSAFE = True
+    
+    # マウス移動の間隔を設定
+    pyautogui.PAUSE = CLICK_PAUSE
+    
+    return pyautogui
+
+
+class CaptureBackend:
+    """キャプチャバックエンドの基底クラス"""
+    
+    name = None
+    
+    def grab(self, region=None):
+        """
+        画面を取得
+        
+        Args:
+            region (tuple): (left, top, width, height) で範囲を限定（省略時は全画面）
+        
+        Returns:
+            numpy.ndarray: BGR形式の画像
+        """
+        raise NotImplementedError
+    
+    def click(self, x, y, pause=True):
+        """
+        画面座標 (x, y) をクリック
+        
+        Args:
+            pause (bool): クリック後に pyautogui.PAUSE の時間だけ待つかどうか
+        """
+        import_pyautogui().click(x, y, _pause=pause)
+    
+    @property
+    def click_pause(self):
+        """click() の中で操作の後に待つ時間（秒）。pyautogui.PAUSE の値"""
+        return import_pyautogui().PAUSE
+    
+    def close(self):
+        """確保したリソースを解放"""
+        pass
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _crop(image, region):
+    """(left, top, width, height) で画像を切り出す"""
+    if not region:
+        return image
+    left, top, width, height = region
+    return image[top:top + height, left:left + width]
+
+
+class PyAutoGUIBackend(CaptureBackend):
+    """pyautogui.screenshot() を使う従来のバックエンド"""
+    
+    name = 'pyautogui'
+    
+    def __init__(self):
+        self._pyautogui = import_pyautogui()
+    
+    def grab(self, region=None):
+        screenshot = self._pyautogui.screenshot(region=region)
+        return cv2.cvtColor(np.asarray(screenshot.convert('RGB')), cv2.COLOR_RGB2BGR)
+    
+    def click(self, x, y, pause=True):
+        self._pyautogui.click(x, y, _pause=pause)
+    
+    @property
+    def click_pause(self):
+        return self._pyautogui.PAUSE
+
+
+class _XImage(ctypes.Structure):
+    _fields_ = [
+        ('width', ctypes.c_int),
+        ('height', ctypes.c_int),
+        ('xoffset', ctypes.c_int),
+        ('format', ctypes.c_int),
+        ('data', ctypes.c_void_p),
+        ('byte_order', ctypes.c_int),
+        ('bitmap_unit', ctypes.c_int),
+        ('bitmap_bit_order', ctypes.c_int),
+        ('bitmap_pad', ctypes.c_int),
+        ('depth', ctypes.c_int),
+        ('bytes_per_line', ctypes.c_int),
+        ('bits_per_pixel', ctypes.c_int),
+        ('red_mask', ctypes.c_ulong),
+        ('green_mask', ctypes.c_ulong),
+        ('blue_mask', ctypes.c_ulong),
+        ('obdata', ctypes.c_void_p),
+        ('funcs', ctypes.c_void_p * 6),
+    ]
+
+
+class _XShmSegmentInfo(ctypes.Structure):
+    _fields_ = [
+        ('shmseg', ctypes.c_ulong),
+        ('shmid', ctypes.c_int),
+        ('shmaddr', ctypes.c_void_p),
+        ('readOnly', ctypes.c_int),
+    ]
+
+
+class X11ShmBackend(CaptureBackend):
+    """
+    X11の共有メモリ拡張(MIT-SHM)で画面を取得するバックエンド
+    
+    ルートウィンドウ全体を共有メモリに直接転送し、numpy配列として返します。
+    scrotやPILを経由しないため、pyautoguiより大幅に高速です。
+    
+    クリックは libXtst があればXTest拡張で接続先のディスプレイに直接送るので、
+    仮想ディスプレイ（Xvfb）ごとに別のバックエンドを作れば、それぞれの画面を独立して操作できます。
+    """
+    
+    name = 'x11'
+    
+    _ZPIXMAP = 2
+    _IPC_PRIVATE = 0
+    _IPC_CREAT = 0o1000
+    _IPC_RMID = 0
+    _ALL_PLANES = 0xFFFFFFFF
+    
+    def __init__(self, display=None):
+        """
+        Args:
+            display (str): 接続先ディスプレイ（例 ":1"、省略時は環境変数DISPLAY）
+        """
+        if not sys.platform.startswith('linux'):
+            raise RuntimeError("x11バックエンドはLinux専用です")
+        
+        import ctypes.util
+        
+        self._xlib = self._load_library('X11')
+        self._xext = self._load_library('Xext')
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._declare_functions()
+        
+        display = display or os.environ.get('DISPLAY')
+        self._display = self._xlib.XOpenDisplay(display.encode() if display else None)
+        if not self._display:
+            raise RuntimeError(f"ディスプレイに接続できません: {display}")
+        
+        self._image = None
+        self._shminfo = None
+        self._pixels = None
+        self._injector = None
+        try:
+            self._setup_shm()
+            self._setup_xtest(display)
+        except Exception:
+            self.close()
+            raise
+    
+    @staticmethod
+    def _load_library(name):
+        import ctypes.util
+        path = ctypes.util.find_library(name)
+        if not path:
+            raise RuntimeError(f"lib{name} が見つかりません")
+        return ctypes.CDLL(path)
+    
+    def _declare_functions(self):
+        xlib, xext, libc = self._xlib, self._xext, self._libc
+        
+        xlib.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        xlib.XOpenDisplay.restype = ctypes.c_void_p
+        xlib.XCloseDisplay.argtypes = [ctypes.c_void_p]
+        xlib.XDefaultScreen.argtypes = [ctypes.c_void_p]
+        xlib.XRootWindow.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        xlib.XRootWindow.restype = ctypes.c_ulong
+        xlib.XDisplayWidth.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        xlib.XDisplayHeight.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        xlib.XDefaultVisual.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        xlib.XDefaultVisual.restype = ctypes.c_void_p
+        xlib.XDefaultDepth.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        xlib.XSync.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        
+        xext.XShmQueryExtension.argtypes = [ctypes.c_void_p]
+        xext.XShmCreateImage.argtypes = [
+            ctypes.c_void_p, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int,
+            ctypes.c_char_p, ctypes.POINTER(_XShmSegmentInfo), ctypes.c_uint, ctypes.c_uint,
+        ]
+        xext.XShmCreateImage.restype = ctypes.POINTER(_XImage)
+        xext.XShmAttach.argtypes = [ctypes.c_void_p, ctypes.POINTER(_XShmSegmentInfo)]
+        xext.XShmDetach.argtypes = [ctypes.c_void_p, ctypes.POINTER(_XShmSegmentInfo)]
+        xext.XShmGetImage.argtypes = [
+            ctypes.c_void_p, ctypes.c_ulong, ctypes.POINTER(_XImage),
+            ctypes.c_int, ctypes.c_int, ctypes.c_ulong,
+        ]
+        
+        libc.shmget.argtypes = [ctypes.c_int, ctypes.c_size_t, ctypes.c_int]
+        libc.shmat.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_int]
+        libc.shmat.restype = ctypes.c_void_p
+        libc.shmdt.argtypes = [ctypes.c_void_p]
+        libc.shmctl.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_void_p]
+    
+    def _setup_xtest(self, display):
+        """XTest拡張でクリックを送る接続を開く（libXtst が無ければ pyautogui でクリック）"""
+        try:
+            xtst = self._load_library('Xtst')
+        except RuntimeError:
+            return
+        xtst.XTestFakeMotionEvent.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_ulong]
+        xtst.XTestFakeButtonEvent.argtypes = [ctypes.c_void_p, ctypes.c_uint, ctypes.c_int, ctypes.c_ulong]
+        self._xlib.XFlush.argtypes = [ctypes.c_void_p]
+        self._xtst = xtst
+        # Xlib の接続はスレッドセーフではないので、キャプチャ（先読みスレッドからも呼ばれる）とは別に接続する
+        self._injector = self._xlib.XOpenDisplay(display.encode() if display else None)
+    
+    def click(self, x, y, pause=True):
+        if not self._injector:
+            return super().click(x, y, pause)
+        self._xtst.XTestFakeMotionEvent(self._injector, -1, int(x), int(y), 0)
+        self._xtst.XTestFakeButtonEvent(self._injector, 1, 1, 0)
+        self._xtst.XTestFakeButtonEvent(self._injector, 1, 0, 0)
+        self._xlib.XFlush(self._injector)
+        if pause:
+            time.sleep(CLICK_PAUSE)
+    
+    @property
+    def click_pause(self):
+        return CLICK_PAUSE if self._injector else super().click_pause
+    
+    def _setup_shm(self):
+        xlib, xext, libc = self._xlib, self._xext, self._libc
+        display = self._display
+        
+        if not xext.XShmQueryExtension(display):
+            raise RuntimeError("XサーバーがMIT-SHM拡張に対応していません")
+        
+        screen = xlib.XDefaultScreen(display)
+        self._root = xlib.XRootWindow(display, screen)
+        self.width = xlib.XDisplayWidth(display, screen)
+        self.height = xlib.XDisplayHeight(display, screen)
+        
+        self._shminfo = _XShmSegmentInfo()
+        image = xext.XShmCreateImage(
+            display, xlib.XDefaultVisual(display, screen), xlib.XDefaultDepth(display, screen),
+            self._ZPIXMAP, None, ctypes.byref(self._shminfo), self.width, self.height,
+        )
+        if not image:
+            raise RuntimeError("XShmCreateImage に失敗しました")
+        self._image = image
+        
+        if image.contents.bits_per_pixel != 32:
+            raise RuntimeError(f"未対応のピクセル形式です: {image.contents.bits_per_pixel}bpp")
+        
+        self._size = image.contents.bytes_per_line * image.contents.height
+        shmid = libc.shmget(self._IPC_PRIVATE, self._size, self._IPC_CREAT | 0o600)
+        if shmid < 0:
+            raise OSError(ctypes.get_errno(), "shmget に失敗しました")
+        self._shminfo.shmid = shmid
+        
+        shmaddr = libc.shmat(shmid, None, 0)
+        if shmaddr in (None, ctypes.c_void_p(-1).value):
+            libc.shmctl(shmid, self._IPC_RMID, None)
+            self._shminfo.shmid = -1
+            raise OSError(ctypes.get_errno(), "shmat に失敗しました")
+        self._shminfo.shmaddr = shmaddr
+        self._shminfo.readOnly = 0
+        image.contents.data = shmaddr
+        
+        if not xext.XShmAttach(display, ctypes.byref(self._shminfo)):
+            raise RuntimeError("XShmAttach に失敗しました")
+        xlib.XSync(display, 0)
+        
+        # 接続済みなので削除予約しておく（プロセス終了時に自動で解放される）
+        libc.shmctl(shmid, self._IPC_RMID, None)
+        
+        buffer = (ctypes.c_ubyte * self._size).from_address(shmaddr)
+        self._pixels = np.frombuffer(buffer, dtype=np.uint8).reshape(
+            image.contents.height, image.contents.bytes_per_line // 4, 4
+        )[:, :self.width]
+    
+    def grab(self, region=None):
+        if not self._xext.XShmGetImage(self._display, self._root, self._image, 0, 0, self._ALL_PLANES):
+            raise RuntimeError("XShmGetImage に失敗しました")
+        # 共有メモリは次回の取得で上書きされるのでコピーして返す（BGRA -> BGR）
+        return np.ascontiguousarray(_crop(self._pixels, region)[:, :, :3])
+    
+    def close(self):
+        if self._shminfo is not None and self._shminfo.shmaddr:
+            if self._image is not None:
+                self._xext.XShmDetach(self._display, ctypes.byref(self._shminfo))
+            self._libc.shmdt(self._shminfo.shmaddr)
+            self._shminfo.shmaddr = None
+        self._pixels = None
+        self._image = None
+        if self._injector:
+            self._xlib.XCloseDisplay(self._injector)
+            self._injector = None
+        if self._display:
+            self._xlib.XCloseDisplay(self._display)
+            self._display = None
+
+
+class ReplayBackend(CaptureBackend):
+    """
+    保存済みのPNG画像をフレームとして順に返すバックエンド
+    
+    ディスプレイが無い環境でマッチングやワークフローの動作確認・ベンチマークを行うためのもの。
+    クリックは実行せず、clicks に座標を記録します。
+    """
+    
+    name = 'replay'
+    
+    def __init__(self, source, loop=False):
+        """
+        Args:
+            source (str | Path): PNG画像のディレクトリ、または単一の画像ファイル
+            loop (bool): 最後のフレームの後に先頭へ戻るかどうか（Falseなら最後のフレームを返し続ける）
+        """
+        source = Path(source)
+        if source.is_dir():
+            self.paths = sorted(source.glob("*.png"))
+        else:
+            self.paths = [source]
+        if not self.paths:
+            raise ValueError(f"再生するフレームがありません: {source}")
+        
+        self.loop = loop
+        self.index = 0
+        self.clicks = []
+        self._cached_index = None
+        self._cached_image = None
+    
+    def _load(self, index):
+        if index != self._cached_index:
+            data = np.fromfile(str(self.paths[index]), dtype=np.uint8)
+            image = cv2.imdecode(data, cv2.IMREAD_COLOR)
+            if image is None:
+                raise ValueError(f"画像を読み込めません: {self.paths[index]}")
+            self._cached_index = index
+            self._cached_image = image
+        return self._cached_image
+    
+    def grab(self, region=None):
+        image = self._load(self.index)
+        
+        # 次のフレームへ進める
+        if self.index + 1 < len(self.paths):
+            self.index += 1
+        elif self.loop:
+            self.index = 0
+        
+        return _crop(image, region)
+    
+    def click(self, x, y, pause=True):
+        self.clicks.append((x, y))
+    
+    # 実際にはクリックしないので待機もない
+    click_pause = 0.0
+
+
+# capture引数で選択できるバックエンド
+BACKENDS = {
+    'pyautogui': PyAutoGUIBackend,
+    'x11': X11ShmBackend,
+    'replay': ReplayBackend,
+}
+
+
+def create_backend(name='auto', **options):
+    """
+    名前からキャプチャバックエンドを作成
+    
+    Args:
+        name (str): "auto", "pyautogui", "x11", "replay" のいずれか
+        **options: バックエンドのコンストラクタ引数（replayなら source など）
+    
+    Returns:
+        CaptureBackend: 作成したバックエンド
+    """
+    if name == 'auto':
+        # Linux上のX11ではSHMで直接取得し、使えなければpyautoguiに戻る
+        if sys.platform.startswith('linux') and os.environ.get('DISPLAY'):
+            try:
+                return X11ShmBackend(**options)
+            except (RuntimeError, OSError):
+                pass
+        return PyAutoGUIBackend()
+    
+    try:
+        backend_class = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"未知のキャプチャバックエンド: {name} (選択肢: auto, {', '.join(BACKENDS)})")
+    return backend_class(**options)
+
+
+_default_backend = None
+
+
+def default_backend():
+    """プロセス内で共有する既定のバックエンドを取得（初回に作成）"""
+    global _default_backend
+    if _default_backend is None:
+        _default_backend = create_backend('auto')
+    return _default_backend
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+仮想ディスプレイ（Xvfb）ごとのワーカーでワークフローを並列実行
+ImageClicker は1つの画面とマウスを操作するので、1つの画面で同時に実行できるワークフローは1本だけです。
+ここではワーカープロセスごとに Xvfb の仮想ディスプレイを起動して DISPLAY を割り当て、
+キャプチャもクリックもそのディスプレイに対して行うことで、1台で複数のワークフローを同時に実行します。
+
+各ワーカーは共有の待ち行列からワークフローを1本ずつ取り出して実行するので、
+所要時間がばらばらでも空いたワーカーから順に次のワークフローが割り当てられます。
+
+使用例:
+    python run_workflows.py workflows --displays 4 --launch "firefox --kiosk https://example.com"
+
+Linux専用（Xvfb が必要: apt install xvfb、クリックには libxtst6 を推奨）
+"""
+
+import contextlib
+import multiprocessing
+import os
+import queue
+import select
+import shlex
+import signal
+import subprocess
+import time
+from pathlib import Path
+
+
+# 仮想ディスプレイの画面（幅x高さx色深度）
+XVFB_SCREEN = "1920x1080x24"
+# Xvfb の起動を待つ時間（秒）
+XVFB_START_TIMEOUT = 10.0
+# 終了を待つ時間（秒）。過ぎたら強制終了する
+STOP_TIMEOUT = 5.0
+
+
+class VirtualDisplay:
+    """Xvfb で起動した仮想ディスプレイ"""
+    
+    def __init__(self, screen=XVFB_SCREEN, xvfb="Xvfb"):
+        """
+        Args:
+            screen (str): 画面の大きさと色深度（例 "1920x1080x24"）
+            xvfb (str): Xvfb の実行ファイル
+        """
+        self.screen = screen
+        self.xvfb = xvfb
+        self.process = None
+        self.name = None
+    
+    def start(self, timeout=XVFB_START_TIMEOUT):
+        """
+        Xvfb を起動して接続できるようになるまで待つ
+        
+        ディスプレイ番号は Xvfb に空いている番号を選ばせ（-displayfd）、準備ができたときに通知を受けます。
+        
+        Returns:
+            VirtualDisplay: self（name に ":99" などのディスプレイ名が入る）
+        """
+        read_fd, write_fd = os.pipe()
+        try:
+            self.process = subprocess.Popen(
+                [self.xvfb, '-displayfd', str(write_fd), '-screen', '0', self.screen, '-nolisten', 'tcp'],
+                pass_fds=(write_fd,), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+        except FileNotFoundError:
+            os.close(read_fd)
+            raise RuntimeError(f"{self.xvfb} が見つかりません（apt install xvfb でインストールしてください）")
+        finally:
+            os.close(write_fd)
+        
+        with os.fdopen(read_fd, 'r') as f:
+            ready, _, _ = select.select([f], [], [], timeout)
+            number = f.readline().strip() if ready else ""
+        if not number.isdigit():
+            code = self.process.poll()
+            self.stop()
+            reason = f"終了コード {code}" if code is not None else f"{timeout}秒以内に準備ができませんでした"
+            raise RuntimeError(f"Xvfb の起動に失敗しました（{reason}）")
+        self.name = f":{number}"
+        return self
+    
+    def stop(self):
+        """Xvfb を終了"""
+        if self.process is not None:
+            _terminate(self.process)
+            self.process = None
+    
+    def __enter__(self):
+        return self.start()
+    
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def _terminate(process):
+    """子プロセスを終了（応答しなければ強制終了）"""
+    if process.poll() is not None:
+        return
+    process.terminate()
+    try:
+        process.wait(STOP_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def _launch(command, display):
+    """ワークフローの対象アプリをそのディスプレイで起動（プロセスグループごと終了できるようにする）"""
+    env = dict(os.environ, DISPLAY=display)
+    return subprocess.Popen(shlex.split(command), env=env, start_new_session=True,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def _stop_launched(process):
+    """_launch で起動したアプリとその子プロセスを終了"""
+    if process.poll() is None:
+        with contextlib.suppress(ProcessLookupError):
+            os.killpg(process.pid, signal.SIGTERM)
+    try:
+        process.wait(STOP_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        with contextlib.suppress(ProcessLookupError):
+            os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+
+
+def _error_result(path, error):
+    """実行できなかったワークフローの結果（run_workflows.run_one のエラー時と同じ形）"""
+    path = Path(path)
+    return {
+        'name': path.stem,
+        'source': str(path),
+        'success': False,
+        'elapsed': 0.0,
+        'error': error,
+        'steps': [],
+    }
+
+
+def _worker(display, jobs, results, args):
+    """
+    ワーカープロセス: 待ち行列からワークフローを取り出して、割り当てられたディスプレイで実行
+    
+    DISPLAY はモジュールを読み込む前に設定する（pyautogui は読み込み時に接続先を決めるため）。
+    キャプチャバックエンドとクリックの接続はワーカーごとに1つ作り、すべてのワークフローで使い回す。
+    """
+    os.environ['DISPLAY'] = display
+    from metrics import Metrics
+    from run_workflows import make_clicker, run_one
+    
+    with contextlib.ExitStack() as stack:
+        metrics = stack.enter_context(Metrics(args.metrics_jsonl)) if args.metrics_jsonl else None
+        if args.quiet:
+            devnull = stack.enter_context(open(os.devnull, 'w'))
+            stack.enter_context(contextlib.redirect_stdout(devnull))
+        try:
+            clicker = stack.enter_context(make_clicker(args, metrics))
+            setup_error = None
+        except Exception as e:
+            # 作れない理由はワークフローごとの結果のエラーとして報告する（ジョブごとに作り直さない）
+            clicker = None
+            setup_error = f"{type(e).__name__}: {e}"
+        
+        while True:
+            job = jobs.get()
+            if job is None:
+                break
+            index, path = job
+            if setup_error is not None:
+                result = _error_result(path, setup_error)
+                result['display'] = display
+                results.put((index, result))
+                continue
+            app = _launch(args.launch, display) if args.launch else None
+            try:
+                if app is not None:
+                    time.sleep(args.launch_wait)
+                result = run_one(path, args, metrics, clicker=clicker)
+            finally:
+                if app is not None:
+                    _stop_launched(app)
+            result['display'] = display
+            results.put((index, result))
+
+
+class DisplayPool:
+    """
+    仮想ディスプレイを1つずつ持つワーカープロセスの集まり
+    
+    with ブロックを抜けるとワーカーと Xvfb をすべて終了します。
+    """
+    
+    def __init__(self, workers, screen=XVFB_SCREEN, xvfb="Xvfb"):
+        """
+        Args:
+            workers (int): ワーカー（仮想ディスプレイ）の数
+            screen (str): 仮想ディスプレイの画面（幅x高さx色深度）
+            xvfb (str): Xvfb の実行ファイル
+        """
+        self.workers = workers
+        self.displays = [VirtualDisplay(screen, xvfb) for _ in range(workers)]
+    
+    def start(self):
+        try:
+            for display in self.displays:
+                display.start()
+        except Exception:
+            self.close()
+            raise
+        return self
+    
+    def run(self, paths, args):
+        """
+        ワークフローを空いているワーカーに順に割り当てて実行
+        
+        Args:
+            paths (list[Path]): ワークフローJSONまたはバンドル
+            args (argparse.Namespace): run_workflows の引数
+        
+        Returns:
+            list[dict]: paths と同じ順の実行結果（display に実行したディスプレイ名）
+        """
+        context = multiprocessing.get_context('spawn')
+        jobs = context.Queue()
+        results = context.Queue()
+        for job in enumerate(paths):
+            jobs.put(job)
+        for _ in self.displays:
+            jobs.put(None)
+        
+        processes = [context.Process(target=_worker, args=(display.name, jobs, results, args),
+                                     name=f"display-{display.name}", daemon=True)
+                     for display in self.displays]
+        for process in processes:
+            process.start()
+        
+        collected = {}
+        try:
+            while len(collected) < len(paths):
+                try:
+                    index, result = results.get(timeout=1.0)
+                except queue.Empty:
+                    if not any(process.is_alive() for process in processes):
+                        # ワーカーがすべて終了した。終了前に送られて残っている結果を受け取ってから、
+                        # 届いていないワークフローはエラーにする
+                        with contextlib.suppress(queue.Empty):
+                            while True:
+                                index, result = results.get_nowait()
+                                collected[index] = result
+                        break
+                    continue
+                collected[index] = result
+        finally:
+            for process in processes:
+                process.join(STOP_TIMEOUT)
+                if process.is_alive():
+                    process.terminate()
+        
+        return [collected.get(index) or _error_result(path, "ワーカーが異常終了しました")
+                for index, path in enumerate(paths)]
+    
+    def close(self):
+        """仮想ディスプレイをすべて終了"""
+        for display in self.displays:
+            display.stop()
+    
+    def __enter__(self):
+        return self.start()
+    
+    def __exit__(self, *exc):
+        self.close()
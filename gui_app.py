@@ -6,11 +6,14 @@
 
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog, scrolledtext
-import pyautogui
-from PIL import Image, ImageTk
-import os
+import io
+import math
 from pathlib import Path
 from image_clicker import ImageClicker
+from lazy_modules import lazy_import
+from template_catalog import TemplateCatalog
+from workflow_bundle import BUNDLE_SUFFIX, WorkflowBundle, is_bundle, write_bundle
+from workflow_engine import DEFAULT_STEP_TIMEOUT, WorkflowEngine, compile_workflow
 import threading
 import time
 import json
@@ -35,6 +38,7 @@ def load_config():
             "settings": {
                 "default_confidence": 0.8,
                 "default_timeout": 10,
+                "fast_click": False,
                 "screenshot_delay": 3,
                 "max_selections": 8
             },
@@ -47,6 +51,123 @@ def load_config():
 # 設定を読み込み
 CONFIG = load_config()
 
+# PIL.ImageTk・OpenCVは範囲選択画面を開くときに読み込む
+ImageTk = lazy_import('PIL.ImageTk')
+Image = lazy_import('PIL.Image')
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+
+# 範囲選択画面のプレビューの最大画素数（これより大きい画面は縮小して表示し、原寸はルーペで確認）
+PREVIEW_MAX_PIXELS = 2560 * 1440
+# ルーペに表示する原寸の範囲（カーソルからの距離、ピクセル）と拡大率、カーソルからの表示位置のずれ
+LOUPE_RADIUS = 20
+LOUPE_ZOOM = 4
+LOUPE_OFFSET = 24
+
+
+class PreviewScale:
+    """スクリーンショットと、画面に収まるように縮小したプレビューの座標変換"""
+    
+    def __init__(self, width, height, max_width, max_height, max_pixels=PREVIEW_MAX_PIXELS):
+        """
+        Args:
+            width, height (int): スクリーンショットの大きさ
+            max_width, max_height (int): プレビューを表示する画面の大きさ
+            max_pixels (int): プレビューの最大画素数
+        """
+        scale = min(1.0, max_width / width, max_height / height, math.sqrt(max_pixels / (width * height)))
+        self.width = width
+        self.height = height
+        self.preview_width = max(int(width * scale), 1)
+        self.preview_height = max(int(height * scale), 1)
+        # 実際の倍率は切り捨てた後の大きさから求める（プレビューの端が元画像の端に対応するように）
+        self.scale_x = self.preview_width / width
+        self.scale_y = self.preview_height / height
+        # 画面より小さいプレビューは中央に表示
+        self.offset_x = max((max_width - self.preview_width) // 2, 0)
+        self.offset_y = max((max_height - self.preview_height) // 2, 0)
+    
+    @property
+    def is_scaled(self):
+        """縮小しているかどうか"""
+        return (self.preview_width, self.preview_height) != (self.width, self.height)
+    
+    def to_original(self, x, y):
+        """キャンバス座標を元のスクリーンショットの座標に変換（範囲外は端に切り詰める）"""
+        ox = int(math.floor((x - self.offset_x) / self.scale_x))
+        oy = int(math.floor((y - self.offset_y) / self.scale_y))
+        return min(max(ox, 0), self.width), min(max(oy, 0), self.height)
+    
+    def to_canvas(self, x, y):
+        """元のスクリーンショットの座標をキャンバス座標に変換"""
+        return x * self.scale_x + self.offset_x, y * self.scale_y + self.offset_y
+
+
+class ScreenshotPreview:
+    """
+    範囲選択画面に表示する縮小プレビューと、カーソル付近を原寸で拡大表示するルーペ
+    
+    PhotoImage にするのは縮小した画像とルーペの小さな画像だけなので、
+    4Kやマルチモニターの画面でもすぐに開けます。
+    """
+    
+    def __init__(self, canvas, screenshot, max_width, max_height):
+        self.canvas = canvas
+        self.screenshot = screenshot
+        self.scale = PreviewScale(screenshot.width, screenshot.height, max_width, max_height)
+        self.photo = ImageTk.PhotoImage(self._downscale())
+        canvas.create_image(self.scale.offset_x, self.scale.offset_y, anchor=tk.NW, image=self.photo)
+        self._loupe_photo = None
+        self._loupe_at = None
+    
+    def _downscale(self):
+        if not self.scale.is_scaled:
+            return self.screenshot
+        size = (self.scale.preview_width, self.scale.preview_height)
+        image = np.asarray(self.screenshot)
+        # 整数倍の INTER_AREA は速いので、整数倍で縮小してから残りを線形補間で合わせる
+        factor = int(1 / max(self.scale.scale_x, self.scale.scale_y))
+        if factor >= 2:
+            image = cv2.resize(image, (image.shape[1] // factor, image.shape[0] // factor),
+                               interpolation=cv2.INTER_AREA)
+        return Image.fromarray(cv2.resize(image, size, interpolation=cv2.INTER_LINEAR))
+    
+    @property
+    def center_x(self):
+        """プレビューの中央のキャンバス座標（説明テキストの位置）"""
+        return self.scale.offset_x + self.scale.preview_width // 2
+    
+    def to_original(self, x, y):
+        return self.scale.to_original(x, y)
+    
+    def show_loupe(self, x, y):
+        """キャンバス座標 (x, y) の周辺を原寸で拡大し、選択される画素と座標を表示"""
+        ox, oy = self.to_original(x, y)
+        size = (LOUPE_RADIUS * 2 + 1) * LOUPE_ZOOM
+        if (ox, oy) != self._loupe_at:
+            self._loupe_at = (ox, oy)
+            # 画面の外にはみ出した部分は黒で埋められる
+            region = self.screenshot.crop((ox - LOUPE_RADIUS, oy - LOUPE_RADIUS,
+                                           ox + LOUPE_RADIUS + 1, oy + LOUPE_RADIUS + 1))
+            self._loupe_photo = ImageTk.PhotoImage(region.resize((size, size), Image.NEAREST))
+        
+        # 画面の端ではカーソルの反対側に表示
+        width, height = self.canvas.winfo_width(), self.canvas.winfo_height()
+        lx = x + LOUPE_OFFSET if x + LOUPE_OFFSET + size < width else x - LOUPE_OFFSET - size
+        ly = y + LOUPE_OFFSET if y + LOUPE_OFFSET + size + 24 < height else y - LOUPE_OFFSET - size - 24
+        
+        self.canvas.delete("loupe")
+        self.canvas.create_image(lx, ly, anchor=tk.NW, image=self._loupe_photo, tags="loupe")
+        self.canvas.create_rectangle(lx, ly, lx + size, ly + size, outline="white", width=2, tags="loupe")
+        cx, cy = lx + LOUPE_RADIUS * LOUPE_ZOOM, ly + LOUPE_RADIUS * LOUPE_ZOOM
+        self.canvas.create_rectangle(cx, cy, cx + LOUPE_ZOOM, cy + LOUPE_ZOOM, outline="red", tags="loupe")
+        self.canvas.create_rectangle(lx, ly + size, lx + size, ly + size + 24, fill="black", tags="loupe")
+        self.canvas.create_text(lx + size // 2, ly + size + 12, text=f"{ox}, {oy}",
+                                fill="white", font=("Arial", 12), tags="loupe")
+    
+    def hide_loupe(self):
+        self.canvas.delete("loupe")
+
 class SingleScreenshotSelector:
     """単一範囲選択用スクリーンショットセレクター"""
     
@@ -67,24 +188,26 @@ class SingleScreenshotSelector:
         self.canvas = tk.Canvas(self.root, highlightthickness=0)
         self.canvas.pack(fill=tk.BOTH, expand=True)
         
-        # スクリーンショットを表示
-        self.photo = ImageTk.PhotoImage(screenshot)
-        self.canvas.create_image(0, 0, anchor=tk.NW, image=self.photo)
+        # スクリーンショットを画面に収まる大きさで表示（原寸はカーソル付近のルーペで確認）
+        self.preview = ScreenshotPreview(self.canvas, screenshot,
+                                         self.root.winfo_screenwidth(), self.root.winfo_screenheight())
         
         # イベントバインド
         self.canvas.bind("<ButtonPress-1>", self.on_press)
         self.canvas.bind("<B1-Motion>", self.on_drag)
         self.canvas.bind("<ButtonRelease-1>", self.on_release)
+        self.canvas.bind("<Motion>", lambda e: self.preview.show_loupe(e.x, e.y))
+        self.canvas.bind("<Leave>", lambda e: self.preview.hide_loupe())
         self.root.bind("<Escape>", lambda e: self.cancel())
         
         # 説明テキスト
         self.canvas.create_text(
-            self.screenshot.width // 2, 30,
+            self.preview.center_x, 30,
             text="ドラッグして範囲を選択 (ESCでキャンセル)",
             fill="white", font=("Arial", 22, "bold")
         )
         self.canvas.create_text(
-            self.screenshot.width // 2, 32,
+            self.preview.center_x, 32,
             text="ドラッグして範囲を選択 (ESCでキャンセル)",
             fill="black", font=("Arial", 22, "bold")
         )
@@ -110,16 +233,16 @@ class SingleScreenshotSelector:
                 self.start_x, self.start_y,
                 event.x, event.y
             )
+        self.preview.show_loupe(event.x, event.y)
     
     def on_release(self, event):
         """マウスリリース時"""
         if self.start_x and self.start_y:
-            x1 = min(self.start_x, event.x)
-            y1 = min(self.start_y, event.y)
-            x2 = max(self.start_x, event.x)
-            y2 = max(self.start_y, event.y)
+            # 縮小表示の座標を元のスクリーンショットの座標に戻す
+            x1, y1 = self.preview.to_original(min(self.start_x, event.x), min(self.start_y, event.y))
+            x2, y2 = self.preview.to_original(max(self.start_x, event.x), max(self.start_y, event.y))
             
-            if x2 - x1 > 10 and y2 - y1 > 10:  # 最小サイズチェック
+            if x2 - x1 > 10 and y2 - y1 > 10:  # 最小サイズチェック（元の画像のピクセル数）
                 self.selection = (x1, y1, x2, y2)
                 self.root.destroy()
     
@@ -161,14 +284,16 @@ class MultiScreenshotSelector:
         self.canvas = tk.Canvas(self.root, highlightthickness=0)
         self.canvas.pack(fill=tk.BOTH, expand=True)
         
-        # スクリーンショットを表示
-        self.photo = ImageTk.PhotoImage(screenshot)
-        self.canvas.create_image(0, 0, anchor=tk.NW, image=self.photo)
+        # スクリーンショットを画面に収まる大きさで表示（原寸はカーソル付近のルーペで確認）
+        self.preview = ScreenshotPreview(self.canvas, screenshot,
+                                         self.root.winfo_screenwidth(), self.root.winfo_screenheight())
         
         # イベントバインド
         self.canvas.bind("<ButtonPress-1>", self.on_press)
         self.canvas.bind("<B1-Motion>", self.on_drag)
         self.canvas.bind("<ButtonRelease-1>", self.on_release)
+        self.canvas.bind("<Motion>", lambda e: self.preview.show_loupe(e.x, e.y))
+        self.canvas.bind("<Leave>", lambda e: self.preview.hide_loupe())
         self.root.bind("<Escape>", lambda e: self.finish())
         self.root.bind("<Return>", lambda e: self.finish())
         
@@ -187,12 +312,12 @@ class MultiScreenshotSelector:
         
         # 新しいテキストを表示
         self.canvas.create_text(
-            self.screenshot.width // 2, 30,
+            self.preview.center_x, 30,
             text=text, fill="white", font=("Arial", 20, "bold"),
             tags="instruction"
         )
         self.canvas.create_text(
-            self.screenshot.width // 2, 32,
+            self.preview.center_x, 32,
             text=text, fill="black", font=("Arial", 20, "bold"),
             tags="instruction"
         )
@@ -219,16 +344,16 @@ class MultiScreenshotSelector:
                 self.start_x, self.start_y,
                 event.x, event.y
             )
+        self.preview.show_loupe(event.x, event.y)
     
     def on_release(self, event):
         """マウスリリース時"""
         if self.start_x and self.start_y:
-            x1 = min(self.start_x, event.x)
-            y1 = min(self.start_y, event.y)
-            x2 = max(self.start_x, event.x)
-            y2 = max(self.start_y, event.y)
+            # 縮小表示の座標を元のスクリーンショットの座標に戻す
+            x1, y1 = self.preview.to_original(min(self.start_x, event.x), min(self.start_y, event.y))
+            x2, y2 = self.preview.to_original(max(self.start_x, event.x), max(self.start_y, event.y))
             
-            if x2 - x1 > 10 and y2 - y1 > 10:  # 最小サイズチェック
+            if x2 - x1 > 10 and y2 - y1 > 10:  # 最小サイズチェック（元の画像のピクセル数）
                 # 選択範囲を保存
                 self.selections.append({
                     'coords': (x1, y1, x2, y2),
@@ -299,18 +424,19 @@ class WorkflowRecorder:
             workflows_dir.mkdir(exist_ok=True)
             filename = workflows_dir / f"{self.workflow_name}.json"
         
-        # ワークフローメタ情報を追加
-        workflow_data = {
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(self.workflow_data(), f, ensure_ascii=False, indent=2)
+        
+        return filename
+    
+    def workflow_data(self):
+        """保存する形式のワークフロー（メタ情報付き）"""
+        return {
             'name': self.workflow_name,
             'created': datetime.now().isoformat(),
             'steps_count': len(self.workflow),
             'workflow': self.workflow
         }
-        
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(workflow_data, f, ensure_ascii=False, indent=2)
-        
-        return filename
             
     def load_workflow(self, filename):
         """ワークフローを読み込み"""
@@ -336,17 +462,26 @@ class ImageClickerGUIv015:
         self.root.geometry("1260x1050")
         
         # ImageClickerインスタンス
-        self.clicker = ImageClicker(confidence=0.8)
+        # fast_click: 待機せずにクリックし、画面の変化でクリックが効いたことを確認する
+        self.clicker = ImageClicker(confidence=0.8, fast=CONFIG['settings'].get('fast_click', False))
+        # 読み込み中のワークフローのバンドル（別のワークフローを読み込むと閉じる）
+        self.bundle = None
         
-        # 画像リスト
-        self.image_files = []
+        # 画像リスト（リストボックスに表示中の画像ファイル名）
+        self.image_names = []
+        self._refreshing = False
+        self._thumbnail = None
         
         # ワークフローレコーダー
         self.recorder = WorkflowRecorder(self)
+        self.last_run_results = []
         
         # ディレクトリを作成
         self.setup_directories()
         
+        # 画像の目録（フォルダの変更分だけ読み直すので、画像が多くても一覧の更新が速い）
+        self.catalog = TemplateCatalog(self.clicker.images_dir, workflows_dir=self.workflows_dir)
+        
         # カスタムスタイル
         self.setup_styles()
         self.setup_ui()
@@ -432,6 +567,23 @@ class ImageClickerGUIv015:
         list_frame = ttk.LabelFrame(parent, text="💾 保存済み画像", padding="10")
         list_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
         
+        # 名前で絞り込み
+        filter_frame = ttk.Frame(list_frame)
+        filter_frame.pack(side=tk.TOP, fill=tk.X, pady=(0, 5))
+        ttk.Label(filter_frame, text="🔍 絞り込み:").pack(side=tk.LEFT)
+        self.image_filter_var = tk.StringVar()
+        self.image_filter_var.trace_add('write', lambda *args: self.show_image_list())
+        ttk.Entry(filter_frame, textvariable=self.image_filter_var, width=30).pack(side=tk.LEFT, padx=5)
+        
+        # 選択した画像のサムネイルと情報
+        preview_frame = ttk.Frame(list_frame, width=220)
+        preview_frame.pack(side=tk.RIGHT, fill=tk.Y, padx=(5, 0))
+        self.thumbnail_label = ttk.Label(preview_frame)
+        self.thumbnail_label.pack(pady=5)
+        self.image_info_var = tk.StringVar()
+        ttk.Label(preview_frame, textvariable=self.image_info_var, wraplength=210,
+                  justify=tk.LEFT).pack(fill=tk.X)
+        
         # リストボックスとスクロールバー
         scrollbar = ttk.Scrollbar(list_frame)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
@@ -439,6 +591,7 @@ class ImageClickerGUIv015:
         self.listbox = tk.Listbox(list_frame, yscrollcommand=scrollbar.set, height=11)
         self.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         scrollbar.config(command=self.listbox.yview)
+        self.listbox.bind("<<ListboxSelect>>", lambda e: self.show_image_details())
         
         # リスト操作ボタン
         list_buttons = ttk.Frame(list_frame)
@@ -502,7 +655,7 @@ class ImageClickerGUIv015:
         info_text.insert(tk.END, "【STEP2】 複数範囲選択ボタンをクリック\n") 
         info_text.insert(tk.END, "【STEP3】 1個目→赤枠、2個目→青枠、3個目→緑枠...と連続選択\n")
         info_text.insert(tk.END, "【STEP4】 Enterキーで完了\n")
-        info_text.insert(tk.END, "【結果】 button_01.png、button_02.png...と連番で自動保存")
+        info_text.insert(tk.END, "【結果】 button_<ハッシュ>.png の名前で自動保存（同じ画像は再利用）")
         info_text.config(state=tk.DISABLED)
         
         # 設定フレーム
@@ -641,6 +794,7 @@ class ImageClickerGUIv015:
         
         ttk.Button(mgmt_buttons, text="🔄 更新", command=self.refresh_saved_workflows, width=10).pack(side=tk.LEFT, padx=2)
         ttk.Button(mgmt_buttons, text="📥 外部読込", command=self.load_external_workflow, width=12).pack(side=tk.LEFT, padx=2)
+        ttk.Button(mgmt_buttons, text="📦 バンドル書き出し", command=self.export_workflow_bundle, width=18).pack(side=tk.LEFT, padx=2)
         
         # ワークフロー表示
         workflow_frame = ttk.LabelFrame(parent, text="📋 記録されたワークフロー", padding="10")
@@ -677,7 +831,7 @@ class ImageClickerGUIv015:
         time.sleep(3)
         
         # スクリーンショット撮影
-        screenshot = pyautogui.screenshot()
+        screenshot = self.clicker.screenshot()
         
         # 範囲選択（単一用）
         selector = SingleScreenshotSelector(screenshot)
@@ -712,6 +866,9 @@ class ImageClickerGUIv015:
                     
                     filepath = self.clicker.images_dir / filename
                     cropped.save(filepath)
+                    # 同じ名前で撮り直した場合は前回の位置を使わない
+                    if self.clicker.positions is not None:
+                        self.clicker.positions.forget(filename)
                     
                     self.status_var.set(f"保存しました: {filename}")
                     self.refresh_image_list()
@@ -723,6 +880,23 @@ class ImageClickerGUIv015:
         else:
             self.status_var.set("キャンセルされました")
     
+    def save_capture(self, cropped, prefix):
+        """
+        撮影した画像を内容のハッシュを名前にして保存し、画像ファイル名を返す
+        
+        まったく同じ画像は確認せずに既存のファイルを使い、ほぼ同じ画像は再利用するか確認します。
+        """
+        name = self.catalog.find_identical(cropped)
+        if name is not None:
+            return name
+        
+        similar = self.catalog.find_similar(cropped)
+        if similar:
+            name = similar[0][0]
+            if messagebox.askyesno("確認", f"ほぼ同じ画像「{name}」が既にあります。\nこの画像を再利用しますか？"):
+                return name
+        return self.catalog.store(cropped, prefix=prefix)
+    
     def workflow_screenshot_and_click(self):
         """ワークフロー用スクリーンショット撮影＋自動でクリック操作追加"""
         if not self.recorder.is_recording:
@@ -737,7 +911,7 @@ class ImageClickerGUIv015:
         time.sleep(3)
         
         # スクリーンショット撮影
-        screenshot = pyautogui.screenshot()
+        screenshot = self.clicker.screenshot()
         
         # 範囲選択
         selector = SingleScreenshotSelector(screenshot)
@@ -750,13 +924,8 @@ class ImageClickerGUIv015:
             x1, y1, x2, y2 = selection
             cropped = screenshot.crop((x1, y1, x2, y2))
             
-            # ファイル名生成
-            timestamp = int(time.time())
-            filename = f"workflow_{self.recorder.current_step}_{timestamp}.png"
-            filepath = self.clicker.images_dir / filename
-            
-            # 保存
-            cropped.save(filepath)
+            # 保存（同じ画像が既にあればそのファイルを使う）
+            filename = self.save_capture(cropped, "workflow")
             
             # ワークフローに追加（スクリーンショット）
             self.recorder.add_step('screenshot', {
@@ -786,7 +955,7 @@ class ImageClickerGUIv015:
         time.sleep(3)
         
         # スクリーンショット撮影
-        screenshot = pyautogui.screenshot()
+        screenshot = self.clicker.screenshot()
         
         # 複数範囲選択
         selector = MultiScreenshotSelector(screenshot, self.multi_count_var.get())
@@ -797,7 +966,6 @@ class ImageClickerGUIv015:
         
         if selections:
             base_name = self.base_name_var.get()
-            timestamp = int(time.time())
             
             self.multi_result_text.delete(1.0, tk.END)
             self.multi_result_text.insert(tk.END, f"✅ 選択した範囲: {len(selections)}個\n\n")
@@ -808,12 +976,8 @@ class ImageClickerGUIv015:
                 color = selection['color']
                 cropped = screenshot.crop((x1, y1, x2, y2))
                 
-                # ファイル名生成
-                filename = f"{base_name}_{timestamp}_{i:02d}.png"
-                filepath = self.clicker.images_dir / filename
-                
-                # 保存
-                cropped.save(filepath)
+                # 保存（同じ画像が既にあればそのファイルを使う）
+                filename = self.save_capture(cropped, base_name)
                 
                 # 結果表示
                 result_text = f"{i}. {filename} (枠色: {color})\n"
@@ -834,6 +998,7 @@ class ImageClickerGUIv015:
             if not workflow_name:
                 workflow_name = f"workflow_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
             
+            self.release_bundle()
             self.recorder.start_recording(workflow_name)
             self.record_button.config(text="⏹️ 記録停止")
             self.workflow_text.delete(1.0, tk.END)
@@ -888,6 +1053,7 @@ class ImageClickerGUIv015:
         
         workflow_file = self.workflows_dir / f"{workflow_name}.json"
         if workflow_file.exists():
+            self.release_bundle()
             self.recorder.load_workflow(workflow_file)
             self.workflow_name_var.set(self.recorder.workflow_name)
             self.update_workflow_display()
@@ -899,16 +1065,63 @@ class ImageClickerGUIv015:
         """外部ワークフローを読み込み"""
         filename = filedialog.askopenfilename(
             title="ワークフローファイルを選択",
-            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+            filetypes=[("JSON files", "*.json"), ("Workflow bundles", f"*{BUNDLE_SUFFIX}"), ("All files", "*.*")]
         )
         
-        if filename:
+        if filename and is_bundle(filename):
+            # バンドルの画像は images フォルダに書き出さず、そのまま照合に使う
+            try:
+                bundle = WorkflowBundle(filename)
+            except (OSError, ValueError) as e:
+                messagebox.showerror("エラー", str(e))
+                return
+            self.release_bundle()
+            self.bundle = bundle
+            self.clicker.use_bundle(bundle)
+            self.recorder.workflow_name = bundle.name
+            self.recorder.workflow = bundle.steps
+            self.workflow_name_var.set(self.recorder.workflow_name)
+            self.update_workflow_display()
+            messagebox.showinfo("成功", f"バンドルを読み込みました: {Path(filename).name}（画像 {len(bundle.templates)}個）")
+        elif filename:
+            self.release_bundle()
             self.recorder.load_workflow(filename)
             self.workflow_name_var.set(self.recorder.workflow_name)
             self.update_workflow_display()
             self.refresh_saved_workflows()
             messagebox.showinfo("成功", f"ワークフローを読み込みました: {Path(filename).name}")
     
+    def release_bundle(self):
+        """前に読み込んだバンドルの画像を照合に使わないようにし、バンドルを閉じる"""
+        self.clicker.bundled_templates.clear()
+        if self.bundle is not None:
+            self.bundle.close()
+            self.bundle = None
+    
+    def export_workflow_bundle(self):
+        """ワークフローと使う画像を1ファイル（.icwf）に書き出す"""
+        if not self.recorder.workflow:
+            messagebox.showwarning("警告", "ワークフローが記録されていません")
+            return
+        
+        filename = filedialog.asksaveasfilename(
+            title="バンドルの保存先",
+            defaultextension=BUNDLE_SUFFIX,
+            initialfile=f"{self.recorder.workflow_name}{BUNDLE_SUFFIX}",
+            filetypes=[("Workflow bundles", f"*{BUNDLE_SUFFIX}")]
+        )
+        if not filename:
+            return
+        
+        try:
+            written = write_bundle(filename, self.recorder.workflow_data(), self.clicker.images_dir,
+                                   self.clicker.template_cache)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("エラー", f"バンドルの書き出しに失敗しました: {e}")
+            return
+        self.status_var.set(f"📦 バンドルを保存しました: {Path(filename).name}"
+                            f"（画像 {written['images']}個 / {written['bytes'] / 1024:.0f}KB）")
+    
     def update_workflow_display(self):
         """ワークフロー表示を更新"""
         self.workflow_text.delete(1.0, tk.END)
@@ -948,23 +1161,24 @@ class ImageClickerGUIv015:
         self.root.iconify()
         
         def execute_task():
-            for i, step in enumerate(self.recorder.workflow):
-                self.status_var.set(f"🚀 ステップ {i+1}/{len(self.recorder.workflow)} を実行中...")
-                
-                if step['type'] == 'screenshot':
-                    # スクリーンショットはスキップ（実行時には不要）
-                    continue
-                    
-                elif step['type'] == 'click':
-                    # 画像をクリック
-                    self.clicker.confidence = step['data']['confidence']
-                    success = self.clicker.click_image(step['data']['image'], timeout=10)
-                    if not success:
-                        print(f"❌ クリック失敗: {step['data']['image']}")
-                    
-                elif step['type'] == 'wait':
-                    # 待機
-                    time.sleep(step['data']['duration'])
+            # 実行はGUIに依存しないワークフローエンジンに任せる
+            def on_step(index, total, step):
+                self.status_var.set(f"🚀 ステップ {index+1}/{total} を実行中...")
+            
+            try:
+                plan = compile_workflow(self.recorder.workflow, self.recorder.workflow_name,
+                                        CONFIG['settings'].get('default_timeout', DEFAULT_STEP_TIMEOUT))
+                result = WorkflowEngine(self.clicker).run(plan, on_step=on_step)
+            except Exception as e:
+                self.root.deiconify()
+                self.status_var.set(f"❌ ワークフロー実行エラー: {e}")
+                return
+            
+            # ステップごとの実行結果（一致した探索リング・所要時間など）
+            self.last_run_results = result['steps']
+            for step_result in result['steps']:
+                if not step_result['success']:
+                    print(f"❌ クリック失敗: {step_result['image']}")
             
             # 完了
             self.root.deiconify()
@@ -976,32 +1190,79 @@ class ImageClickerGUIv015:
         thread.start()
     
     def refresh_image_list(self):
-        """画像リスト更新"""
-        self.listbox.delete(0, tk.END)
+        """画像フォルダの変更を目録に反映してからリストを更新（別スレッドで実行）"""
+        if self._refreshing:
+            return
+        self._refreshing = True
+        
+        def refresh_task():
+            error = None
+            try:
+                self.catalog.refresh()
+            except Exception as e:
+                # 更新に失敗しても、今ある目録の内容でリストを表示してエラーを知らせる
+                error = f"❌ 画像一覧の更新に失敗しました: {e}"
+            finally:
+                self._refreshing = False
+            self.root.after(0, self.show_image_list, error)
+        
+        thread = threading.Thread(target=refresh_task)
+        thread.daemon = True
+        thread.start()
+    
+    def show_image_list(self, error=None):
+        """
+        目録から絞り込み条件に合う画像を表示
         
-        if self.clicker.images_dir.exists():
-            self.image_files = list(self.clicker.images_dir.glob("*.png"))
-            self.image_files.extend(list(self.clicker.images_dir.glob("*.jpg")))
-            self.image_files.extend(list(self.clicker.images_dir.glob("*.jpeg")))
-            
-            for image_file in sorted(self.image_files):
-                self.listbox.insert(tk.END, image_file.name)
+        Args:
+            error (str): 目録の更新に失敗した場合にステータスバーに表示するメッセージ
+        """
+        self.image_names = [entry['name'] for entry in self.catalog.list(self.image_filter_var.get())]
         
-        if not self.recorder.is_recording:
-            self.status_var.set(f"📁 {len(self.image_files)}個の画像")
+        self.listbox.delete(0, tk.END)
+        if self.image_names:
+            self.listbox.insert(tk.END, *self.image_names)
+        self.show_image_details()
+        
+        if error:
+            self.status_var.set(error)
+        elif not self.recorder.is_recording:
+            self.status_var.set(f"📁 {len(self.image_names)}個の画像")
+    
+    def show_image_details(self):
+        """選択した画像のサムネイル・大きさ・使用しているワークフローを表示"""
+        selection = self.listbox.curselection()
+        entry = self.catalog.get(self.listbox.get(selection[0])) if selection else None
+        if entry is None:
+            self._thumbnail = None
+            self.thumbnail_label.configure(image="")
+            self.image_info_var.set("")
+            return
+        
+        data = self.catalog.thumbnail(entry['name'])
+        self._thumbnail = ImageTk.PhotoImage(Image.open(io.BytesIO(data))) if data else None
+        self.thumbnail_label.configure(image=self._thumbnail or "")
+        workflows = "、".join(Path(name).stem for name in entry['workflows']) or "なし"
+        self.image_info_var.set(
+            f"{entry['width']}x{entry['height']} / {entry['size'] / 1024:.1f}KB\n使用しているワークフロー: {workflows}"
+        )
     
     def delete_image(self):
         """選択した画像を削除"""
         selection = self.listbox.curselection()
         if selection:
-            index = selection[0]
-            image_file = self.image_files[index]
+            # リストボックスに表示している名前から削除する画像を決める
+            image_name = self.listbox.get(selection[0])
+            image_file = self.clicker.images_dir / image_name
             
-            if messagebox.askyesno("確認", f"{image_file.name}を削除しますか？"):
+            if messagebox.askyesno("確認", f"{image_name}を削除しますか？"):
                 try:
                     image_file.unlink()
-                    self.refresh_image_list()
-                    self.status_var.set(f"🗑️ 削除しました: {image_file.name}")
+                    self.catalog.forget(image_name)
+                    if self.clicker.positions is not None:
+                        self.clicker.positions.forget(image_name)
+                    self.show_image_list()
+                    self.status_var.set(f"🗑️ 削除しました: {image_name}")
                 except Exception as e:
                     messagebox.showerror("エラー", f"削除に失敗しました: {e}")
     
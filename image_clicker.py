@@ -1,18 +1,1003 @@
 #!/usr/bin/env python3
 """
 画像クリックツール
-pyautoguiを使用して画面上の指定された画像を検索してクリックします
+画面上の指定された画像を検索してクリックします
+（画面の取得方法は capture_backends.py で切り替え可能）
 """
 
-import pyautogui
 import time
-import os
 import sys
+import threading
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
 from pathlib import Path
 
+from capture_backends import CaptureBackend, create_backend, default_backend
+from lazy_modules import lazy_import
+from metrics import NullMetrics
+from poll_scheduler import PollScheduler
+from position_memory import POSITIONS_FILE_NAME, PositionMemory
+from template_store import CompiledTemplateStore
+from tracing import NullTracer
+
+# OpenCV・NumPyは最初に使う時点で読み込む（--help などの起動を速くするため）
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+
+
+# テンプレートキャッシュのデフォルト上限（バイト）
+DEFAULT_CACHE_BYTES = 256 * 1024 * 1024
+
+# ピラミッド探索で試す縮小率（大きい順）と、縮小後テンプレートの最小辺・最小面積（ピクセル）
+# 1440pの合成画面で、全解像度の照合と同じ位置が見つかる範囲で最も粗くなるように選んだ値
+# （30x30 のボタンは縮小率4で約16倍速くなり、縮小後の短辺が5以下だと粗い段階で見落とすことがあった）
+PYRAMID_FACTORS = (8, 4, 2)
+PYRAMID_MIN_SIDE = 6
+PYRAMID_MIN_AREA = 48
+# 粗い段階で残す候補数
+PYRAMID_CANDIDATES = 5
+
+# 面積（画素数）がこれ以上のテンプレートは周波数領域（FFT）で照合（python -m benchmarks.matcher_bench --crossover で計測）
+# 画面側のDFTがキャッシュに無い場合でも、1080p・4Kの両方で計測したすべての大きさで通常の照合より速かった最小の面積。
+# グレースケールは通常の照合が十分速く、キャッシュが無い場合は計測した範囲（一辺512まで）では逆転しない
+FFT_MIN_AREA = 64 * 64
+FFT_MIN_AREA_GRAY = 512 * 512
+# 画面側のFFTを複数のテンプレートで使い回すため、ゼロ埋めの量をこの値以上の2のべき乗にそろえる
+FFT_MIN_PAD = 64
+# 1フレームが保持する画面側のDFTと積分画像の上限（バイト）。4Kのカラー画面ではDFTが1つの大きさで約100MB、
+# 積分画像が約250MBになるため、積分画像は上限の半分以下の場合だけ残し、DFTは入りきらない分を古い大きさから捨てる
+FFT_CACHE_BYTES = 128 * 1024 * 1024
+
+# locate_all で重なりとみなす IoU（これより重なる一致は一致度の高い方だけを残す）
+NMS_OVERLAP = 0.3
+# locate_all で非最大値抑制にかける候補の上限（一致度の高い順）
+NMS_MAX_CANDIDATES = 10000
+
+# 記録座標の周辺を探す際に順に広げる余白（ピクセル）。すべて外れたら全画面を探索
+SEARCH_RING_MARGINS = (8, 64, 256)
+FULL_SCREEN_RING = len(SEARCH_RING_MARGINS)
+# 前回見つかった位置（PositionMemory）で見つかった場合のリング番号
+LAST_POSITION_RING = -1
+
+# 高速クリックモードでクリックの効果を確かめる範囲（一致した矩形の周りの余白、ピクセル）
+VERIFY_MARGIN = 32
+# 変化とみなす画素値の差と、変化した画素数の下限（点滅するカーソル程度の変化は数えない）
+VERIFY_DELTA = 16
+VERIFY_MIN_PIXELS = 4
+# クリックの効果を確かめるキャプチャの間隔（秒）
+VERIFY_INTERVAL = 0.02
+
+# 画面変化を調べるタイルの大きさ（ピクセル）
+CHANGE_TILE = 64
+# 変化領域がこれより多い、または画面のこの割合より広い場合は全画面を再検索
+CHANGE_MAX_REGIONS = 32
+CHANGE_FULL_RATIO = 0.5
+
+
+class Template:
+    """マッチング用にデコード済みのテンプレート画像"""
+    
+    def __init__(self, path, color, gray=None):
+        """
+        Args:
+            path (Path): 元画像ファイルのパス
+            color (numpy.ndarray): BGR形式のカラー画像
+            gray (numpy.ndarray): グレースケール画像（省略時はcolorから変換）
+        """
+        self.path = Path(path)
+        self.color = color
+        self.gray = gray if gray is not None else cv2.cvtColor(color, cv2.COLOR_BGR2GRAY)
+        self.height, self.width = color.shape[:2]
+        self._scaled = {}
+        self._stats = {}
+    
+    @property
+    def nbytes(self):
+        """キャッシュ上で占有するバイト数"""
+        return self.color.nbytes + self.gray.nbytes
+    
+    def array(self, grayscale=False):
+        """マッチングに使う配列を取得"""
+        return self.gray if grayscale else self.color
+    
+    def scaled(self, factor, grayscale=False):
+        """1/factor に縮小した配列を取得（初回のみ計算）"""
+        key = (factor, grayscale)
+        if key not in self._scaled:
+            self._scaled[key] = downscale(self.array(grayscale), factor)
+        return self._scaled[key]
+    
+    def stats(self, grayscale=False):
+        """
+        正規化相関に使う統計量を取得（初回のみ計算）
+        
+        Returns:
+            tuple: (チャンネルごとの平均のタプル, 平均を引いた画素値のL2ノルム)
+        """
+        if grayscale not in self._stats:
+            pixels = self.array(grayscale).reshape(self.width * self.height, -1).astype(np.float64)
+            mean = pixels.mean(axis=0)
+            norm = float(np.sqrt(((pixels - mean) ** 2).sum()))
+            self._stats[grayscale] = (tuple(float(m) for m in mean), norm)
+        return self._stats[grayscale]
+    
+    def compile(self):
+        """
+        前処理結果をまとめて計算（CompiledTemplateStore に保存する形式）
+        
+        Returns:
+            tuple: (配列の辞書, メタ情報の辞書)
+        """
+        arrays = {'color': self.color, 'gray': self.gray}
+        factor = pyramid_factor(self)
+        if factor > 1:
+            arrays[f'color@{factor}'] = self.scaled(factor, False)
+            arrays[f'gray@{factor}'] = self.scaled(factor, True)
+        meta = {'stats': {'color': self.stats(False), 'gray': self.stats(True)}}
+        return arrays, meta
+    
+    @classmethod
+    def from_compiled(cls, path, arrays, meta):
+        """compile() の結果からTemplateを復元（変換・縮小・統計量の計算をしない）"""
+        template = cls(path, arrays['color'], arrays['gray'])
+        for name, array in arrays.items():
+            mode, _, factor = name.partition('@')
+            if factor:
+                template._scaled[(int(factor), mode == 'gray')] = array
+        for mode, (mean, norm) in meta.get('stats', {}).items():
+            template._stats[mode == 'gray'] = (tuple(mean), norm)
+        return template
+
+
+def downscale(image, factor):
+    """画像を 1/factor に縮小（面積平均）"""
+    height, width = image.shape[:2]
+    size = (max(width // factor, 1), max(height // factor, 1))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+
+def load_template(image_path, store=None):
+    """
+    画像ファイルをデコードしてTemplateを作成
+    
+    日本語パスでも読めるように cv2.imread ではなく imdecode を使用
+    
+    Args:
+        image_path (str | Path): 画像ファイルのパス
+        store (CompiledTemplateStore): 前処理結果の保存先。保存済みで画像が変わっていなければ
+                                       デコードせずにそこから読み込む
+    """
+    image_path = Path(image_path)
+    if store is not None:
+        compiled = store.load(image_path)
+        if compiled is not None:
+            return Template.from_compiled(image_path, *compiled)
+        # デコード中に画像が書き換えられても古い内容を新しい画像として保存しないよう先に取得
+        source = store.source_key(image_path)
+    
+    data = np.fromfile(str(image_path), dtype=np.uint8)
+    color = cv2.imdecode(data, cv2.IMREAD_COLOR)
+    if color is None:
+        raise ValueError(f"画像を読み込めません: {image_path}")
+    template = Template(image_path, color)
+    
+    if store is not None:
+        arrays, meta = template.compile()
+        store.save(image_path, arrays, meta, source)
+    return template
+
+
+class TemplateCache:
+    """
+    デコード済みテンプレートのLRUキャッシュ
+    
+    キーは (絶対パス, 更新時刻, ファイルサイズ)。画像ファイルが上書きされると
+    キーが変わるため、古いエントリは破棄されて再デコードされます。
+    """
+    
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES, store=None):
+        """
+        Args:
+            max_bytes (int): キャッシュが保持する配列の合計バイト数の上限
+            store (CompiledTemplateStore): 前処理結果の保存先（省略時は毎回デコードして前処理）
+        """
+        self.max_bytes = max_bytes
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # キー -> Template
+        self._keys_by_path = {}        # 絶対パス -> 現在のキー
+        self._current_bytes = 0
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _make_key(image_path):
+        path = Path(image_path).resolve()
+        stat = path.stat()
+        return (str(path), stat.st_mtime_ns, stat.st_size)
+    
+    def get(self, image_path):
+        """
+        テンプレートを取得（未キャッシュならデコードして登録）
+        
+        Args:
+            image_path (str | Path): 画像ファイルのパス
+            
+        Returns:
+            Template: デコード済みテンプレート
+        """
+        key = self._make_key(image_path)
+        
+        with self._lock:
+            template = self._entries.get(key)
+            if template is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return template
+        
+        # デコードはロックの外で行う
+        template = load_template(key[0], self.store)
+        
+        with self._lock:
+            self.misses += 1
+            
+            # 同じパスの古いエントリ（ファイル更新前）を削除
+            old_key = self._keys_by_path.get(key[0])
+            if old_key is not None and old_key != key:
+                self._remove(old_key)
+            
+            if key not in self._entries:
+                self._entries[key] = template
+                self._keys_by_path[key[0]] = key
+                self._current_bytes += template.nbytes
+            self._entries.move_to_end(key)
+            
+            # 上限を超えたら古い順に破棄（最新の1件は残す）
+            while self._current_bytes > self.max_bytes and len(self._entries) > 1:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+            
+            return self._entries[key]
+    
+    def _remove(self, key):
+        template = self._entries.pop(key, None)
+        if template is None:
+            return
+        self._current_bytes -= template.nbytes
+        if self._keys_by_path.get(key[0]) == key:
+            del self._keys_by_path[key[0]]
+    
+    def clear(self):
+        """キャッシュを空にする（カウンタは保持）"""
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_path.clear()
+            self._current_bytes = 0
+    
+    def stats(self):
+        """
+        キャッシュの統計情報を取得
+        
+        Returns:
+            dict: hits, misses, evictions, entries, bytes
+                  （保存先がある場合は compiled にその統計情報）
+        """
+        with self._lock:
+            stats = {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._current_bytes,
+            }
+        if self.store is not None:
+            stats['compiled'] = self.store.stats()
+        return stats
+
+
+class Match(namedtuple('Match', ['left', 'top', 'width', 'height', 'score'])):
+    """テンプレートマッチングの結果（画面座標の矩形と一致度）"""
+    __slots__ = ()
+    
+    @property
+    def box(self):
+        """(left, top, width, height) の矩形"""
+        return (self.left, self.top, self.width, self.height)
+    
+    @property
+    def center(self):
+        """矩形の中心座標 (x, y)"""
+        return (self.left + self.width // 2, self.top + self.height // 2)
+
+
+def match_template(haystack, needle):
+    """
+    haystack内でneedleに最も一致する位置を検索
+    
+    Args:
+        haystack (numpy.ndarray): 検索対象の画像
+        needle (numpy.ndarray): テンプレート画像（haystackと同じチャンネル数）
+        
+    Returns:
+        tuple: ((x, y), score) または テンプレートが大きすぎる場合は None
+    """
+    h, w = needle.shape[:2]
+    if h > haystack.shape[0] or w > haystack.shape[1]:
+        return None
+    
+    result = cv2.matchTemplate(haystack, needle, cv2.TM_CCOEFF_NORMED)
+    return _best_in(result)
+
+
+def _best_in(result):
+    """相関マップで最も一致度の高い位置 ((x, y), score)。値が無効ならNone"""
+    _, max_val, _, max_loc = cv2.minMaxLoc(result)
+    if not np.isfinite(max_val):
+        return None
+    return max_loc, float(min(max_val, 1.0))
+
+
+def _window_sum(integral, width, height, out=None):
+    """積分画像から各位置の width x height の窓の合計を求める（out を渡すとそこに書き込む）"""
+    out = cv2.subtract(integral[height:, width:], integral[:-height, width:], dst=out)
+    out -= integral[height:, :-width]
+    out += integral[:-height, :-width]
+    return out
+
+
+def fft_shape(frame, template):
+    """FFTでゼロ埋めする大きさ（テンプレートの大きさを2のべき乗に切り上げ、画面側のDFTを共有しやすくする）"""
+    pad_h = max(FFT_MIN_PAD, 1 << (template.height - 1).bit_length())
+    pad_w = max(FFT_MIN_PAD, 1 << (template.width - 1).bit_length())
+    return (cv2.getOptimalDFTSize(frame.height + pad_h - 1),
+            cv2.getOptimalDFTSize(frame.width + pad_w - 1))
+
+
+def pyramid_factor(template):
+    """テンプレートの大きさから使える最大の縮小率を選ぶ（使えない場合は1）"""
+    for factor in PYRAMID_FACTORS:
+        width, height = template.width // factor, template.height // factor
+        if min(width, height) >= PYRAMID_MIN_SIDE and width * height >= PYRAMID_MIN_AREA:
+            return factor
+    return 1
+
+
+def _top_peaks(result, count, suppress):
+    """相関マップから上位の極大点を取得（近傍を抑制しながら）"""
+    result = result.copy()
+    sw, sh = suppress
+    peaks = []
+    for _ in range(count):
+        _, max_val, _, (x, y) = cv2.minMaxLoc(result)
+        if not np.isfinite(max_val) or max_val <= -1.0:
+            break
+        peaks.append((x, y))
+        result[max(y - sh, 0):y + sh + 1, max(x - sw, 0):x + sw + 1] = -1.0
+    return peaks
+
+
+def _engine_opencv(frame, template, grayscale):
+    """全解像度で画面全体を照合（FFT_MIN_AREA / FFT_MIN_AREA_GRAY 以上のテンプレートはFFTで照合）"""
+    if template.width * template.height >= (FFT_MIN_AREA_GRAY if grayscale else FFT_MIN_AREA):
+        return _engine_fft(frame, template, grayscale)
+    return match_template(frame.array(grayscale), template.array(grayscale))
+
+
+def _engine_fft(frame, template, grayscale):
+    """周波数領域で相関を計算する照合（TM_CCOEFF_NORMED と同じ値）"""
+    result = fft_score_map(frame, template, grayscale)
+    return None if result is None else _best_in(result)
+
+
+def fft_score_map(frame, template, grayscale):
+    """
+    周波数領域で相関マップ（TM_CCOEFF_NORMED と同じ値）を計算
+    
+    分子はテンプレートから平均を引いた画像との相互相関をDFTの積で、分母は積分画像から求めます。
+    画面側のDFTと積分画像はFrameにキャッシュされ、同じフレームで照合する大きなテンプレート同士で共有されます。
+    
+    Returns:
+        numpy.ndarray: 各位置の一致度。テンプレートが画面より大きい場合はNone
+    """
+    if template.height > frame.height or template.width > frame.width:
+        return None
+    mean, norm = template.stats(grayscale)
+    if norm == 0:
+        # 単色のテンプレートは相関が定義できないので通常の照合に任せる
+        return cv2.matchTemplate(frame.array(grayscale), template.array(grayscale), cv2.TM_CCOEFF_NORMED)
+    
+    shape = fft_shape(frame, template)
+    needle = template.array(grayscale).astype(np.float32)
+    needle_channels = [needle] if needle.ndim == 2 else cv2.split(needle)
+    padded = np.zeros(shape, np.float32)
+    product = None
+    for spectrum, channel, channel_mean in zip(frame.spectra(grayscale, shape), needle_channels, mean):
+        padded[:template.height, :template.width] = channel - channel_mean
+        needle_spectrum = cv2.dft(padded)
+        term = cv2.mulSpectrums(spectrum, needle_spectrum, 0, conjB=True)
+        product = term if product is None else cv2.add(product, term)
+    
+    rows = frame.height - template.height + 1
+    cols = frame.width - template.width + 1
+    numerator = cv2.idft(product, flags=cv2.DFT_REAL_OUTPUT | cv2.DFT_SCALE)[:rows, :cols]
+    # 4Kでは1枚66MBになるので、分母の計算と割り算は window_energy の配列の中で行う
+    result = frame.window_energy(grayscale, template.width, template.height)
+    np.maximum(result, 0, out=result)
+    np.sqrt(result, out=result)
+    result *= norm
+    
+    # 分母がほぼ0（単色の領域）は OpenCV と同様に相関0とする
+    flat = result <= norm * 1e-3
+    np.divide(numerator, result, out=result, where=~flat)
+    result[flat] = 0
+    return result
+
+
+def score_map(frame, template, grayscale):
+    """
+    全解像度の相関マップを取得（大きなテンプレートはFFTで計算）
+    
+    Returns:
+        numpy.ndarray: 各位置の一致度。テンプレートが画面より大きい場合はNone
+    """
+    if template.height > frame.height or template.width > frame.width:
+        return None
+    if template.width * template.height >= (FFT_MIN_AREA_GRAY if grayscale else FFT_MIN_AREA):
+        return fft_score_map(frame, template, grayscale)
+    return cv2.matchTemplate(frame.array(grayscale), template.array(grayscale), cv2.TM_CCOEFF_NORMED)
+
+
+def non_max_suppression(boxes, scores, overlap=NMS_OVERLAP):
+    """
+    重なった矩形から一致度の高いものだけを残す（各回の重なり判定はNumPyでまとめて計算）
+    
+    Args:
+        boxes (numpy.ndarray): (left, top, width, height) を並べた N x 4 の配列
+        scores (numpy.ndarray): 各矩形の一致度
+        overlap (float): これより IoU が大きい矩形を重なりとみなして除く
+    
+    Returns:
+        numpy.ndarray: 残した矩形のインデックス（一致度の高い順）
+    """
+    boxes = np.asarray(boxes, np.float64).reshape(-1, 4)
+    x1, y1 = boxes[:, 0], boxes[:, 1]
+    x2, y2 = x1 + boxes[:, 2], y1 + boxes[:, 3]
+    areas = boxes[:, 2] * boxes[:, 3]
+    
+    order = np.argsort(-np.asarray(scores, np.float64), kind='stable')
+    keep = []
+    while order.size:
+        best, rest = order[0], order[1:]
+        keep.append(best)
+        width = np.clip(np.minimum(x2[best], x2[rest]) - np.maximum(x1[best], x1[rest]), 0, None)
+        height = np.clip(np.minimum(y2[best], y2[rest]) - np.maximum(y1[best], y1[rest]), 0, None)
+        intersection = width * height
+        iou = intersection / (areas[best] + areas[rest] - intersection)
+        order = rest[iou <= overlap]
+    return np.array(keep, dtype=np.intp)
+
+
+def reading_order(matches):
+    """
+    Matchを読む順（上の行から、同じ行の中は左から）に並べる
+    
+    中心の高さの差が高さの半分以内なら同じ行とみなします。
+    """
+    rows = []
+    for match in sorted(matches, key=lambda m: m.center[1]):
+        if rows and match.center[1] - rows[-1][0].center[1] <= min(match.height, rows[-1][0].height) / 2:
+            rows[-1].append(match)
+        else:
+            rows.append([match])
+    return [match for row in rows for match in sorted(row, key=lambda m: m.left)]
+
+
+# locate_all の order 引数で選べる並び順
+MATCH_ORDERS = {
+    'score': lambda matches: sorted(matches, key=lambda m: m.score, reverse=True),
+    'reading': reading_order,
+}
+
+
+def _engine_pyramid(frame, template, grayscale):
+    """
+    縮小画像で候補を探し、候補周辺の小さな窓だけ全解像度で照合
+    
+    中心座標は全解像度での照合結果なので通常のエンジンと同じになります。
+    """
+    factor = pyramid_factor(template)
+    if factor == 1:
+        return _engine_opencv(frame, template, grayscale)
+    
+    small_needle = template.scaled(factor, grayscale)
+    small_haystack = frame.scaled(factor, grayscale)
+    sh, sw = small_needle.shape[:2]
+    if sh > small_haystack.shape[0] or sw > small_haystack.shape[1]:
+        return None
+    
+    coarse = cv2.matchTemplate(small_haystack, small_needle, cv2.TM_CCOEFF_NORMED)
+    candidates = _top_peaks(coarse, PYRAMID_CANDIDATES, (sw // 2, sh // 2))
+    
+    haystack = frame.array(grayscale)
+    needle = template.array(grayscale)
+    height, width = haystack.shape[:2]
+    margin = factor * 2
+    best = None
+    
+    for cx, cy in candidates:
+        # 縮小時の丸め誤差を吸収するため余白を付けた窓で再照合
+        x0 = max(cx * factor - margin, 0)
+        y0 = max(cy * factor - margin, 0)
+        x1 = min(cx * factor + template.width + margin, width)
+        y1 = min(cy * factor + template.height + margin, height)
+        found = match_template(haystack[y0:y1, x0:x1], needle)
+        if found is None:
+            continue
+        (x, y), score = found
+        if best is None or score > best[1]:
+            best = ((x + x0, y + y0), score)
+    
+    return best
+
+
+# engine引数で選択できるマッチングエンジン
+ENGINES = {
+    'opencv': _engine_opencv,
+    'fft': _engine_fft,
+    'pyramid': _engine_pyramid,
+}
+
+
+def get_engine(name):
+    """名前からマッチングエンジンを取得"""
+    try:
+        return ENGINES[name]
+    except KeyError:
+        raise ValueError(f"未知のマッチングエンジン: {name} (選択肢: {', '.join(ENGINES)})")
+
+
+class Frame:
+    """
+    一度だけキャプチャした画面
+    
+    同じ画面バッファに対して複数のテンプレートを照合できるため、
+    テンプレートごとにスクリーンショットを撮り直す必要がありません。
+    """
+    
+    def __init__(self, color, origin=(0, 0), timestamp=None):
+        """
+        Args:
+            color (numpy.ndarray): BGR形式の画面画像
+            origin (tuple): 画面全体におけるこの画像の左上座標
+            timestamp (float): キャプチャ時刻
+        """
+        self.color = color
+        self.origin = tuple(origin)
+        self.timestamp = timestamp if timestamp is not None else time.time()
+        self.height, self.width = color.shape[:2]
+        self._gray = None
+        self._scaled = {}
+        self._spectra = OrderedDict()
+        self._integrals = {}
+    
+    @classmethod
+    def capture(cls, region=None, backend=None):
+        """
+        画面をキャプチャしてFrameを作成
+        
+        Args:
+            region (tuple): (left, top, width, height) で範囲を限定（省略時は全画面）
+            backend (CaptureBackend): キャプチャバックエンド（省略時は既定のバックエンド）
+        """
+        if backend is None:
+            backend = default_backend()
+        color = backend.grab(region)
+        origin = region[:2] if region else (0, 0)
+        return cls(color, origin=origin)
+    
+    def to_image(self):
+        """PIL.Image (RGB) に変換"""
+        from PIL import Image
+        return Image.fromarray(cv2.cvtColor(self.color, cv2.COLOR_BGR2RGB))
+    
+    @property
+    def gray(self):
+        """グレースケール画像（初回アクセス時に変換）"""
+        if self._gray is None:
+            self._gray = cv2.cvtColor(self.color, cv2.COLOR_BGR2GRAY)
+        return self._gray
+    
+    def array(self, grayscale=False):
+        """マッチングに使う配列を取得"""
+        return self.gray if grayscale else self.color
+    
+    def scaled(self, factor, grayscale=False):
+        """1/factor に縮小した配列を取得（初回のみ計算）"""
+        key = (factor, grayscale)
+        if key not in self._scaled:
+            self._scaled[key] = downscale(self.array(grayscale), factor)
+        return self._scaled[key]
+    
+    def spectra(self, grayscale, shape):
+        """
+        shape の大きさにゼロ埋めした各チャンネルのDFT（CCS形式）を取得
+        
+        同じ大きさでゼロ埋めするテンプレート同士はこの結果を共有します。
+        積分画像と合わせて FFT_CACHE_BYTES を超える場合は、最も長く使っていない大きさから捨てます。
+        """
+        key = (grayscale, shape)
+        spectra = self._spectra.get(key)
+        if spectra is not None:
+            self._spectra.move_to_end(key)
+            return spectra
+        
+        image = self.array(grayscale)
+        channels = [image] if image.ndim == 2 else cv2.split(image)
+        # 新しいDFTを計算する前に、入りきらない分を捨てておく（一時的にも上限を大きく超えないように）
+        needed = len(channels) * shape[0] * shape[1] * np.dtype(np.float32).itemsize
+        cached = self._fft_cache_bytes()
+        while self._spectra and cached + needed > FFT_CACHE_BYTES:
+            _, evicted = self._spectra.popitem(last=False)
+            cached -= sum(s.nbytes for s in evicted)
+        
+        padded = np.zeros(shape, np.float32)
+        spectra = []
+        for channel in channels:
+            padded[:self.height, :self.width] = channel
+            spectra.append(cv2.dft(padded))
+        self._spectra[key] = spectra
+        return spectra
+    
+    def window_energy(self, grayscale, width, height):
+        """
+        各位置の width x height の窓について、平均を引いた画素値の二乗和（全チャンネルの合計）
+        
+        正規化相関の分母に使います。
+        """
+        sums, squares = self._integral_images(grayscale)
+        energy = _window_sum(squares, width, height)
+        window = None
+        for total in sums:
+            window = _window_sum(total, width, height, out=window)
+            cv2.multiply(window, window, dst=window)
+            cv2.scaleAdd(window, -1.0 / (width * height), energy, dst=energy)
+        return energy
+    
+    def _integral_images(self, grayscale):
+        """
+        各チャンネルの積分画像と、全チャンネルの二乗の積分画像を取得
+        
+        FFT_CACHE_BYTES の半分以下に収まる場合だけキャッシュします（4Kのカラー画面では毎回計算する）。
+        """
+        cached = self._integrals.get(grayscale)
+        if cached is not None:
+            return cached
+        
+        image = self.array(grayscale)
+        channels = [image] if image.ndim == 2 else cv2.split(image)
+        sums = []
+        squares = None
+        for channel in channels:
+            total, square = cv2.integral2(channel, sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F)
+            sums.append(total)
+            squares = square if squares is None else cv2.add(squares, square, dst=squares)
+        if sum(total.nbytes for total in sums) + squares.nbytes <= FFT_CACHE_BYTES // 2:
+            self._integrals[grayscale] = (sums, squares)
+        return sums, squares
+    
+    def _fft_cache_bytes(self):
+        """キャッシュしているDFTと積分画像の合計（バイト）"""
+        spectra = sum(s.nbytes for entry in self._spectra.values() for s in entry)
+        integrals = sum(sum(total.nbytes for total in sums) + squares.nbytes
+                        for sums, squares in self._integrals.values())
+        return spectra + integrals
+    
+    def release_caches(self):
+        """FFT用のDFTと積分画像のキャッシュを破棄（グレースケール・縮小画像は残す）"""
+        self._spectra.clear()
+        self._integrals.clear()
+    
+    def crop(self, left, top, right, bottom):
+        """
+        画面座標の矩形で切り出したFrameを取得（画像はコピーせずビューを共有）
+        
+        矩形はこのフレームの範囲内に収まるように切り詰められます。
+        """
+        ox, oy = self.origin
+        x0 = min(max(left - ox, 0), self.width)
+        y0 = min(max(top - oy, 0), self.height)
+        x1 = min(max(right - ox, x0), self.width)
+        y1 = min(max(bottom - oy, y0), self.height)
+        
+        sub = Frame(self.color[y0:y1, x0:x1], origin=(ox + x0, oy + y0),
+                    timestamp=self.timestamp)
+        if self._gray is not None:
+            sub._gray = self._gray[y0:y1, x0:x1]
+        return sub
+    
+    def search_rings(self, hint):
+        """
+        記録座標の周辺から段階的に広げた探索範囲を順に返す
+        
+        Args:
+            hint (tuple): 前回記録した矩形 (x1, y1, x2, y2)
+            
+        Yields:
+            tuple: (リング番号, Frame)。最後は全画面（FULL_SCREEN_RING）
+        """
+        if hint:
+            x1, y1, x2, y2 = hint
+            for ring, margin in enumerate(SEARCH_RING_MARGINS):
+                yield ring, self.crop(x1 - margin, y1 - margin, x2 + margin, y2 + margin)
+        yield FULL_SCREEN_RING, self
+    
+    def match(self, template, grayscale=False, engine='opencv'):
+        """
+        テンプレートに最も一致する位置を取得（信頼度による足切りなし）
+        
+        Args:
+            template (Template): 検索するテンプレート
+            grayscale (bool): グレースケールで照合するかどうか
+            engine (str): マッチングエンジン名（ENGINES参照）
+        
+        Returns:
+            Match: 画面座標での一致結果（照合できない場合はNone）
+        """
+        found = get_engine(engine)(self, template, grayscale)
+        if found is None:
+            return None
+        (x, y), score = found
+        return Match(x + self.origin[0], y + self.origin[1],
+                     template.width, template.height, score)
+    
+    def locate(self, template, confidence=0.8, grayscale=False, engine='opencv'):
+        """
+        テンプレートを検索
+        
+        Returns:
+            Match: 信頼度以上で見つかった場合は一致結果、それ以外はNone
+        """
+        match = self.match(template, grayscale, engine)
+        if match is None or match.score < confidence:
+            return None
+        return match
+    
+    def locate_all(self, template, confidence=0.8, grayscale=False, overlap=NMS_OVERLAP,
+                   order='score', limit=None):
+        """
+        テンプレートに信頼度以上で一致する位置をすべて検索（1回の照合で相関マップ全体を使う）
+        
+        重なった一致は非最大値抑制で一致度の高いものだけを残します。
+        ピラミッド探索は最良の候補しか残さないため、エンジンの設定に関係なく全解像度で照合します。
+        
+        Args:
+            template (Template): 検索するテンプレート
+            confidence (float): 信頼度
+            grayscale (bool): グレースケールで照合するかどうか
+            overlap (float): 重なりとみなす IoU
+            order (str): 並び順 ("score": 一致度の高い順, "reading": 上の行から左→右)
+            limit (int): 返す最大数（一致度の高いものから。Noneなら制限なし）
+        
+        Returns:
+            list: 画面座標の Match のリスト
+        """
+        try:
+            arrange = MATCH_ORDERS[order]
+        except KeyError:
+            raise ValueError(f"未知の並び順: {order} (選択肢: {', '.join(MATCH_ORDERS)})")
+        
+        result = score_map(self, template, grayscale)
+        if result is None:
+            return []
+        
+        # 3x3 の近傍で最大の点だけを候補にする（一致位置の周りの数ピクセルをまとめて落とす）
+        peaks = (result >= confidence) & (result >= cv2.dilate(result, None))
+        ys, xs = np.nonzero(peaks)
+        scores = result[ys, xs]
+        if scores.size > NMS_MAX_CANDIDATES:
+            top = np.argpartition(-scores, NMS_MAX_CANDIDATES)[:NMS_MAX_CANDIDATES]
+            ys, xs, scores = ys[top], xs[top], scores[top]
+        
+        boxes = np.column_stack([xs, ys, np.full_like(xs, template.width), np.full_like(ys, template.height)])
+        keep = non_max_suppression(boxes, scores, overlap)
+        if limit is not None:
+            keep = keep[:limit]
+        
+        ox, oy = self.origin
+        matches = [Match(int(xs[i]) + ox, int(ys[i]) + oy, template.width, template.height,
+                         float(min(scores[i], 1.0)))
+                   for i in keep]
+        return arrange(matches)
+    
+    def locate_many(self, templates, confidence=0.8, grayscale=False, engine='opencv'):
+        """
+        複数のテンプレートをこのフレームに対してまとめて検索
+        
+        Args:
+            templates (dict | list): 名前 -> Template の辞書、またはTemplateのリスト
+                                     （リストの場合はファイル名を名前に使用）
+            
+        Returns:
+            dict: 名前 -> Match（見つからなかった場合はNone）
+        """
+        if not isinstance(templates, dict):
+            templates = {template.path.name: template for template in templates}
+        
+        # FFTのゼロ埋めの大きさが同じテンプレートを続けて照合し、画面側のDFTをキャッシュから追い出す前に使い回す
+        order = sorted(templates, key=lambda name: fft_shape(self, templates[name]))
+        results = {name: self.locate(templates[name], confidence, grayscale, engine) for name in order}
+        return {name: results[name] for name in templates}
+
+
+def _dirty_runs(flags):
+    """真偽値の配列から連続してTrueになっている区間 [start, end) を列挙"""
+    indices = np.flatnonzero(flags)
+    if len(indices) == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(indices) > 1)
+    starts = np.concatenate(([indices[0]], indices[breaks + 1]))
+    ends = np.concatenate((indices[breaks], [indices[-1]])) + 1
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+def changed_regions(previous, current, tile=CHANGE_TILE):
+    """
+    2つのフレームの間で変化したタイル領域を取得
+    
+    Args:
+        previous (Frame): 前回のフレーム
+        current (Frame): 今回のフレーム
+        tile (int): タイルの大きさ（ピクセル）
+        
+    Returns:
+        list: 変化した矩形 (left, top, right, bottom) のリスト（画面座標）。
+              変化が無ければ空リスト、比較できない・変化が広すぎる場合は None
+    """
+    if previous.color.shape != current.color.shape or previous.origin != current.origin:
+        return None
+    
+    # 変化が無いことの確認は差分画像を作らずに1パスで済ませる
+    if cv2.norm(previous.color, current.color, cv2.NORM_INF) == 0:
+        return []
+    
+    diff = cv2.absdiff(previous.color, current.color)
+    height, width = diff.shape[:2]
+    flat = diff.reshape(height, -1)
+    
+    channels = flat.shape[1] // width
+    tile_cols = -(-width // tile)
+    regions = []
+    open_runs = {}  # (left, right) -> 直前の帯で続いている矩形のインデックス
+    
+    # 変化した行を先に求め、変化を含む帯だけ列方向を調べる
+    changed_rows = flat.max(axis=1) > 0
+    
+    for top in range(0, height, tile):
+        bottom = min(top + tile, height)
+        if not changed_rows[top:bottom].any():
+            open_runs = {}
+            continue
+        # 帯ごとに列方向の最大値をとり、変化した列をタイル単位にまとめる
+        columns = flat[top:bottom].max(axis=0).reshape(width, channels)
+        dirty = np.zeros(tile_cols * tile, dtype=bool)
+        dirty[:width] = columns.max(axis=1) > 0
+        
+        next_runs = {}
+        for start, end in _dirty_runs(dirty.reshape(tile_cols, tile).any(axis=1)):
+            span = (start * tile, min(end * tile, width))
+            if span in open_runs:
+                # 上の帯と同じ横幅なら縦につなげる
+                index = open_runs[span]
+                left, rect_top, right, _ = regions[index]
+                regions[index] = (left, rect_top, right, bottom)
+            else:
+                index = len(regions)
+                regions.append((span[0], top, span[1], bottom))
+            next_runs[span] = index
+        open_runs = next_runs
+    
+    area = sum((right - left) * (bottom - top) for left, top, right, bottom in regions)
+    if len(regions) > CHANGE_MAX_REGIONS or area > width * height * CHANGE_FULL_RATIO:
+        return None
+    
+    ox, oy = current.origin
+    return [(left + ox, top + oy, right + ox, bottom + oy) for left, top, right, bottom in regions]
+
+
+def region_changed(previous, current, delta=VERIFY_DELTA, min_pixels=VERIFY_MIN_PIXELS):
+    """
+    同じ範囲の2つのフレームで、画素値が delta より大きく変わった画素が min_pixels 以上あるか
+    
+    範囲が異なる（画面の端で切り詰められた大きさが違うなど）場合は変化ありとみなします。
+    """
+    if previous.color.shape != current.color.shape or previous.origin != current.origin:
+        return True
+    diff = cv2.absdiff(previous.color, current.color)
+    if diff.ndim == 3:
+        diff = diff.max(axis=2)
+    return cv2.countNonZero((diff > delta).astype(np.uint8)) >= min_pixels
+
+
+class ChangeTracker:
+    """
+    「見つからなかった」最後のフレームを覚えておき、次のフレームで再検索が必要な範囲を求める
+    
+    画面が変わっていなければ照合を丸ごと省略し、一部だけ変わった場合は
+    変化したタイルに重なる位置だけを照合します。
+    """
+    
+    def __init__(self, tile=CHANGE_TILE):
+        self.tile = tile
+        self.previous = None
+        self.skipped = 0   # 変化なしで照合を省略した回数
+        self.partial = 0   # 変化領域だけ照合した回数
+        self.full = 0      # 全体を照合した回数
+    
+    def regions(self, frame):
+        """
+        今回のフレームで照合が必要な範囲を取得
+        
+        Returns:
+            list: 照合が必要な矩形のリスト（空なら照合不要）、None なら全体を照合
+        """
+        if self.previous is None:
+            regions = None
+        else:
+            regions = changed_regions(self.previous, frame, self.tile)
+        
+        if regions is None:
+            self.full += 1
+        elif regions:
+            self.partial += 1
+        else:
+            self.skipped += 1
+        return regions
+    
+    def mark_negative(self, frame):
+        """フレーム全体で見つからなかったことを記録"""
+        # 差分の比較に使うのは画像だけなので、FFTのキャッシュ（数十MB）は保持しない
+        frame.release_caches()
+        self.previous = frame
+    
+    def reset(self):
+        """記録を破棄（次回は全体を照合）"""
+        self.previous = None
+    
+    def stats(self):
+        """照合の省略状況"""
+        return {'skipped': self.skipped, 'partial': self.partial, 'full': self.full}
+
+
+def ring_of(match, hint):
+    """一致した矩形がどの探索リングに収まるかを求める"""
+    if not hint:
+        return FULL_SCREEN_RING
+    x1, y1, x2, y2 = hint
+    for ring, margin in enumerate(SEARCH_RING_MARGINS):
+        if (match.left >= x1 - margin and match.top >= y1 - margin and
+                match.left + match.width <= x2 + margin and match.top + match.height <= y2 + margin):
+            return ring
+    return FULL_SCREEN_RING
+
+
+def describe_ring(ring):
+    """探索リング番号を表示用の文字列に変換"""
+    if ring is None:
+        return "なし"
+    if ring == LAST_POSITION_RING:
+        return "前回の位置"
+    if ring >= FULL_SCREEN_RING:
+        return "全画面"
+    return f"記録位置±{SEARCH_RING_MARGINS[ring]}px"
+
 
 class ImageClicker:
-    def __init__(self, confidence=0.8, wait_time=1.0, images_dir="images"):
+    def __init__(self, confidence=0.8, wait_time=1.0, images_dir="images",
+                 grayscale=False, template_cache=None, engine="opencv", capture="auto",
+                 latency_target=0.5, cpu_budget=0.5, workers=1, compiled_templates=True, metrics=None,
+                 tracer=None, fast=False, verify_timeout=2.0, verify_retries=0, remember_positions=True):
         """
         ImageClickerを初期化
         
@@ -20,78 +1005,662 @@ class ImageClicker:
             confidence (float): 画像マッチングの信頼度 (0.0-1.0)
             wait_time (float): クリック前の待機時間（秒）
             images_dir (str): 画像ファイルを配置するディレクトリ
+            grayscale (bool): グレースケールでマッチングするかどうか
+            template_cache (TemplateCache): 共有するテンプレートキャッシュ（省略時は新規作成）
+            engine (str): マッチングエンジン ("opencv": 全解像度（大きなテンプレートはFFT）, "fft": 常にFFT, "pyramid": 縮小画像で粗探索→詳細照合)
+            capture (str | CaptureBackend): キャプチャバックエンド名 ("auto", "pyautogui", "x11", "replay")
+                                            またはバックエンドのインスタンス
+            latency_target (float): 画像が現れてから反応するまでの目標時間（秒）
+            cpu_budget (float): 待機中のポーリングに使ってよいCPUの割合（1コア=1.0）
+            workers (int): 全画面の照合に使うプロセス数（1: 並列化しない、0: CPUコア数）
+            compiled_templates (bool): テンプレートの前処理結果を images/.compiled に保存して再利用するか
+                                       （template_cache を指定した場合はそちらの設定に従う）
+            metrics (Metrics): フェーズごとの所要時間とテンプレートごとの回数の記録先（省略時は記録しない）
+            tracer (Tracer): ポーリング・キャプチャ・照合・クリックの区間の記録先（省略時は記録しない）
+            fast (bool): 高速クリックモード。wait_time と pyautogui.PAUSE の待機をせずにすぐクリックし、
+                         クリック位置の周辺の変化（または次の画像の出現）でクリックが効いたことを確認する
+            verify_timeout (float): 高速クリックモードでクリックの効果を待つ時間（秒）
+            verify_retries (int): 効果を確認できなかった場合にクリックし直す回数（既定0: 失敗として返す）。
+                                  対象が同じ位置に同じ見た目のまま残っている場合だけクリックし直す
+            remember_positions (bool): 画像が最後に見つかった位置を images/.positions.json に保存し、
+                                       次回はまずその位置だけを照合するか
         """
+        get_engine(engine)  # 未知のエンジン名はここでエラーにする
         self.confidence = confidence
         self.wait_time = wait_time
         self.images_dir = Path(images_dir)
+        self.grayscale = grayscale
+        if template_cache is None:
+            template_cache = TemplateCache(store=CompiledTemplateStore() if compiled_templates else None)
+        self.template_cache = template_cache
+        self.engine = engine
+        
+        # キャプチャ・照合・クリックなどの所要時間の記録先
+        self.metrics = metrics if metrics is not None else NullMetrics()
+        self.tracer = tracer if tracer is not None else NullTracer()
+        
+        # 高速クリックモードの設定と、直近のクリックの確認結果（"changed" / "expected" / None）
+        self.fast = fast
+        self.verify_timeout = verify_timeout
+        self.verify_retries = verify_retries
+        self.last_verify = None
+        
+        # 直近のclick_imageが失敗した理由（"not_found" / "unverified" / "error"、成功時は None）
+        self.last_failure = None
+        
+        # 直近のclick_imageで見つかった結果と、一致した探索リング
+        self.last_match = None
+        self.last_ring = None
+        
+        # 待機中のポーリング間隔を決めるスケジューラと、直近の待機のレポート
+        self.scheduler = PollScheduler(latency_target, cpu_budget)
+        self.last_wait = None
+        
+        # 画面の取得とクリックはバックエンド経由で行う
+        self.backend = capture if isinstance(capture, CaptureBackend) else create_backend(capture)
+        # バックエンドの多くはスレッドセーフではないので、キャプチャは直列化する
+        self._capture_lock = threading.Lock()
+        
+        # 複数プロセスでの照合（workers=1なら使わない）
+        self.matcher = None
+        if workers != 1:
+            from parallel_matcher import ParallelMatcher
+            self.matcher = ParallelMatcher(workers or None)
+        
+        # ワークフローのバンドルから読み込んだ画像（imagesフォルダより優先）
+        self.bundled_templates = {}
+        
+        # 画像が最後に見つかった位置（次回はまずその位置だけを照合する）
+        self.positions = PositionMemory(self.images_dir / POSITIONS_FILE_NAME) if remember_positions else None
         
         # imagesディレクトリを作成（存在しない場合）
         self.images_dir.mkdir(exist_ok=True)
+    
+    def close(self):
+        """
+        キャプチャバックエンド（capture に渡したインスタンスも含む）と照合用のプロセスプールを解放し、
+        未保存の位置の記憶を保存
+        
+        x11 バックエンドはXサーバーへの接続と画面サイズの共有メモリを持つので、
+        ワークフローごとに ImageClicker を作る場合は使い終わったら必ず閉じてください。
+        """
+        if self.matcher is not None:
+            self.matcher.close()
+            self.matcher = None
+        if self.positions is not None:
+            self.positions.close()
+        with self._capture_lock:
+            self.backend.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
+    def use_bundle(self, bundle):
+        """ワークフローのバンドル（WorkflowBundle）に含まれる画像を使えるようにする"""
+        self.bundled_templates.update(bundle.templates)
+    
+    def has_template(self, image_name):
+        """画像がバンドルかimagesフォルダにあるか"""
+        return image_name in self.bundled_templates or (self.images_dir / image_name).exists()
+    
+    def get_template(self, image_name):
+        """バンドルの画像、またはimagesフォルダ内の画像をキャッシュ経由で取得"""
+        template = self.bundled_templates.get(image_name)
+        if template is not None:
+            return template
+        with self.phase('decode', image_name):
+            return self.template_cache.get(self.images_dir / image_name)
+    
+    def capture_frame(self, region=None):
+        """画面をキャプチャしてFrameを取得"""
+        with self._capture_lock, self.phase('capture'):
+            return Frame.capture(region, self.backend)
+    
+    def screenshot(self):
+        """画面全体をPIL.Imageとして取得（範囲選択用）"""
+        return self.capture_frame().to_image()
+    
+    def locate(self, image_name, frame=None, hint=None):
+        """
+        画像を画面上で1回だけ検索（クリックはしない）
+        
+        Args:
+            image_name (str): 画像ファイル名（imagesフォルダ内）
+            frame (Frame): 検索対象のフレーム（省略時は新たにキャプチャ）
+            hint (tuple): 前回の位置 (x1, y1, x2, y2)。指定するとその周辺から探索
+            
+        Returns:
+            Match: 見つかった場合は一致結果、それ以外はNone
+        """
+        self.metrics.count('attempts', image_name)
+        match, _ = self.locate_with_ring(image_name, frame, hint)
+        self.metrics.count('hits' if match else 'misses', image_name)
+        return match
+    
+    def locate_with_ring(self, image_name, frame=None, hint=None, regions=None, confidence=None):
+        """
+        locateと同じだが、一致した探索リングも返す
+        
+        click_image の待機（last_match や scheduler など）の状態には触れないので、
+        別のスレッドからクリックと同時に呼んでも構いません。
+        
+        Args:
+            regions (list): 変化した矩形のリスト（ChangeTracker.regions の結果）。
+                            指定するとそれらに重なる位置だけを照合
+            confidence (float): この検索だけに使う信頼度（省略時は self.confidence）
+        
+        Returns:
+            tuple: (Match または None, リング番号 または None)
+        """
+        if confidence is None:
+            confidence = self.confidence
+        template = self.get_template(image_name)
+        if frame is None:
+            frame = self.capture_frame()
+        
+        with self.phase('match', image_name):
+            return self._search(image_name, template, frame, hint, regions, confidence)
+    
+    def _search(self, image_name, template, frame, hint, regions, confidence):
+        """locate_with_ring の照合部分（前回の位置を確かめてから探索）"""
+        if self.positions is not None:
+            match = self._check_last_position(image_name, template, frame, regions, confidence)
+            if match:
+                return match, LAST_POSITION_RING
+        
+        start = time.perf_counter()
+        match, ring = self._search_rings(image_name, template, frame, hint, regions, confidence)
+        if match and self.positions is not None:
+            self.positions.remember(image_name, match, time.perf_counter() - start)
+        return match, ring
+    
+    def _search_rings(self, image_name, template, frame, hint, regions, confidence):
+        """変化した範囲、またはヒントの周辺から全画面へと広げて探索"""
+        if regions is not None:
+            match = self._locate_in_regions(template, frame, regions, confidence)
+            return (match, ring_of(match, hint)) if match else (None, None)
+        
+        for ring, region in frame.search_rings(hint):
+            if ring == FULL_SCREEN_RING:
+                match = self._locate_all({image_name: template}, region, confidence)[image_name]
+            else:
+                match = region.locate(template, confidence, self.grayscale, self.engine)
+            if match:
+                return match, ring
+        return None, None
+    
+    def _check_last_position(self, image_name, template, frame, regions, confidence):
+        """
+        前回見つかった位置だけを照合
+        
+        テンプレートと同じ大きさの範囲を1回比べるだけなので、位置が古くても損は照合1回分で済みます。
+        
+        Returns:
+            Match: 今もその位置にあれば一致結果、それ以外はNone
+        """
+        box = self.positions.recall(image_name)
+        if box is None:
+            return None
+        left, top, width, height = box
+        if (width, height) != (template.width, template.height):
+            return None  # テンプレートが撮り直された
+        if regions is not None and not any(x1 < left + width and left < x2 and y1 < top + height and top < y2
+                                           for x1, y1, x2, y2 in regions):
+            return None  # 前回確かめてから変化していない
+        patch = frame.crop(left, top, left + width, top + height)
+        if (patch.width, patch.height) != (width, height):
+            return None  # 画面の外（解像度が変わった、または範囲を限定したフレーム）
+        
+        start = time.perf_counter()
+        found = match_template(patch.array(self.grayscale), template.array(self.grayscale))
+        elapsed = time.perf_counter() - start
+        self.metrics.observe('position_check', elapsed, image_name)
+        
+        if found is None or found[1] < confidence:
+            self.metrics.count('position_misses', image_name)
+            return None
+        self.metrics.count('position_hits', image_name)
+        search_seconds = self.positions.search_seconds(image_name)
+        if search_seconds is not None:
+            # 位置の記憶がなければ探索にかかっていたはずの時間との差
+            self.metrics.observe('position_saved', max(search_seconds - elapsed, 0.0), image_name)
+        return Match(left, top, width, height, found[1])
+    
+    def _locate_all(self, templates, frame, confidence):
+        """テンプレートの辞書をフレーム全体で検索（並列化が有効ならプロセスプールを使用）"""
+        if self.matcher is not None:
+            return self.matcher.locate_many(frame, templates, confidence,
+                                            self.grayscale, self.engine)
+        return frame.locate_many(templates, confidence, self.grayscale, self.engine)
+    
+    def _locate_in_regions(self, template, frame, regions, confidence):
+        """変化した矩形に重なる位置だけを照合し、最も一致度の高い結果を返す"""
+        best = None
+        for left, top, right, bottom in regions:
+            # テンプレートが変化領域に1ピクセルでも重なる位置をすべて含むように広げる
+            region = frame.crop(left - template.width + 1, top - template.height + 1,
+                                right + template.width - 1, bottom + template.height - 1)
+            match = region.locate(template, confidence, self.grayscale, self.engine)
+            if match and (best is None or match.score > best.score):
+                best = match
+        return best
+    
+    def locate_many(self, image_names, frame=None):
+        """
+        複数の画像を1回のキャプチャでまとめて検索
+        
+        Args:
+            image_names (list): 画像ファイル名のリスト（imagesフォルダ内）
+            frame (Frame): 検索対象のフレーム（省略時は新たにキャプチャ）
+            
+        Returns:
+            dict: 画像ファイル名 -> Match（見つからなかった場合はNone）
+        """
+        templates = {name: self.get_template(name) for name in image_names}
+        if frame is None:
+            frame = self.capture_frame()
+        with self.phase('match', templates=", ".join(templates)):
+            return self._locate_all(templates, frame, self.confidence)
+    
+    def locate_all(self, image_name, frame=None, order='score', limit=None):
+        """
+        画像に一致する位置を画面上からすべて検索（クリックはしない）
+        
+        Args:
+            image_name (str): 画像ファイル名（imagesフォルダ内）
+            frame (Frame): 検索対象のフレーム（省略時は新たにキャプチャ）
+            order (str): 並び順 ("score": 一致度の高い順, "reading": 上の行から左→右)
+            limit (int): 返す最大数（Noneなら制限なし）
+            
+        Returns:
+            list: Match のリスト（見つからなければ空）
+        """
+        template = self.get_template(image_name)
+        if frame is None:
+            frame = self.capture_frame()
+        with self.phase('match', image_name):
+            return frame.locate_all(template, self.confidence, self.grayscale, order=order, limit=limit)
+    
+    def click_all(self, image_name, timeout=10, order='reading', limit=None, interval=0.2):
+        """
+        画像に一致する位置をすべてクリック（1回のキャプチャ・照合で見つけた位置を順にクリック）
         
-        # フェイルセーフを有効化（マウスを画面の隅に移動するとプログラムが停止）
-        pyautogui.FAILSAFE = True
+        Args:
+            image_name (str): クリックしたい画像のファイル名（imagesフォルダ内）
+            timeout (float): 1つ以上見つかるまで待つ時間（秒）
+            order (str): クリックする順 ("reading": 上の行から左→右, "score": 一致度の高い順)
+            limit (int): クリックする最大数（Noneなら制限なし）
+            interval (float): クリックの間隔（秒）
+            
+        Returns:
+            list: クリックした Match のリスト（見つからなかった場合は空）
+        """
+        image_path = self.images_dir / image_name
+        if not self.has_template(image_name):
+            print(f"エラー: 画像ファイルが見つかりません: {image_path}")
+            return []
         
-        # マウス移動の間隔を設定
-        pyautogui.PAUSE = 0.25
+        print(f"画像をすべて検索中: {image_path}")
+        self.metrics.count('attempts', image_name)
+        tracker = ChangeTracker()
+        
+        def poll():
+            frame = self.capture_frame()
+            if tracker.regions(frame) == []:
+                return None, False
+            matches = self.locate_all(image_name, frame, order, limit)
+            if matches:
+                return matches, True
+            self.metrics.count('misses', image_name)
+            tracker.mark_negative(frame)
+            return None, True
+        
+        try:
+            matches = self._wait(poll, timeout, image_name)
+            if matches is None:
+                print(f"タイムアウト: {timeout}秒以内に画像が見つかりませんでした")
+                return []
+            
+            print(f"{len(matches)}箇所で見つかりました")
+            if not self.fast:
+                self._sleep('wait_time', self.wait_time, image_name)
+            for i, match in enumerate(matches):
+                if i:
+                    self._sleep('click_interval', interval, image_name)
+                x, y = match.center
+                self.click_at(x, y, image_name, pause=not self.fast)
+                print(f"クリック完了 {i + 1}/{len(matches)}: ({x}, {y}) 一致度: {match.score:.3f}")
+            return matches
+        
+        except Exception as e:
+            print(f"エラーが発生しました: {e}")
+            return []
     
-    def click_image(self, image_name, timeout=10):
+    def wait_for_any(self, image_names, timeout=10, interval=None):
+        """
+        複数の画像のいずれかが表示されるまで待機（1回のポーリングで1回だけキャプチャ）
+        
+        Args:
+            image_names (list): 候補の画像ファイル名のリスト（imagesフォルダ内）
+            timeout (float): タイムアウト時間（秒）
+            interval (float): 反応遅延の目標（秒）。省略時はImageClickerの latency_target
+            
+        Returns:
+            tuple: (画像ファイル名, Match)。タイムアウト時は (None, None)
+        """
+        templates = {name: self.get_template(name) for name in image_names}
+        for name in templates:
+            self.metrics.count('attempts', name)
+        tracker = ChangeTracker()
+        
+        def poll():
+            frame = self.capture_frame()
+            regions = tracker.regions(frame)
+            
+            # 前回から画面が変わっていなければ照合しない
+            if regions == []:
+                return None, False
+            with self.phase('match', templates=", ".join(templates)):
+                if regions is None:
+                    results = self._locate_all(templates, frame, self.confidence)
+                else:
+                    results = {name: self._locate_in_regions(template, frame, regions, self.confidence)
+                               for name, template in templates.items()}
+            
+            found = [(name, match) for name, match in results.items() if match]
+            if found:
+                # 最も一致度の高い候補を返す
+                return max(found, key=lambda item: item[1].score), True
+            for name in templates:
+                self.metrics.count('misses', name)
+            tracker.mark_negative(frame)
+            return None, True
+        
+        with self._latency_target(interval):
+            found = self._wait(poll, timeout)
+        if found is None:
+            for name in templates:
+                self.metrics.count('timeouts', name)
+            return None, None
+        self.metrics.count('hits', found[0])
+        return found
+    
+    def _wait(self, poll, timeout, image_name=None):
+        """
+        スケジューラで poll を繰り返し、待機のレポートと計測値を記録
+        
+        見つからずに終わった場合、image_name を指定していればタイムアウトとして数えます。
+        """
+        def traced_poll():
+            with self.tracer.span('poll', template=image_name) as args:
+                result, changed = poll()
+                args['changed'] = changed
+                args['found'] = result is not None
+                return result, changed
+        
+        def traced_sleep(seconds):
+            with self.tracer.span('poll_sleep'):
+                time.sleep(seconds)
+        
+        found = self.scheduler.run(traced_poll, timeout, traced_sleep)
+        self.last_wait = self.scheduler.report
+        self.metrics.observe('poll_sleep', self.scheduler.slept, image_name)
+        if found is None:
+            if image_name is not None:
+                self.metrics.count('timeouts', image_name)
+        elif image_name is not None:
+            self.metrics.count('hits', image_name)
+        return found
+    
+    def _sleep(self, phase, seconds, image_name=None):
+        """固定の待機（クリック前の wait_time など）をフェーズとして記録"""
+        with self.phase(phase, image_name):
+            time.sleep(seconds)
+    
+    def click_at(self, x, y, image_name=None, pause=True):
+        """
+        座標をクリックし、pyautogui.PAUSE による待機をクリック本体と分けて記録
+        
+        Args:
+            x (int): クリックするX座標
+            y (int): クリックするY座標
+            image_name (str): 計測値とトレースに記録する画像ファイル名
+            pause (bool): クリック後に pyautogui.PAUSE の時間だけ待つか
+        """
+        start = time.perf_counter()
+        self.backend.click(x, y, pause=pause)
+        end = time.perf_counter()
+        pause = min(self.backend.click_pause, end - start) if pause else 0.0
+        self.metrics.observe('click', end - start - pause, image_name)
+        self.metrics.observe('click_pause', pause, image_name)
+        self.tracer.add_span('click', start, end - pause, args={'template': image_name, 'x': x, 'y': y})
+        if pause:
+            self.tracer.add_span('click_pause', end - pause, end)
+    
+    @contextmanager
+    def phase(self, phase, image_name=None, **trace_args):
+        """
+        with ブロックの所要時間をフェーズとして計測値とトレースの両方に記録
+        
+        ImageClicker の外で行う待機（AsyncImageClicker の asyncio.sleep など）も同じ記録先に残せます。
+        trace_args はトレースにだけ残します。
+        """
+        with self.tracer.span(phase, template=image_name, **trace_args), self.metrics.timer(phase, image_name):
+            yield
+    
+    @contextmanager
+    def _latency_target(self, latency_target):
+        """一時的に反応遅延の目標を変更（Noneなら変更しない）"""
+        if latency_target is None:
+            yield
+            return
+        saved = self.scheduler.latency_target
+        self.scheduler.latency_target = latency_target
+        try:
+            yield
+        finally:
+            self.scheduler.latency_target = saved
+    
+    def click_image(self, image_name, timeout=10, hint=None, tracker=None, expect=None, confidence=None):
         """
         指定された画像を画面上で検索してクリック
         
         Args:
             image_name (str): クリックしたい画像のファイル名（imagesフォルダ内）
             timeout (int): タイムアウト時間（秒）
+            hint (tuple): 記録時の位置 (x1, y1, x2, y2)。指定するとその周辺から探索
+            tracker (ChangeTracker): 画面変化の追跡状態（呼び出しをまたいで引き継ぐ場合に指定）
+            expect (str): 高速クリックモードで、クリック後に現れるはずの画像（次のステップの画像など）。
+                          クリック位置の周辺が変化しなくても、この画像が現れればクリックが効いたとみなす
+            confidence (float): このクリックだけに使う信頼度（省略時は self.confidence）
             
         Returns:
-            bool: クリックが成功したかどうか
+            bool: クリックが成功したかどうか（高速クリックモードでは効果を確認できたかどうか）
         """
         # imagesディレクトリ内のパスを生成
         image_path = self.images_dir / image_name
         
-        if not image_path.exists():
+        self.last_failure = None
+        if not self.has_template(image_name):
             print(f"エラー: 画像ファイルが見つかりません: {image_path}")
+            self.last_failure = 'not_found'
             return False
         
+        if confidence is None:
+            confidence = self.confidence
         print(f"画像を検索中: {image_path}")
-        print(f"信頼度: {self.confidence}")
+        print(f"信頼度: {confidence}")
         
-        start_time = time.time()
+        self.last_match = None
+        self.last_ring = None
+        self.last_wait = None
+        self.last_verify = None
+        self.metrics.count('attempts', image_name)
+        if tracker is None:
+            tracker = ChangeTracker()
         
-        while time.time() - start_time < timeout:
-            try:
-                # 画面上で画像を検索
-                location = pyautogui.locateOnScreen(
-                    str(image_path), 
-                    confidence=self.confidence
-                )
-                
-                if location:
-                    # 画像の中心座標を取得
-                    center = pyautogui.center(location)
-                    
-                    print(f"画像が見つかりました: {center}")
-                    
-                    # 待機時間
-                    time.sleep(self.wait_time)
-                    
-                    # クリック実行
-                    pyautogui.click(center)
-                    
-                    print(f"クリック完了: ({center.x}, {center.y})")
-                    return True
-                    
-            except pyautogui.ImageNotFoundException:
-                pass
-            except Exception as e:
-                print(f"エラーが発生しました: {e}")
+        def poll():
+            # 画面を1回キャプチャし、前回から変化した範囲だけを検索（変化なしなら照合しない）
+            frame = self.capture_frame()
+            regions = tracker.regions(frame)
+            if regions == []:
+                return None, False
+            
+            # ヒントがあれば周辺から検索
+            match, ring = self.locate_with_ring(image_name, frame, hint, regions, confidence)
+            if match:
+                return (match, ring, frame), True
+            self.metrics.count('misses', image_name)
+            tracker.mark_negative(frame)
+            return None, True
+        
+        try:
+            # 待機間隔はスケジューラが画面の変化率と照合コストから決める
+            found = self._wait(poll, timeout, image_name)
+            
+            if found is None:
+                print(f"タイムアウト: {timeout}秒以内に画像が見つかりませんでした")
+                self.last_failure = 'not_found'
                 return False
             
-            # 短時間待機してから再試行
-            time.sleep(0.5)
+            match, ring, frame = found
+            tracker.reset()
+            self.last_match = match
+            self.last_ring = ring
+            self.tracer.instant('found', template=image_name, score=round(match.score, 4), ring=describe_ring(ring))
+            
+            # 画像の中心座標を取得
+            x, y = match.center
+            
+            print(f"画像が見つかりました: ({x}, {y}) 一致度: {match.score:.3f} 探索範囲: {describe_ring(ring)}")
+            print(f"反応遅延: {self.last_wait['reaction_latency'] * 1000:.0f}ms "
+                  f"(目標 {self.scheduler.latency_target * 1000:.0f}ms)")
+            
+            if self.fast:
+                return self.fast_click(image_name, match, frame, expect, confidence)
+            
+            # 待機時間
+            self._sleep('wait_time', self.wait_time, image_name)
+            
+            # クリック実行
+            self.click_at(x, y, image_name)
+            
+            print(f"クリック完了: ({x}, {y})")
+            return True
+            
+        except Exception as e:
+            print(f"エラーが発生しました: {e}")
+            self.last_failure = 'error'
+            return False
+    
+    def fast_click(self, image_name, match, frame=None, expect=None, confidence=None):
+        """
+        待機せずにクリックし、クリックが効いたことを確認
+        
+        確認できなければ失敗として返します。verify_retries が1以上の場合は対象を探し直し、
+        クリック前と同じ位置に同じ見た目のまま残っているときだけクリックし直します
+        （チェックボックスを戻したり、送信を二重にしたりしないため）。
+        click_image の高速クリックモードと AsyncImageClicker.click で使います。
         
-        print(f"タイムアウト: {timeout}秒以内に画像が見つかりませんでした")
+        Args:
+            match (Match): クリックする一致結果
+            frame (Frame): 一致を見つけた（クリック前の）フレーム（省略時はいまの画面を取得）
+            expect (str): クリック後に現れるはずの画像ファイル名
+            confidence (float): 探し直すときの信頼度（省略時は self.confidence）
+        
+        Returns:
+            bool: クリックの効果を確認できたかどうか（結果は last_verify / last_failure にも残す）
+        """
+        self.last_verify = None
+        self.last_failure = None
+        if frame is None:
+            frame = self.capture_frame()
+        x, y = match.center
+        box = (match.left - VERIFY_MARGIN, match.top - VERIFY_MARGIN,
+               match.left + match.width + VERIFY_MARGIN, match.top + match.height + VERIFY_MARGIN)
+        target = frame.crop(match.left, match.top, match.left + match.width, match.top + match.height)
+        
+        for attempt in range(self.verify_retries + 1):
+            if attempt:
+                frame = self.capture_frame()
+                if not self._still_unclicked(image_name, target, frame, confidence):
+                    print("対象の表示が変わったため、クリックし直しません")
+                    break
+                print("クリックの効果を確認できませんでした。クリックし直します")
+            self.click_at(x, y, image_name, pause=False)
+            self.last_verify = self._verify_click(frame, box, expect)
+            self.tracer.instant('click_verified' if self.last_verify else 'click_unverified',
+                                template=image_name, result=self.last_verify, attempt=attempt)
+            if self.last_verify:
+                print(f"クリック完了: ({x}, {y}) 確認: {self.last_verify}")
+                return True
+        
+        print(f"クリックの効果を確認できませんでした: ({x}, {y})")
+        self.last_failure = 'unverified'
         return False
     
+    def _still_unclicked(self, image_name, target, frame, confidence=None):
+        """
+        クリック前と同じ位置に、同じ見た目のまま対象が表示されているか
+        
+        Args:
+            target (Frame): クリック前のフレームから切り出した一致位置
+            frame (Frame): 現在のフレーム
+        """
+        left, top = target.origin
+        current = frame.crop(left, top, left + target.width, top + target.height)
+        if (current.width, current.height) != (target.width, target.height) or region_changed(target, current):
+            return False
+        found = match_template(current.array(self.grayscale), self.get_template(image_name).array(self.grayscale))
+        return found is not None and found[1] >= (self.confidence if confidence is None else confidence)
+    
+    def _verify_click(self, before, box, expect=None):
+        """
+        クリックの効果を待つ
+        
+        Args:
+            before (Frame): クリック前のフレーム（全画面）
+            box (tuple): 変化を調べる範囲 (left, top, right, bottom)
+            expect (str): 現れるのを待つ画像ファイル名（クリック前から表示されていた位置は数えない）
+        
+        Returns:
+            str: "changed"（クリック位置の周辺が変化）、"expected"（expect の画像が出現）。
+                 verify_timeout 以内に確認できなければ None
+        """
+        reference = before.crop(*box)
+        region = (reference.origin[0], reference.origin[1], reference.width, reference.height)
+        tracker = None
+        if expect:
+            # クリック前の画面から変化した範囲だけを探し、すでに表示されていた位置で確認済みにしない
+            tracker = ChangeTracker()
+            tracker.mark_negative(before)
+        
+        deadline = time.perf_counter() + self.verify_timeout
+        with self.phase('verify', expect):
+            while True:
+                if tracker is None:
+                    current = self.capture_frame(region)
+                else:
+                    frame = self.capture_frame()
+                    current = frame.crop(*box)
+                if region_changed(reference, current):
+                    return 'changed'
+                
+                if tracker is not None:
+                    regions = tracker.regions(frame)
+                    if regions != []:
+                        match, _ = self.locate_with_ring(expect, frame, None, regions)
+                        if match:
+                            return 'expected'
+                        tracker.mark_negative(frame)
+                
+                if time.perf_counter() >= deadline:
+                    return None
+                time.sleep(VERIFY_INTERVAL)
+    
     def click_multiple_images(self, image_names, timeout=10):
         """
         複数の画像を順番にクリック
@@ -115,19 +1684,20 @@ class ImageClicker:
             else:
                 print("失敗")
                 
-            # 次の画像への待機時間
-            time.sleep(1.0)
+            # 次の画像への待機時間（高速クリックモードではクリックの確認で代わりになる）
+            if not self.fast:
+                self._sleep('between_images', 1.0)
         
         return results
     
-    def wait_and_click(self, image_name, max_wait=60, check_interval=2):
+    def wait_and_click(self, image_name, max_wait=60, check_interval=None):
         """
         画像が表示されるまで待機してからクリック
         
         Args:
             image_name (str): クリックしたい画像のファイル名（imagesフォルダ内）
             max_wait (int): 最大待機時間（秒）
-            check_interval (int): チェック間隔（秒）
+            check_interval (float): 反応遅延の目標（秒）。省略時はImageClickerの latency_target
             
         Returns:
             bool: クリックが成功したかどうか
@@ -135,50 +1705,96 @@ class ImageClicker:
         print(f"画像の出現を待機中: {image_name}")
         print(f"最大待機時間: {max_wait}秒")
         
-        start_time = time.time()
-        
-        while time.time() - start_time < max_wait:
-            if self.click_image(image_name, timeout=1):
+        with self._latency_target(check_interval):
+            if self.click_image(image_name, timeout=max_wait):
                 return True
-            
-            print(f"待機中... ({int(time.time() - start_time)}秒経過)")
-            time.sleep(check_interval)
         
         print(f"最大待機時間を超過しました: {max_wait}秒")
         return False
 
 
-def main():
-    """メイン関数 - コマンドライン引数から画像をクリック"""
-    if len(sys.argv) < 2:
-        print("使用方法: python image_clicker.py <画像ファイル名> [信頼度]")
-        print("例: python image_clicker.py button.png 0.9")
-        print("注意: 画像ファイルはimagesフォルダ内に配置してください")
-        sys.exit(1)
-    
-    image_name = sys.argv[1]
-    confidence = float(sys.argv[2]) if len(sys.argv) > 2 else 0.8
-    
-    # ImageClickerを初期化
-    clicker = ImageClicker(confidence=confidence)
+def parse_args(argv=None):
+    """コマンドライン引数を解析"""
+    import argparse
     
-    print("=== 画像クリックツール ===")
-    print(f"対象画像: images/{image_name}")
-    print("3秒後に開始します...")
-    
-    # 開始前の待機時間
-    for i in range(3, 0, -1):
-        print(f"{i}...")
-        time.sleep(1)
+    parser = argparse.ArgumentParser(
+        description="画面上の画像を検索してクリック",
+        epilog="画像ファイルはimagesフォルダ内に配置してください。例: python image_clicker.py button.png 0.9")
+    parser.add_argument('image', help="クリックしたい画像のファイル名（imagesフォルダ内）")
+    parser.add_argument('confidence', nargs='?', type=float, default=0.8, help="信頼度 (0.0-1.0)")
+    parser.add_argument('--images-dir', default="images", help="画像フォルダ")
+    parser.add_argument('--engine', choices=list(ENGINES), default='opencv', help="マッチングエンジン")
+    parser.add_argument('--capture', default='auto',
+                        help="キャプチャバックエンド (auto, pyautogui, x11, replay)")
+    parser.add_argument('--replay', help="--capture replay で再生するフレーム（PNGまたはフォルダ）")
+    parser.add_argument('--timeout', type=float, default=10, help="タイムアウト時間（秒）")
+    parser.add_argument('--countdown', type=int, default=3, help="開始前の待機時間（秒）")
+    parser.add_argument('--locate', action='store_true',
+                        help="クリックせず、1回だけ検索して位置を表示（見つからなければ終了コード1）。"
+                             "位置の記憶（.positions.json）とテンプレートの前処理結果（.compiled）は書き込まない")
+    parser.add_argument('--fast', action='store_true',
+                        help="待機せずにクリックし、クリック位置の周辺の変化でクリックが効いたことを確認する")
+    parser.add_argument('--all', action='store_true',
+                        help="一致する位置をすべてクリック（--locate と併用するとすべての位置を表示）")
+    args = parser.parse_args(argv)
+    if args.capture == 'replay' and not args.replay:
+        parser.error("--capture replay には --replay でフレームを指定してください")
+    return args
+
+
+def main(argv=None):
+    """メイン関数 - コマンドライン引数から画像をクリック"""
+    args = parse_args(argv)
     
-    # 画像をクリック
-    success = clicker.click_image(image_name)
+    capture = create_backend('replay', source=args.replay) if args.capture == 'replay' else args.capture
     
-    if success:
-        print("✓ クリックが完了しました")
-    else:
-        print("✗ クリックに失敗しました")
+    # ImageClickerを初期化（終了時にキャプチャバックエンドを解放し、位置の記憶を保存する）
+    # --locate は検索するだけなので、images フォルダには何も書き込まない
+    with ImageClicker(confidence=args.confidence, images_dir=args.images_dir,
+                      engine=args.engine, capture=capture, fast=args.fast,
+                      compiled_templates=not args.locate, remember_positions=not args.locate) as clicker:
+        if args.locate and args.all:
+            matches = clicker.locate_all(args.image, order='reading')
+            if not matches:
+                print("見つかりませんでした")
+                return 1
+            for match in matches:
+                x, y = match.center
+                print(f"{x} {y} {match.score:.3f}")
+            return 0
+        
+        if args.locate:
+            match = clicker.locate(args.image)
+            if match is None:
+                print("見つかりませんでした")
+                return 1
+            x, y = match.center
+            print(f"{x} {y} {match.score:.3f}")
+            return 0
+        
+        print("=== 画像クリックツール ===")
+        print(f"対象画像: {clicker.images_dir / args.image}")
+        
+        # 開始前の待機時間
+        if args.countdown > 0:
+            print(f"{args.countdown}秒後に開始します...")
+            for i in range(args.countdown, 0, -1):
+                print(f"{i}...")
+                time.sleep(1)
+        
+        # 画像をクリック
+        if args.all:
+            success = bool(clicker.click_all(args.image, timeout=args.timeout))
+        else:
+            success = clicker.click_image(args.image, timeout=args.timeout)
+        
+        if success:
+            print("✓ クリックが完了しました")
+            return 0
+        else:
+            print("✗ クリックに失敗しました")
+            return 1
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
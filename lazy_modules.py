@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+重い依存モジュールの遅延インポート
+モジュールオブジェクトだけを先に用意し、最初に属性へアクセスした時点で本体を読み込みます
+（`--help` や小さなスクリプトの起動時に OpenCV・NumPy などの読み込みを待たずに済みます）
+"""
+
+import importlib
+import importlib.util
+import sys
+import threading
+import types
+
+
+# 本体の読み込みを1回だけにするためのロック
+# （importlib.util.LazyLoader は Python 3.11 ではスレッドセーフでなく、複数のスレッドが同時に最初の
+#  属性アクセスをすると、読み込み途中のモジュールが見えて AttributeError になる）
+_load_lock = threading.RLock()
+
+
+class _LazyModule(types.ModuleType):
+    """最初に見つからない属性へアクセスした時点で本体を読み込み、属性を写し取るモジュール"""
+    
+    def __getattr__(self, attr):
+        with _load_lock:
+            module = importlib.import_module(self.__name__)
+            if self.__dict__.get('_lazy_loaded') is not module:
+                self.__dict__.update(module.__dict__)
+                self.__dict__['_lazy_loaded'] = module
+        return getattr(module, attr)
+
+
+def lazy_import(name):
+    """
+    モジュールを遅延インポート
+    
+    すでに読み込まれていればそのモジュールを返します。
+    読み込みはロックの中で1回だけ行うので、複数のスレッドから同時に使い始めても安全です。
+    
+    Args:
+        name (str): モジュール名（"cv2", "PIL.Image" など）
+    
+    Returns:
+        module: 最初の属性アクセスで読み込まれるモジュール
+    
+    Raises:
+        ModuleNotFoundError: モジュールがインストールされていない場合
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    
+    if importlib.util.find_spec(name) is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    # sys.modules には登録しない（本体は importlib.import_module が通常どおり読み込んで登録する）
+    return _LazyModule(name)
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+処理時間と検索結果の計測
+キャプチャ・テンプレート読み込み・照合・待機・クリックなどのフェーズごとの所要時間と、
+テンプレートごとの試行・一致・不一致・タイムアウトの回数を記録し、
+JSON Lines（1記録1行）と Prometheus のテキスト形式で書き出します
+
+使用例:
+    metrics = Metrics(jsonl_path="metrics.jsonl")
+    clicker = ImageClicker(metrics=metrics)
+    clicker.click_image("button.png")
+    metrics.write_prometheus("metrics.prom")
+"""
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+from atomic_file import atomic_write
+
+
+# フェーズの所要時間のヒストグラムの区切り（秒）
+PHASE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# テンプレートごとに数えるイベント
+TEMPLATE_EVENTS = ('attempts', 'hits', 'misses', 'timeouts', 'position_hits', 'position_misses')
+
+
+class _PhaseStats:
+    """1つの (フェーズ, テンプレート) の所要時間の集計"""
+    
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * len(PHASE_BUCKETS)
+    
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        for i, bound in enumerate(PHASE_BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+
+
+def _escape(value):
+    """Prometheus のラベル値のエスケープ"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Metrics:
+    """
+    フェーズごとの所要時間とテンプレートごとの回数を集計
+    
+    複数のスレッドから同時に記録できます。
+    """
+    
+    def __init__(self, jsonl_path=None, namespace="image_clicker"):
+        """
+        Args:
+            jsonl_path (str | Path): 記録を1行ずつ追記するJSON Linesファイル（省略時は書き出さない）
+            namespace (str): Prometheus のメトリクス名の接頭辞
+        """
+        self.namespace = namespace
+        self._phases = {}
+        self._events = {}
+        self._lock = threading.Lock()
+        self._jsonl = open(jsonl_path, 'a', encoding='utf-8') if jsonl_path else None
+    
+    def _write(self, record):
+        if self._jsonl is None:
+            return
+        record['ts'] = time.time()
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self._jsonl.write(line + "\n")
+    
+    def observe(self, phase, seconds, template=None):
+        """フェーズの所要時間（秒）を記録"""
+        key = (phase, template)
+        with self._lock:
+            stats = self._phases.get(key)
+            if stats is None:
+                stats = self._phases[key] = _PhaseStats()
+            stats.add(seconds)
+        self._write({'type': 'phase', 'phase': phase, 'template': template, 'seconds': seconds})
+    
+    @contextmanager
+    def timer(self, phase, template=None):
+        """with ブロックの所要時間をフェーズとして記録（例外で抜けた場合も記録）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(phase, time.perf_counter() - start, template)
+    
+    def count(self, event, template, n=1):
+        """テンプレートごとのイベント（TEMPLATE_EVENTS）を数える"""
+        key = (event, template)
+        with self._lock:
+            self._events[key] = self._events.get(key, 0) + n
+        self._write({'type': 'event', 'event': event, 'template': template, 'count': n})
+    
+    def snapshot(self):
+        """
+        現在の集計値
+        
+        Returns:
+            dict: phases（フェーズごとの count, total, mean, max）と templates（テンプレートごとの回数）
+        """
+        with self._lock:
+            phases = [{
+                'phase': phase,
+                'template': template,
+                'count': stats.count,
+                'total': stats.total,
+                'mean': stats.total / stats.count,
+                'max': stats.max,
+            } for (phase, template), stats in sorted(self._phases.items(), key=lambda i: (i[0][0], i[0][1] or ""))]
+            templates = {}
+            for (event, template), value in self._events.items():
+                templates.setdefault(template, dict.fromkeys(TEMPLATE_EVENTS, 0))[event] = value
+        return {'phases': phases, 'templates': templates}
+    
+    def prometheus_text(self):
+        """Prometheus のテキスト形式（exposition format）に変換"""
+        name = f"{self.namespace}_phase_seconds"
+        lines = [
+            f"# HELP {name} 各フェーズの所要時間（秒）",
+            f"# TYPE {name} histogram",
+        ]
+        with self._lock:
+            for (phase, template), stats in sorted(self._phases.items(), key=lambda i: (i[0][0], i[0][1] or "")):
+                labels = f'phase="{_escape(phase)}",template="{_escape(template or "")}"'
+                cumulative = 0
+                for bound, bucket in zip(PHASE_BUCKETS, stats.buckets):
+                    cumulative += bucket
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {stats.count}')
+                lines.append(f'{name}_sum{{{labels}}} {stats.total:.6f}')
+                lines.append(f'{name}_count{{{labels}}} {stats.count}')
+            
+            events = sorted(self._events.items(), key=lambda i: (i[0][0], i[0][1] or ""))
+        
+        name = f"{self.namespace}_template_events_total"
+        lines += [
+            f"# HELP {name} テンプレートごとの試行・一致・不一致・タイムアウト・前回の位置での一致と不一致の回数",
+            f"# TYPE {name} counter",
+        ]
+        for (event, template), value in events:
+            lines.append(f'{name}{{template="{_escape(template or "")}",event="{event}"}} {value}')
+        return "\n".join(lines) + "\n"
+    
+    def write_prometheus(self, path):
+        """Prometheus のテキスト形式でファイルに書き出す（node_exporter の textfile collector 向けに置き換えで書く）"""
+        atomic_write(path, self.prometheus_text())
+    
+    def close(self):
+        """JSON Lines ファイルを閉じる"""
+        with self._lock:
+            if self._jsonl is not None:
+                self._jsonl.close()
+                self._jsonl = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+
+class NullMetrics:
+    """何も記録しない Metrics（計測しない場合の既定値）"""
+    
+    def observe(self, phase, seconds, template=None):
+        pass
+    
+    @contextmanager
+    def timer(self, phase, template=None):
+        yield
+    
+    def count(self, event, template, n=1):
+        pass
+    
+    def snapshot(self):
+        return {'phases': [], 'templates': {}}
+    
+    def close(self):
+        pass
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+複数プロセスでのテンプレートマッチング
+画面画像は共有メモリ経由でワーカーに渡し（pickleしない）、テンプレートの一覧または
+画面を縦に分割したタイルを、常駐するプロセスプールに振り分けて照合します
+"""
+
+import multiprocessing
+import os
+import threading
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from image_clicker import Frame
+from lazy_modules import lazy_import
+
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+
+
+# 画面の画素数 × テンプレート数がこれ未満なら、プロセス間のやり取りの方が高くつくので同じプロセスで照合
+PARALLEL_MIN_WORK = 1920 * 1080 * 2
+# タイル分割するときの1タイルの最小の高さ（ピクセル）
+TILE_MIN_HEIGHT = 128
+
+
+def _attach(name):
+    """既存の共有メモリに接続（後片付けは作成した親プロセスが担当する）"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python 3.12以前: ワーカーは親のresource_trackerを共有しているので、
+        # 接続時の登録は親の登録と重なるだけで解除は不要
+        return shared_memory.SharedMemory(name=name)
+
+
+# ワーカープロセス側の状態: 接続中の共有メモリと、現在のフレーム
+_worker_shm = None
+_worker_frame = None
+
+
+def _init_worker():
+    # プロセス数ぶん並列化するので、OpenCV内部のスレッドは使わない
+    cv2.setNumThreads(1)
+
+
+def _worker_frame_for(descriptor):
+    """共有メモリ上のフレームをコピーせずにFrameとして取得（同じ世代なら縮小画像も再利用）"""
+    global _worker_shm, _worker_frame
+    name, generation, shape, dtype, origin, grayscale = descriptor
+    
+    if _worker_frame is not None and _worker_frame[0] == (name, generation):
+        return _worker_frame[1]
+    
+    if _worker_shm is None or _worker_shm.name != name:
+        if _worker_shm is not None:
+            _worker_shm.close()
+        _worker_shm = _attach(name)
+    
+    array = np.ndarray(shape, dtype=dtype, buffer=_worker_shm.buf)
+    frame = Frame(array, origin=origin)
+    if grayscale:
+        frame._gray = array
+    _worker_frame = ((name, generation), frame)
+    return frame
+
+
+def _match_job(descriptor, band, templates, grayscale, engine):
+    """
+    ワーカーで実行: 帯状の範囲（Noneなら全体）で各テンプレートの最良位置を求める
+    
+    Returns:
+        dict: 名前 -> Match（信頼度による足切りなし）
+    """
+    frame = _worker_frame_for(descriptor)
+    if band is not None:
+        top, bottom = band
+        ox, oy = frame.origin
+        frame = frame.crop(ox, oy + top, ox + frame.width, oy + bottom)
+    return {name: frame.match(template, grayscale, engine) for name, template in templates}
+
+
+class _SharedFrameBuffer:
+    """親プロセス側で使い回す共有メモリ（大きいフレームが来たら作り直す）"""
+    
+    def __init__(self):
+        self.shm = None
+        self.generation = 0
+    
+    def publish(self, frame, grayscale):
+        """フレームを共有メモリにコピーし、ワーカーに渡す記述子を返す"""
+        array = np.ascontiguousarray(frame.array(grayscale))
+        if self.shm is None or self.shm.size < array.nbytes:
+            self.close()
+            self.shm = shared_memory.SharedMemory(create=True, size=array.nbytes)
+        
+        np.ndarray(array.shape, dtype=array.dtype, buffer=self.shm.buf)[:] = array
+        self.generation += 1
+        return (self.shm.name, self.generation, array.shape, array.dtype.str,
+                frame.origin, grayscale)
+    
+    def close(self):
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+
+class ParallelMatcher:
+    """
+    常駐プロセスプールでテンプレートマッチングを並列化
+    
+    テンプレートがワーカー数以上あればテンプレートの一覧を分割し、少なければ
+    画面をテンプレートの高さぶん重ねた横長のタイルに分割して、結果を統合します。
+    小さな仕事はプロセスに渡さずその場で照合します。
+    
+    共有メモリは1つを使い回すので、複数のスレッドから呼んだ場合は並列照合を1回ずつ順に行います。
+    """
+    
+    def __init__(self, workers=None, min_work=PARALLEL_MIN_WORK):
+        """
+        Args:
+            workers (int): ワーカープロセス数（省略時はCPUコア数）
+            min_work (int): 並列化する最小の仕事量（画面の画素数 × テンプレート数）
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.min_work = min_work
+        self._pool = [None]  # 終了処理からも参照できるようにリストで保持
+        self._buffer = _SharedFrameBuffer()
+        # 共有メモリへの書き込みから結果の回収までの間、別の呼び出しにフレームを上書きさせない
+        self._lock = threading.Lock()
+        # 呼び出し側がclose()し忘れても共有メモリを残さない
+        self._finalizer = weakref.finalize(self, ParallelMatcher._shutdown,
+                                           self._buffer, self._pool)
+    
+    @staticmethod
+    def _shutdown(buffer, pool):
+        if pool[0] is not None:
+            pool[0].shutdown(wait=True)
+            pool[0] = None
+        buffer.close()
+    
+    def _get_pool(self):
+        """プールは初回の並列照合時に起動し、以降は使い回す"""
+        if self._pool[0] is None:
+            self._pool[0] = ProcessPoolExecutor(self.workers,
+                                                mp_context=multiprocessing.get_context('spawn'),
+                                                initializer=_init_worker)
+        return self._pool[0]
+    
+    def is_small(self, frame, count):
+        """並列化せずにその場で照合すべき仕事か"""
+        return self.workers <= 1 or frame.width * frame.height * count < self.min_work
+    
+    def _bands(self, frame, template_height, parts):
+        """画面を縦に parts 個の帯に分割（テンプレートが境界をまたいでも見つかるように重ねる）"""
+        parts = max(min(parts, frame.height // max(template_height * 4, TILE_MIN_HEIGHT)), 1)
+        if parts == 1:
+            return [None]
+        step = -(-frame.height // parts)
+        return [(top, min(top + step + template_height - 1, frame.height))
+                for top in range(0, frame.height, step)]
+    
+    def match_many(self, frame, templates, grayscale=False, engine='opencv'):
+        """
+        複数テンプレートの最良位置をまとめて求める（信頼度による足切りなし）
+        
+        Args:
+            frame (Frame): 検索対象のフレーム
+            templates (dict): 名前 -> Template
+        
+        Returns:
+            dict: 名前 -> Match（照合できない場合はNone）
+        """
+        if not templates:
+            return {}
+        if self.is_small(frame, len(templates)):
+            return {name: frame.match(template, grayscale, engine)
+                    for name, template in templates.items()}
+        
+        items = list(templates.items())
+        if len(items) >= self.workers:
+            # テンプレートの一覧を分割（大きい順に配って負荷を揃える）
+            items.sort(key=lambda item: item[1].width * item[1].height, reverse=True)
+            jobs = [(None, items[i::self.workers]) for i in range(self.workers)]
+        else:
+            # テンプレートが少ないので画面をタイルに分割
+            parts = -(-self.workers // len(items))
+            jobs = [(band, [item]) for item in items
+                    for band in self._bands(frame, item[1].height, parts)]
+        
+        results = {name: None for name in templates}
+        with self._lock:
+            descriptor = self._buffer.publish(frame, grayscale)
+            pool = self._get_pool()
+            futures = [pool.submit(_match_job, descriptor, band, chunk, grayscale, engine)
+                       for band, chunk in jobs if chunk]
+            for future in futures:
+                for name, match in future.result().items():
+                    if match is not None and (results[name] is None or match.score > results[name].score):
+                        results[name] = match
+        return results
+    
+    def locate_many(self, frame, templates, confidence=0.8, grayscale=False, engine='opencv'):
+        """
+        Frame.locate_many の並列版
+        
+        Returns:
+            dict: 名前 -> Match（見つからなかった場合はNone）
+        """
+        if not isinstance(templates, dict):
+            templates = {template.path.name: template for template in templates}
+        results = self.match_many(frame, templates, grayscale, engine)
+        return {name: match if match is not None and match.score >= confidence else None
+                for name, match in results.items()}
+    
+    def locate(self, frame, template, confidence=0.8, grayscale=False, engine='opencv'):
+        """Frame.locate の並列版（画面をタイルに分割して照合）"""
+        return self.locate_many(frame, {template.path.name: template},
+                                confidence, grayscale, engine)[template.path.name]
+    
+    def close(self):
+        """プロセスプールを終了し、共有メモリを解放"""
+        self._finalizer()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
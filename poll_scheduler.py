@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+画面ポーリングの間隔を調整するスケジューラ
+固定の待機時間の代わりに、反応遅延の目標とCPU使用率の上限から次の待機時間を決めます
+"""
+
+import time
+
+
+class PollScheduler:
+    """
+    目標の反応遅延とCPU予算に合わせてポーリング間隔を自動調整
+    
+    1回のポーリング（キャプチャ＋照合）にかかる時間を、画面が変化した回と
+    変化しなかった回に分けて指数移動平均で記録し、画面の変化率から
+    次のポーリングのコストを見積もります。
+    
+    - 反応遅延 ≒ 待機時間 + 1回のコスト なので、待機時間は「目標 - コスト」以下にする
+    - CPU使用率 = コスト / (コスト + 待機時間) を予算以下にするため、待機時間には下限がある
+    
+    両方を満たせない場合はCPU予算を優先し、達成できた反応遅延をレポートに残します。
+    """
+    
+    def __init__(self, latency_target=0.5, cpu_budget=0.25, min_interval=0.01, smoothing=0.3):
+        """
+        Args:
+            latency_target (float): 画面に現れてから反応するまでの目標時間（秒）
+            cpu_budget (float): ポーリングに使ってよいCPU時間の割合（1コア=1.0）
+            min_interval (float): 最短の待機時間（秒）
+            smoothing (float): 移動平均の重み（大きいほど直近の値を重視）
+        """
+        if not 0 < cpu_budget <= 1:
+            raise ValueError(f"cpu_budget は 0より大きく1以下で指定してください: {cpu_budget}")
+        self.latency_target = latency_target
+        self.cpu_budget = cpu_budget
+        self.min_interval = min_interval
+        self.smoothing = smoothing
+        
+        # 待機をまたいで学習する値
+        self.changed_cost = None    # 画面が変化した回の平均コスト（秒）
+        self.unchanged_cost = None  # 画面が変化しなかった回の平均コスト（秒）
+        self.change_rate = 1.0      # 画面が変化する割合
+        
+        self.report = None
+        self._reset_counters()
+    
+    def _reset_counters(self):
+        self.polls = 0
+        self.skipped = 0
+        self.busy_time = 0.0
+        self.cpu_time = 0.0
+        self.slept = 0.0
+    
+    def _average(self, current, value):
+        if current is None:
+            return value
+        return current + self.smoothing * (value - current)
+    
+    def record(self, cost, changed):
+        """1回のポーリングの結果を記録"""
+        self.polls += 1
+        self.busy_time += cost
+        if changed:
+            self.changed_cost = self._average(self.changed_cost, cost)
+        else:
+            self.skipped += 1
+            self.unchanged_cost = self._average(self.unchanged_cost, cost)
+        self.change_rate = self._average(self.change_rate, 1.0 if changed else 0.0)
+    
+    def expected_cost(self):
+        """次のポーリングにかかる時間の見積もり（秒）"""
+        changed = self.changed_cost if self.changed_cost is not None else self.unchanged_cost
+        unchanged = self.unchanged_cost if self.unchanged_cost is not None else changed
+        if changed is None:
+            return 0.0
+        return self.change_rate * changed + (1 - self.change_rate) * unchanged
+    
+    def next_interval(self):
+        """次のポーリングまでの待機時間（秒）"""
+        cost = self.expected_cost()
+        # 反応遅延の目標を守れる最長の待機時間
+        latency_interval = self.latency_target - cost
+        # CPU予算を守るために必要な最短の待機時間
+        budget_interval = cost * (1 / self.cpu_budget - 1)
+        return max(latency_interval, budget_interval, self.min_interval)
+    
+    def run(self, poll, timeout, sleep=time.sleep):
+        """
+        poll() を結果が得られるかタイムアウトするまで繰り返す
+        
+        Args:
+            poll (callable): (結果, 画面が変化したか) を返す関数。結果がNone以外なら終了
+            timeout (float): タイムアウト時間（秒）
+            sleep (callable): ポーリング間の待機に使う関数（計測用に差し替え可能）
+        
+        Returns:
+            poll() の結果。タイムアウト時は None（詳細は report を参照）
+        """
+        self._reset_counters()
+        start = time.perf_counter()
+        deadline = start + timeout
+        previous_capture = None
+        
+        while True:
+            poll_start = time.perf_counter()
+            cpu_start = time.thread_time()
+            result, changed = poll()
+            poll_end = time.perf_counter()
+            self.cpu_time += time.thread_time() - cpu_start
+            self.record(poll_end - poll_start, changed)
+            
+            if result is not None:
+                # 前回のキャプチャ直後に現れた場合が最悪の反応遅延になる
+                since = previous_capture if previous_capture is not None else poll_start
+                self._finish(True, start, poll_end, poll_end - since)
+                return result
+            
+            previous_capture = poll_start
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                self._finish(False, start, time.perf_counter(), None)
+                return None
+            
+            interval = min(self.next_interval(), remaining)
+            sleep(interval)
+            self.slept += interval
+    
+    def _finish(self, found, start, end, reaction_latency):
+        elapsed = end - start
+        self.report = {
+            'found': found,
+            'elapsed': elapsed,
+            'polls': self.polls,
+            'skipped_polls': self.skipped,
+            'reaction_latency': reaction_latency,
+            'latency_target': self.latency_target,
+            'latency_met': found and reaction_latency <= self.latency_target,
+            'poll_time': self.busy_time,
+            'cpu_time': self.cpu_time,
+            'cpu_ratio': self.cpu_time / elapsed if elapsed > 0 else 0.0,
+            'mean_interval': self.slept / max(self.polls - 1, 1),
+        }
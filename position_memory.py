@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+画像が最後に見つかった位置の記憶
+テンプレートごとに最後に一致した矩形と、画面全体を探したときの所要時間をJSONファイルに保存し、
+次回（別の実行でも）はまずその位置だけを1回照合してから広い範囲を探します
+
+ファイル形式（images/.positions.json）:
+    {"<画像ファイル名>": {"box": [left, top, width, height], "score": 0.98, "search_seconds": 0.012}, ...}
+"""
+
+import atexit
+import json
+import threading
+import weakref
+from pathlib import Path
+
+from atomic_file import atomic_write
+
+
+POSITIONS_FILE_NAME = ".positions.json"
+# 探索時間の移動平均で新しい値に掛ける重み
+SEARCH_TIME_WEIGHT = 0.3
+# 位置が変わってからファイルに保存するまでの時間（秒）。その間の変更はまとめて1回で書き込む
+SAVE_INTERVAL = 5.0
+
+# 終了時に未保存の位置を書き込むため、生きているインスタンスを覚えておく
+_instances = weakref.WeakSet()
+
+
+@atexit.register
+def _save_all():
+    for memory in list(_instances):
+        memory.save()
+
+
+class PositionMemory:
+    """
+    テンプレートごとの最後に見つかった位置
+    
+    照合のたびにファイルを書くことはせず、位置が変わったら SAVE_INTERVAL 秒後に別スレッドでまとめて保存します
+    （close() とプロセスの終了時にも保存）。書き込むときは他のプロセスが保存した内容と
+    合わせてから置き換えるので、並列に実行しても他のテンプレートの位置は消えません。
+    """
+    
+    def __init__(self, path=None):
+        """
+        Args:
+            path (str | Path): 保存先のJSONファイル（省略時は保存せずメモリ上だけで覚える）
+        """
+        self.path = Path(path) if path else None
+        self._entries = self._read()
+        self._changed = set()
+        self._timer = None
+        self._lock = threading.Lock()
+        # ファイルの読み込みから置き換えまでを直列にする（照合側の _lock はファイル操作の間は持たない）
+        self._save_lock = threading.Lock()
+        _instances.add(self)
+    
+    def _read(self):
+        if self.path is None:
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return entries if isinstance(entries, dict) else {}
+    
+    def recall(self, image_name):
+        """
+        最後に見つかった矩形
+        
+        Returns:
+            tuple: (left, top, width, height)。覚えていなければNone
+        """
+        with self._lock:
+            entry = self._entries.get(image_name)
+            box = entry.get('box') if isinstance(entry, dict) else None
+        if not box or len(box) != 4:
+            return None
+        return tuple(box)
+    
+    def search_seconds(self, image_name):
+        """位置の記憶を使わずに探したときの所要時間（秒）の移動平均。未計測ならNone"""
+        with self._lock:
+            entry = self._entries.get(image_name)
+            return entry.get('search_seconds') if isinstance(entry, dict) else None
+    
+    def remember(self, image_name, match, search_seconds=None):
+        """
+        見つかった位置を記録（位置が変わった場合は少し後でファイルにも保存）
+        
+        Args:
+            match (Match): 一致結果
+            search_seconds (float): 記憶した位置以外も探した場合の照合の所要時間
+        """
+        box = [match.left, match.top, match.width, match.height]
+        with self._lock:
+            entry = self._entries.get(image_name)
+            if not isinstance(entry, dict):
+                entry = self._entries[image_name] = {}
+            moved = entry.get('box') != box
+            entry['box'] = box
+            entry['score'] = round(match.score, 4)
+            if search_seconds is not None:
+                previous = entry.get('search_seconds')
+                entry['search_seconds'] = search_seconds if previous is None else (
+                    previous + (search_seconds - previous) * SEARCH_TIME_WEIGHT)
+            if moved:
+                self._changed.add(image_name)
+                self._schedule_save()
+    
+    def _schedule_save(self):
+        """SAVE_INTERVAL 秒後の保存を予約（_lock を持った状態で呼ぶ）"""
+        if self.path is None or self._timer is not None:
+            return
+        self._timer = threading.Timer(SAVE_INTERVAL, self.save)
+        self._timer.daemon = True
+        self._timer.start()
+    
+    def forget(self, image_name):
+        """位置の記憶を消す（テンプレートを撮り直したときなど）"""
+        with self._lock:
+            if self._entries.pop(image_name, None) is not None:
+                self._changed.add(image_name)
+        self.save()
+    
+    def save(self):
+        """変更したテンプレートの位置をファイルに保存（保存できなくても動作は変わらない）"""
+        if self.path is None:
+            return False
+        with self._save_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                changed = {name: dict(self._entries[name]) if name in self._entries else None
+                           for name in self._changed}
+                self._changed.clear()
+            if not changed:
+                return True
+            
+            # 他のプロセスが保存した位置に、このプロセスで変わった位置だけを上書きする
+            entries = self._read()
+            for name, entry in changed.items():
+                if entry is not None:
+                    entries[name] = entry
+                else:
+                    entries.pop(name, None)
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                atomic_write(self.path, json.dumps(entries, ensure_ascii=False))
+            except OSError:
+                # 次の保存でもう一度書き込む
+                with self._lock:
+                    self._changed.update(changed)
+                return False
+            return True
+    
+    def close(self):
+        """未保存の位置を保存"""
+        self.save()
+    
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+ワークフローの一括実行ツール（GUI・カウントダウンなし）
+保存済みのワークフローJSONを順番または並列に実行し、結果をJSONレポートに書き出します
+
+使い方:
+    python run_workflows.py                          # workflows/*.json をすべて実行
+    python run_workflows.py workflows/login.json --report report.json
+    python run_workflows.py workflows --parallel 4 --capture replay --replay frames/
+    python run_workflows.py --metrics-jsonl metrics.jsonl --metrics-prom metrics.prom
+    python run_workflows.py workflows/login.json --trace trace.json   # chrome://tracing で開ける
+    python run_workflows.py dist/login.icwf          # バンドル（画像入りの1ファイル）を実行
+    python run_workflows.py workflows --displays 4 --launch "firefox --kiosk https://example.com"
+                                                     # 仮想ディスプレイ4つで同時に実行（Linux、Xvfb）
+
+終了コード:
+    0: すべてのワークフローが成功
+    1: 失敗したステップがある
+    2: ワークフローや画像の読み込みに失敗した、または実行するワークフローがない
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from capture_backends import BACKENDS, create_backend
+from display_pool import XVFB_SCREEN, DisplayPool
+from image_clicker import ENGINES, ImageClicker
+from metrics import Metrics
+from tracing import Tracer
+from workflow_bundle import BUNDLE_SUFFIX, WorkflowBundle, is_bundle
+from workflow_engine import DEFAULT_STEP_TIMEOUT, WorkflowEngine, load_plan
+
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_ERROR = 2
+
+
+def find_workflows(paths):
+    """ファイル・ディレクトリの指定からワークフローJSONとバンドルの一覧を作成（重複なし）"""
+    found = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            found.extend(sorted([*path.glob("*.json"), *path.glob(f"*{BUNDLE_SUFFIX}")]))
+        else:
+            found.append(path)
+    return list(dict.fromkeys(found))
+
+
+def make_clicker(args, metrics=None, tracer=None):
+    """引数の設定で ImageClicker を作成（使い終わったら close() する）"""
+    if args.capture == 'replay':
+        capture = create_backend('replay', source=args.replay)
+    else:
+        capture = args.capture
+    return ImageClicker(confidence=args.confidence, wait_time=args.wait_time,
+                        images_dir=args.images_dir, engine=args.engine, capture=capture,
+                        metrics=metrics, tracer=tracer, fast=args.fast, verify_timeout=args.verify_timeout)
+
+
+def run_one(path, args, metrics=None, tracer=None, clicker=None):
+    """
+    ワークフローを1本実行
+    
+    Args:
+        clicker (ImageClicker): 使い回す ImageClicker（省略時はこのワークフロー用に作成して最後に閉じる）
+    
+    Returns:
+        dict: WorkflowEngine.run の結果。読み込みや実行中の例外は error に記録
+    """
+    start = time.perf_counter()
+    try:
+        with contextlib.ExitStack() as stack:
+            if clicker is None:
+                # Xサーバーへの接続や画面サイズの共有メモリを持つので、ワークフローごとに解放する
+                clicker = stack.enter_context(make_clicker(args, metrics, tracer))
+            else:
+                # 前のワークフローのバンドルの画像を使わないようにする
+                clicker.bundled_templates.clear()
+            engine = WorkflowEngine(clicker, prefetch=not args.no_prefetch)
+            if is_bundle(path):
+                # バンドルの画像はメモリマップした配列をそのまま使う
+                # （終了時は画像を外してからメモリマップを閉じる）
+                bundle = stack.enter_context(WorkflowBundle(path))
+                clicker.use_bundle(bundle)
+                stack.callback(clicker.bundled_templates.clear)
+                plan = bundle.plan(default_timeout=args.timeout)
+            else:
+                plan = load_plan(path, default_timeout=args.timeout)
+            with clicker.tracer.span(path.stem, 'workflow', source=str(path)):
+                result = engine.run(plan, stop_on_failure=args.stop_on_failure)
+        result['error'] = None
+        return result
+    except Exception as e:
+        return {
+            'name': path.stem,
+            'source': str(path),
+            'success': False,
+            'elapsed': time.perf_counter() - start,
+            'error': f"{type(e).__name__}: {e}",
+            'steps': [],
+        }
+
+
+def summarize(results, elapsed):
+    """全ワークフローの集計"""
+    errors = [r for r in results if r['error']]
+    failed = [r for r in results if not r['success'] and not r['error']]
+    click_steps = [s for r in results for s in r['steps'] if s['type'] == 'click']
+    return {
+        'workflows': len(results),
+        'succeeded': len(results) - len(errors) - len(failed),
+        'failed': len(failed),
+        'errors': len(errors),
+        'click_steps': len(click_steps),
+        'failed_steps': sum(not s['success'] for s in click_steps),
+        'elapsed': elapsed,
+    }
+
+
+def exit_code(summary):
+    if summary['errors'] or summary['workflows'] == 0:
+        return EXIT_ERROR
+    if summary['failed']:
+        return EXIT_FAILED
+    return EXIT_OK
+
+
+# クリックが失敗した理由ごとの表示
+FAILURE_MESSAGES = {
+    'not_found': "{image} が見つかりませんでした",
+    'unverified': "{image} をクリックしましたが、クリックの効果を確認できませんでした",
+    'error': "{image} のクリック中にエラーが発生しました",
+}
+
+
+def print_result(result):
+    mark = "✓" if result['success'] else "✗"
+    print(f"{mark} {result['name']} ({result['elapsed']:.2f}秒)")
+    if result['error']:
+        print(f"    エラー: {result['error']}")
+    for step in result['steps']:
+        if step['type'] == 'click' and not step['success']:
+            message = FAILURE_MESSAGES.get(step.get('failure'), "{image} のクリックに失敗しました")
+            print(f"    ステップ {step['step']}: {message.format(image=step['image'])}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="保存済みワークフローの一括実行")
+    parser.add_argument('paths', nargs='*', default=["workflows"],
+                        help="ワークフローJSON・バンドル（.icwf）またはそれを含むフォルダ（省略時は workflows）")
+    parser.add_argument('--parallel', type=int, default=1,
+                        help="同時に実行するワークフロー数（実画面では操作が混ざるので1を推奨）")
+    parser.add_argument('--displays', type=int, default=0,
+                        help="仮想ディスプレイ（Xvfb）をこの数だけ起動し、それぞれのワーカーで同時に実行")
+    parser.add_argument('--xvfb-screen', default=XVFB_SCREEN, help="仮想ディスプレイの画面（幅x高さx色深度）")
+    parser.add_argument('--launch', help="--displays でワークフローごとに対象アプリを起動するコマンド")
+    parser.add_argument('--launch-wait', type=float, default=2.0, help="--launch の後、実行を始めるまでの待機（秒）")
+    parser.add_argument('--report', help="結果を書き出すJSONファイル")
+    parser.add_argument('--confidence', type=float, default=0.8, help="信頼度（ステップの指定が優先）")
+    parser.add_argument('--timeout', type=float, default=DEFAULT_STEP_TIMEOUT,
+                        help="ステップに指定がない場合のタイムアウト（秒）")
+    parser.add_argument('--wait-time', type=float, default=1.0, help="クリック前の待機時間（秒）")
+    parser.add_argument('--fast', action='store_true',
+                        help="待機せずにクリックし、画面の変化でクリックが効いたことを確認する")
+    parser.add_argument('--verify-timeout', type=float, default=2.0,
+                        help="--fast でクリックの効果を待つ時間（秒）")
+    parser.add_argument('--images-dir', default="images", help="画像フォルダ")
+    parser.add_argument('--engine', choices=list(ENGINES), default='opencv', help="マッチングエンジン")
+    parser.add_argument('--capture', choices=['auto'] + list(BACKENDS), default='auto',
+                        help="キャプチャバックエンド")
+    parser.add_argument('--replay', help="--capture replay で再生するフレームのフォルダ")
+    parser.add_argument('--stop-on-failure', action='store_true',
+                        help="クリックに失敗したらそのワークフローの残りのステップを実行しない")
+    parser.add_argument('--no-prefetch', action='store_true', help="次のステップの先読みをしない")
+    parser.add_argument('--quiet', action='store_true', help="ステップごとのログを出さない")
+    parser.add_argument('--metrics-jsonl', help="フェーズごとの所要時間とテンプレートごとの回数を追記するJSON Linesファイル")
+    parser.add_argument('--metrics-prom', help="集計した計測値を書き出すPrometheusテキスト形式のファイル")
+    parser.add_argument('--trace', help="ステップ・ポーリング・照合・クリックの区間を書き出すChromeトレース形式のJSONファイル")
+    args = parser.parse_args(argv)
+    if args.capture == 'replay' and not args.replay:
+        parser.error("--capture replay には --replay でフレームのフォルダを指定してください")
+    if args.displays:
+        if args.parallel > 1:
+            parser.error("--displays と --parallel は同時に指定できません")
+        if args.trace or args.metrics_prom:
+            # ワーカーは別プロセスなので、集計が必要な出力はまとめられない
+            parser.error("--displays では --trace と --metrics-prom は使えません（--metrics-jsonl は使えます）")
+    elif args.launch:
+        parser.error("--launch は --displays と一緒に指定してください")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    paths = find_workflows(args.paths)
+    if not paths:
+        print(f"実行するワークフローがありません: {', '.join(args.paths)}")
+        return EXIT_ERROR
+    
+    started = datetime.now().isoformat()
+    start = time.perf_counter()
+    
+    # 仮想ディスプレイで実行する場合、計測はワーカーごとに --metrics-jsonl へ追記する
+    metrics = Metrics(args.metrics_jsonl) if (args.metrics_jsonl or args.metrics_prom) and not args.displays else None
+    tracer = Tracer("run_workflows") if args.trace else None
+    
+    with contextlib.ExitStack() as stack:
+        if metrics:
+            stack.enter_context(metrics)
+        if args.quiet:
+            devnull = stack.enter_context(open(os.devnull, 'w'))
+            stack.enter_context(contextlib.redirect_stdout(devnull))
+        if args.displays:
+            try:
+                with DisplayPool(args.displays, args.xvfb_screen) as pool:
+                    results = pool.run(paths, args)
+            except RuntimeError as e:
+                print(f"エラー: {e}", file=sys.stderr)
+                return EXIT_ERROR
+        elif args.parallel > 1:
+            with ThreadPoolExecutor(args.parallel) as pool:
+                results = list(pool.map(lambda path: run_one(path, args, metrics, tracer), paths))
+        else:
+            results = [run_one(path, args, metrics, tracer) for path in paths]
+    
+    summary = summarize(results, time.perf_counter() - start)
+    for result in results:
+        print_result(result)
+    print(f"成功 {summary['succeeded']} / 失敗 {summary['failed']} / エラー {summary['errors']} "
+          f"（{summary['elapsed']:.2f}秒）")
+    
+    if tracer:
+        tracer.write(args.trace)
+        print(f"トレースを保存しました: {args.trace}")
+    
+    if args.metrics_prom:
+        metrics.write_prometheus(args.metrics_prom)
+        print(f"計測値を保存しました: {args.metrics_prom}")
+    
+    if args.report:
+        report = {
+            'started': started,
+            'host': platform.node(),
+            'options': {key: value for key, value in vars(args).items() if key != 'paths'},
+            'summary': summary,
+            'metrics': metrics.snapshot() if metrics else None,
+            'workflows': results,
+        }
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"レポートを保存しました: {args.report}")
+    
+    return exit_code(summary)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+"""
+テンプレート画像の目録（SQLite）
+images/ の画像ごとにサイズ・更新時刻・内容のハッシュ・縮小画像（サムネイル）と、
+その画像を使うワークフローを images/.catalog.sqlite に記録します
+撮影した画像は内容のハッシュを名前にして保存し（store）、同じ画像は1つのファイルを共有します
+
+refresh() はフォルダを1回だけ走査し、追加・更新・削除された画像だけを読み直すので、
+数万枚の画像があっても一覧と絞り込みは目録への問い合わせだけで済みます。
+
+使用例:
+    catalog = TemplateCatalog("images", workflows_dir="workflows")
+    catalog.refresh()
+    for entry in catalog.list("button"):
+        print(entry['name'], entry['width'], entry['height'], entry['workflows'])
+    
+    similar = catalog.find_similar(cropped)      # ほぼ同じ画像があれば再利用できる
+    name = similar[0][0] if similar else catalog.store(cropped, prefix="workflow")
+"""
+
+import hashlib
+import io
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+from atomic_file import atomic_write
+from lazy_modules import lazy_import
+
+Image = lazy_import('PIL.Image')
+ImageChops = lazy_import('PIL.ImageChops')
+
+
+CATALOG_FILE_NAME = ".catalog.sqlite"
+# 目録の形式のバージョン（変わったら目録を作り直す）
+CATALOG_VERSION = 2
+IMAGE_SUFFIXES = ('.png', '.jpg', '.jpeg')
+# サムネイルの最大の大きさ（ピクセル）
+THUMBNAIL_SIZE = (96, 96)
+# ほぼ同じ画像とみなす条件: 知覚ハッシュのハミング距離、大きさの差（ピクセル）、画素値の平均絶対差
+SIMILAR_MAX_DISTANCE = 4
+SIMILAR_MAX_SIZE_DIFF = 4
+SIMILAR_MAX_MEAN_DIFF = 8.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS templates (
+    name TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    sha256 TEXT NOT NULL,
+    phash TEXT,
+    thumbnail BLOB
+);
+CREATE TABLE IF NOT EXISTS workflows (
+    name TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS template_usage (
+    template TEXT NOT NULL,
+    workflow TEXT NOT NULL,
+    PRIMARY KEY (template, workflow)
+);
+CREATE INDEX IF NOT EXISTS template_usage_workflow ON template_usage (workflow);
+CREATE INDEX IF NOT EXISTS templates_sha256 ON templates (sha256);
+CREATE INDEX IF NOT EXISTS templates_width ON templates (width);
+CREATE INDEX IF NOT EXISTS templates_name_nocase ON templates (name COLLATE NOCASE, name);
+"""
+_TABLES = ('templates', 'workflows', 'template_usage')
+
+
+def file_sha256(path):
+    """ファイルの内容の SHA-256（16進数）"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def perceptual_hash(image):
+    """
+    差分ハッシュ（dHash）: 9x8に縮小したグレースケール画像で、隣り合う画素の明暗を並べた64ビット
+    
+    撮り直しで数ピクセルずれたり、圧縮で画素値が少し変わったりしても値がほとんど変わりません。
+    
+    Returns:
+        str: 16桁の16進数
+    """
+    pixels = list(image.convert('L').resize((9, 8), Image.BOX).getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = value << 1 | (pixels[row * 9 + col + 1] > pixels[row * 9 + col])
+    return f"{value:016x}"
+
+
+def hash_distance(a, b):
+    """知覚ハッシュのハミング距離（異なるビットの数）"""
+    return bin(int(a, 16) ^ int(b, 16)).count('1')
+
+
+def mean_difference(a, b):
+    """2つの画像の画素値の平均絶対差（b を a の大きさに合わせて比べる）"""
+    b = b.convert(a.mode)
+    if b.size != a.size:
+        b = b.resize(a.size, Image.BILINEAR)
+    histogram = ImageChops.difference(a, b).histogram()
+    # チャンネルごとに256段階のヒストグラムが並ぶ
+    total = sum(count * (i % 256) for i, count in enumerate(histogram))
+    return total / (a.width * a.height * len(a.getbands()))
+
+
+def _encode_png(image):
+    """画像をPNGにしたバイト列と、その SHA-256"""
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    data = buffer.getvalue()
+    return data, hashlib.sha256(data).hexdigest()
+
+
+def _scan(directory, suffixes):
+    """フォルダ直下のファイルを1回の走査で集める {ファイル名: (サイズ, 更新時刻ns)}"""
+    files = {}
+    try:
+        entries = os.scandir(directory)
+    except FileNotFoundError:
+        return files
+    with entries:
+        for entry in entries:
+            if entry.name.lower().endswith(suffixes) and entry.is_file():
+                stat = entry.stat()
+                files[entry.name] = (stat.st_size, stat.st_mtime_ns)
+    return files
+
+
+class TemplateCatalog:
+    """
+    テンプレート画像の目録
+    
+    GUIのスレッドと一覧を更新するスレッドから同時に使えるよう、接続はロックで守ります。
+    目録が壊れていたら作り直すだけで、画像ファイルには触れません。
+    """
+    
+    def __init__(self, images_dir="images", workflows_dir=None, db_path=None):
+        """
+        Args:
+            images_dir (str | Path): テンプレート画像のフォルダ
+            workflows_dir (str | Path): ワークフローJSONのフォルダ（省略時は使用元を記録しない）
+            db_path (str | Path): 目録ファイル（省略時は images/.catalog.sqlite）
+        """
+        self.images_dir = Path(images_dir)
+        self.workflows_dir = Path(workflows_dir) if workflows_dir else None
+        self.db_path = Path(db_path) if db_path else self.images_dir / CATALOG_FILE_NAME
+        self._lock = threading.Lock()
+        self._conn = self._connect()
+    
+    def _connect(self):
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            conn = self._open()
+        except sqlite3.DatabaseError:
+            # 壊れた目録は捨てて作り直す（内容はすべて画像から再計算できる）
+            self.db_path.unlink()
+            conn = self._open()
+        conn.row_factory = sqlite3.Row
+        return conn
+    
+    def _open(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        (version,) = conn.execute("PRAGMA user_version").fetchone()
+        if version != CATALOG_VERSION:
+            # 古い形式の目録は捨てて、次の refresh() で画像から作り直す
+            for table in _TABLES:
+                conn.execute(f"DROP TABLE IF EXISTS {table}")
+            conn.execute(f"PRAGMA user_version = {CATALOG_VERSION}")
+        conn.executescript(_SCHEMA)
+        return conn
+    
+    def refresh(self):
+        """
+        フォルダの変更を目録に反映
+        
+        サイズか更新時刻が変わった画像だけハッシュを計算し直し、サムネイルを破棄します。
+        
+        Returns:
+            dict: added, updated, removed（画像の数）と workflows（読み直したワークフローの数）
+        """
+        files = _scan(self.images_dir, IMAGE_SUFFIXES)
+        with self._lock:
+            known = {row['name']: (row['size'], row['mtime_ns'])
+                     for row in self._conn.execute("SELECT name, size, mtime_ns FROM templates")}
+        
+        changed = [name for name, key in files.items() if known.get(name) != key]
+        removed = [name for name in known if name not in files]
+        
+        # ハッシュと画像の大きさの計算はロックの外で行う（その間も一覧は引ける）
+        rows = []
+        for name in changed:
+            path = self.images_dir / name
+            try:
+                sha256 = file_sha256(path)
+                with Image.open(path) as image:
+                    width, height = image.size
+                    phash = perceptual_hash(image)
+            except (OSError, SyntaxError):
+                # 書き込み途中や壊れた画像は次の更新で読み直す
+                continue
+            size, mtime_ns = files[name]
+            rows.append((name, size, mtime_ns, width, height, sha256, phash))
+        
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO templates (name, size, mtime_ns, width, height, sha256, phash, thumbnail) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, NULL)", rows)
+            self._conn.executemany("DELETE FROM templates WHERE name = ?", [(name,) for name in removed])
+        
+        added = sum(1 for row in rows if row[0] not in known)
+        return {
+            'added': added,
+            'updated': len(rows) - added,
+            'removed': len(removed),
+            'workflows': self._refresh_workflows(),
+        }
+    
+    def _refresh_workflows(self):
+        """更新されたワークフローJSONだけ読み直し、使う画像を記録"""
+        if self.workflows_dir is None:
+            return 0
+        from workflow_engine import load_plan
+        
+        files = _scan(self.workflows_dir, ('.json',))
+        with self._lock:
+            known = {row['name']: (row['size'], row['mtime_ns'])
+                     for row in self._conn.execute("SELECT name, size, mtime_ns FROM workflows")}
+        
+        usage = {}
+        for name, key in files.items():
+            if known.get(name) == key:
+                continue
+            try:
+                images = load_plan(self.workflows_dir / name).images
+            except (OSError, ValueError, KeyError, TypeError, AttributeError):
+                # ワークフローではないJSONや壊れたファイルは使用元なしとして扱う
+                images = []
+            usage[name] = (key, images)
+        removed = [name for name in known if name not in files]
+        
+        with self._lock, self._conn:
+            for name in list(usage) + removed:
+                self._conn.execute("DELETE FROM template_usage WHERE workflow = ?", (name,))
+            self._conn.executemany("DELETE FROM workflows WHERE name = ?", [(name,) for name in removed])
+            for name, ((size, mtime_ns), images) in usage.items():
+                self._conn.execute("INSERT OR REPLACE INTO workflows (name, size, mtime_ns) VALUES (?, ?, ?)",
+                                   (name, size, mtime_ns))
+                self._conn.executemany("INSERT OR IGNORE INTO template_usage (template, workflow) VALUES (?, ?)",
+                                       [(image, name) for image in images])
+        return len(usage) + len(removed)
+    
+    def list(self, prefix=None, limit=None):
+        """
+        目録の画像を名前順（大文字小文字を区別しない）に取得
+        
+        絞り込みは前方一致なので、名前の索引（templates_name_nocase）の範囲だけを読みます。
+        
+        Args:
+            prefix (str): 名前の先頭の文字列で絞り込む（ASCIIの大文字小文字は区別しない）
+            limit (int): 最大件数
+        
+        Returns:
+            list[dict]: name, size, mtime_ns, width, height, sha256, workflows（使用するワークフロー名のリスト）
+        """
+        query = ("SELECT t.name, t.size, t.mtime_ns, t.width, t.height, t.sha256, "
+                 "group_concat(u.workflow, char(10)) AS workflows "
+                 "FROM templates t LEFT JOIN template_usage u ON u.template = t.name")
+        params = []
+        if prefix:
+            # 先頭が固定の LIKE は、NOCASE の索引の範囲検索になる（並び順も同じ索引で済む）
+            query += " WHERE t.name LIKE ? ESCAPE '\\'"
+            escaped = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            params.append(f"{escaped}%")
+        query += (" GROUP BY t.name COLLATE NOCASE, t.name"
+                  " ORDER BY t.name COLLATE NOCASE, t.name")
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(int(limit))
+        
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        entries = []
+        for row in rows:
+            entry = dict(row)
+            entry['workflows'] = sorted(entry['workflows'].split("\n")) if entry['workflows'] else []
+            entries.append(entry)
+        return entries
+    
+    def get(self, name):
+        """1つの画像の情報（目録に無ければNone）"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT name, size, mtime_ns, width, height, sha256 FROM templates WHERE name = ?",
+                (name,)).fetchone()
+            if row is None:
+                return None
+            entry = dict(row)
+            entry['workflows'] = [r[0] for r in self._conn.execute(
+                "SELECT workflow FROM template_usage WHERE template = ? ORDER BY workflow", (name,))]
+        return entry
+    
+    def thumbnail(self, name):
+        """
+        サムネイル（PNGのバイト列）を取得
+        
+        初めて要求されたときに作って目録に保存し、次回からは画像をデコードしません。
+        
+        Returns:
+            bytes: PNG。目録に無い・読めない画像ならNone
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT mtime_ns, thumbnail FROM templates WHERE name = ?",
+                                     (name,)).fetchone()
+        if row is None:
+            return None
+        if row['thumbnail'] is not None:
+            return row['thumbnail']
+        
+        try:
+            with Image.open(self.images_dir / name) as image:
+                image.thumbnail(THUMBNAIL_SIZE)
+                buffer = io.BytesIO()
+                image.save(buffer, format='PNG')
+        except (OSError, SyntaxError):
+            return None
+        data = buffer.getvalue()
+        
+        with self._lock, self._conn:
+            # 作っている間に画像が更新されていたら保存しない
+            self._conn.execute("UPDATE templates SET thumbnail = ? WHERE name = ? AND mtime_ns = ?",
+                               (data, name, row['mtime_ns']))
+        return data
+    
+    def find_by_hash(self, sha256):
+        """内容が同じ画像の名前のリスト"""
+        with self._lock:
+            return [r[0] for r in self._conn.execute(
+                "SELECT name FROM templates WHERE sha256 = ? ORDER BY name", (sha256,))]
+    
+    def _existing(self, sha256):
+        """内容のハッシュが一致し、ファイルが残っている画像の名前"""
+        for name in self.find_by_hash(sha256):
+            if (self.images_dir / name).exists():
+                return name
+        return None
+    
+    def find_identical(self, image):
+        """PNGにしたときに内容がまったく同じ登録済み画像の名前（無ければNone）"""
+        return self._existing(_encode_png(image)[1])
+    
+    def find_similar(self, image, max_distance=SIMILAR_MAX_DISTANCE):
+        """
+        ほぼ同じ内容の登録済み画像を探す
+        
+        大きさが近く知覚ハッシュの距離が小さい画像に絞ってから、画素値を比べて確かめます。
+        
+        Args:
+            image (PIL.Image): 新しく撮影した画像
+            max_distance (int): 知覚ハッシュのハミング距離の上限
+        
+        Returns:
+            list[tuple]: (画像ファイル名, 距離) のリスト（距離の小さい順）
+        """
+        phash = perceptual_hash(image)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT name, phash FROM templates WHERE width BETWEEN ? AND ? AND height BETWEEN ? AND ?",
+                (image.width - SIMILAR_MAX_SIZE_DIFF, image.width + SIMILAR_MAX_SIZE_DIFF,
+                 image.height - SIMILAR_MAX_SIZE_DIFF, image.height + SIMILAR_MAX_SIZE_DIFF)).fetchall()
+        
+        candidates = sorted((hash_distance(phash, row['phash']), row['name'])
+                            for row in rows if row['phash'])
+        similar = []
+        for distance, name in candidates:
+            if distance > max_distance:
+                break
+            # 単色に近い画像はハッシュが似やすいので、画素値でも確かめる
+            try:
+                with Image.open(self.images_dir / name) as existing:
+                    if mean_difference(image, existing) > SIMILAR_MAX_MEAN_DIFF:
+                        continue
+            except (OSError, SyntaxError):
+                continue
+            similar.append((name, distance))
+        return similar
+    
+    def store(self, image, prefix="capture"):
+        """
+        画像を内容のハッシュを名前にして保存し、目録に登録
+        
+        同じ内容の画像が既にあれば保存せずにその名前を返すので、
+        同じボタンを何度撮影しても画像ファイルは1つだけになります。
+        
+        Args:
+            image (PIL.Image): 保存する画像
+            prefix (str): ファイル名の接頭辞（<prefix>_<ハッシュ12桁>.png）
+        
+        Returns:
+            str: 画像ファイル名（imagesフォルダ内）
+        """
+        data, sha256 = _encode_png(image)
+        name = self._existing(sha256)
+        if name is not None:
+            return name
+        
+        name = f"{prefix}_{sha256[:12]}.png"
+        path = self.images_dir / name
+        self.images_dir.mkdir(parents=True, exist_ok=True)
+        atomic_write(path, data)
+        
+        stat = path.stat()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO templates (name, size, mtime_ns, width, height, sha256, phash, thumbnail) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, NULL)",
+                (name, stat.st_size, stat.st_mtime_ns, image.width, image.height, sha256, perceptual_hash(image)))
+        return name
+    
+    def forget(self, name):
+        """画像を目録から外す（画像ファイルを削除したとき）"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM templates WHERE name = ?", (name,))
+    
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT count(*) FROM templates").fetchone()[0]
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+コンパイル済みテンプレートの保存先
+テンプレート画像ごとに、グレースケール画像・縮小画像・平均とノルムなどの前処理結果を
+画像と同じフォルダの .compiled/ に保存し、次回以降はデコードと前処理を省略します
+
+ファイル形式（1テンプレート1ファイル、<画像ファイル名>.tpl）:
+    マジック(8バイト) + ヘッダ長(4バイト, little endian) + ヘッダ(JSON) + 配列データ
+ヘッダには元画像の更新時刻とサイズを記録し、画像が変わっていれば読み込まずに作り直します。
+（npzはzipの展開処理があり、小さなテンプレートではPNGをデコードし直すより遅いため使わない）
+"""
+
+import json
+import struct
+import threading
+from pathlib import Path
+
+from atomic_file import atomic_open
+from lazy_modules import lazy_import
+
+np = lazy_import('numpy')
+
+
+COMPILED_DIR_NAME = ".compiled"
+COMPILED_SUFFIX = ".tpl"
+COMPILED_MAGIC = b"ICTPL\x00\x01\n"
+
+
+class CompiledTemplateStore:
+    """
+    テンプレートの前処理結果を画像ごとのサイドカーファイルに保存・読み込み
+    
+    書き込みできないフォルダでは保存を諦め、毎回前処理するだけで動作は変わりません。
+    """
+    
+    def __init__(self, dir_name=COMPILED_DIR_NAME):
+        """
+        Args:
+            dir_name (str): 画像と同じフォルダ内に作るサイドカーの保存先フォルダ名
+        """
+        self.dir_name = dir_name
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.write_errors = 0
+        self._lock = threading.Lock()
+    
+    def sidecar_path(self, image_path):
+        """画像ファイルに対応するサイドカーファイルのパス"""
+        image_path = Path(image_path)
+        return image_path.parent / self.dir_name / (image_path.name + COMPILED_SUFFIX)
+    
+    @staticmethod
+    def source_key(image_path):
+        """元画像の同一性を判定する値 [更新時刻(ns), サイズ]"""
+        stat = Path(image_path).stat()
+        return [stat.st_mtime_ns, stat.st_size]
+    
+    def load(self, image_path):
+        """
+        保存済みの前処理結果を読み込み
+        
+        Returns:
+            tuple: (配列の辞書, メタ情報の辞書)。無い・古い・壊れている場合はNone
+        """
+        path = self.sidecar_path(image_path)
+        try:
+            with open(path, 'rb') as f:
+                data = bytearray(f.read())  # 配列を書き込み可能にするためbytearrayで保持
+            if not data.startswith(COMPILED_MAGIC):
+                raise ValueError("マジックが一致しません")
+            offset = len(COMPILED_MAGIC)
+            (header_size,) = struct.unpack_from('<I', data, offset)
+            offset += 4
+            header = json.loads(data[offset:offset + header_size])
+            offset += header_size
+            
+            if header['source'] != self.source_key(image_path):
+                raise ValueError("元画像が更新されています")
+            
+            arrays = {}
+            for name, dtype, shape, start, size in header['arrays']:
+                arrays[name] = np.frombuffer(data, dtype=dtype, count=size // np.dtype(dtype).itemsize,
+                                             offset=offset + start).reshape(shape)
+        except (OSError, ValueError, KeyError, struct.error):
+            with self._lock:
+                self.misses += 1
+            return None
+        
+        with self._lock:
+            self.hits += 1
+        return arrays, header.get('meta', {})
+    
+    def save(self, image_path, arrays, meta=None, source=None):
+        """
+        前処理結果を保存（一時ファイルに書いてから置き換えるので、読み込み中の他プロセスを壊さない）
+        
+        Args:
+            image_path (str | Path): 元画像ファイルのパス
+            arrays (dict): 名前 -> numpy.ndarray
+            meta (dict): JSONにできる追加情報（平均・ノルムなど）
+            source (list): デコード前に取得した source_key（省略時は保存時点の値）
+        """
+        path = self.sidecar_path(image_path)
+        entries = []
+        chunks = []
+        position = 0
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            entries.append([name, array.dtype.str, list(array.shape), position, array.nbytes])
+            chunks.append(array.tobytes())
+            position += array.nbytes
+        
+        try:
+            header = json.dumps({
+                'source': source or self.source_key(image_path),
+                'arrays': entries,
+                'meta': meta or {},
+            }).encode('utf-8')
+            
+            path.parent.mkdir(exist_ok=True)
+            with atomic_open(path, 'wb') as f:
+                f.write(COMPILED_MAGIC)
+                f.write(struct.pack('<I', len(header)))
+                f.write(header)
+                for chunk in chunks:
+                    f.write(chunk)
+        except OSError:
+            with self._lock:
+                self.write_errors += 1
+            return False
+        
+        with self._lock:
+            self.writes += 1
+        return True
+    
+    def stats(self):
+        """
+        統計情報を取得
+        
+        Returns:
+            dict: hits, misses, writes, write_errors
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'writes': self.writes,
+                'write_errors': self.write_errors,
+            }
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+実行のトレース（Chrome Trace Event 形式）
+ワークフローのステップ、ポーリング、キャプチャ、照合、待機、クリックを区間（span）として記録し、
+chrome://tracing や Perfetto（https://ui.perfetto.dev）で開けるJSONに書き出します
+
+使用例:
+    tracer = Tracer()
+    clicker = ImageClicker(tracer=tracer)
+    WorkflowEngine(clicker).run(load_plan("workflows/google_search.json"))
+    tracer.write("trace.json")
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Tracer:
+    """
+    区間をメモリに記録し、Chrome Trace Event 形式で書き出す
+    
+    複数のスレッドから同時に記録でき、スレッドごとに別の行として表示されます。
+    """
+    
+    def __init__(self, process_name="image_clicker"):
+        """
+        Args:
+            process_name (str): トレースビューアに表示するプロセス名
+        """
+        self.process_name = process_name
+        self.pid = os.getpid()
+        self._origin = time.perf_counter()
+        self._events = []
+        self._threads = {}
+        self._lock = threading.Lock()
+    
+    def _timestamp(self, seconds):
+        """perf_counter の値をトレース開始からのマイクロ秒に変換"""
+        return (seconds - self._origin) * 1e6
+    
+    def _thread_id(self):
+        thread = threading.current_thread()
+        tid = threading.get_native_id()
+        if tid not in self._threads:
+            with self._lock:
+                self._threads[tid] = thread.name
+        return tid
+    
+    def add_span(self, name, start, end, category="clicker", args=None):
+        """開始・終了時刻（time.perf_counter() の値）を指定して区間を記録"""
+        event = {
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': self._timestamp(start),
+            'dur': (end - start) * 1e6,
+            'pid': self.pid,
+            'tid': self._thread_id(),
+        }
+        if args:
+            # 値のない引数（テンプレートを指定しない照合など）は表示しない
+            event['args'] = {key: value for key, value in args.items() if value is not None}
+        with self._lock:
+            self._events.append(event)
+    
+    @contextmanager
+    def span(self, name, category="clicker", **args):
+        """
+        with ブロックを区間として記録
+        
+        yield される辞書に値を追加すると、区間の引数（トレースビューアの詳細欄）に表示されます。
+        """
+        start = time.perf_counter()
+        try:
+            yield args
+        finally:
+            self.add_span(name, start, time.perf_counter(), category, args)
+    
+    def instant(self, name, category="clicker", **args):
+        """時刻だけのイベント（画像が見つかった瞬間など）を記録"""
+        event = {
+            'name': name,
+            'cat': category,
+            'ph': 'i',
+            's': 't',
+            'ts': self._timestamp(time.perf_counter()),
+            'pid': self.pid,
+            'tid': self._thread_id(),
+        }
+        if args:
+            event['args'] = {key: value for key, value in args.items() if value is not None}
+        with self._lock:
+            self._events.append(event)
+    
+    def events(self):
+        """記録したイベントに、プロセス名・スレッド名のメタデータを付けたリスト"""
+        with self._lock:
+            events = list(self._events)
+            threads = dict(self._threads)
+        metadata = [{'name': 'process_name', 'ph': 'M', 'pid': self.pid, 'tid': 0,
+                     'args': {'name': self.process_name}}]
+        metadata += [{'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': tid,
+                      'args': {'name': name}} for tid, name in threads.items()]
+        return metadata + events
+    
+    def write(self, path):
+        """Chrome Trace Event 形式（JSON Object Format）で書き出す"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': self.events(), 'displayTimeUnit': 'ms'}, f, ensure_ascii=False)
+
+
+class NullTracer:
+    """何も記録しない Tracer（トレースしない場合の既定値）"""
+    
+    def add_span(self, name, start, end, category="clicker", args=None):
+        pass
+    
+    @contextmanager
+    def span(self, name, category="clicker", **args):
+        yield args
+    
+    def instant(self, name, category="clicker", **args):
+        pass
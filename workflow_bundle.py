@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+ワークフローのバンドル（1ファイルにまとめたワークフロー）
+ステップの一覧と、使う画像のデコード・前処理済みの配列を1つの .icwf ファイルに書き出します
+読み込みはファイルをメモリマップするだけで、画像のデコードもファイルを開き直すこともしません
+
+ファイル形式:
+    マジック(8バイト) + ヘッダ長(4バイト, little endian) + ヘッダ(JSON) + 配列データ
+    配列データは BUNDLE_ALIGN バイト境界から始まり、各配列も同じ境界に揃えて並べます。
+    ヘッダには ワークフロー本体（save_workflow 形式）と、画像ごとの配列の位置・型・形と統計量を記録します。
+
+使い方:
+    python workflow_bundle.py workflows/login.json                 # -> workflows/login.icwf
+    python workflow_bundle.py workflows/login.json -o dist/login.icwf
+    python workflow_bundle.py --info dist/login.icwf
+    python run_workflows.py dist/login.icwf                         # images フォルダは不要
+"""
+
+import argparse
+import json
+import mmap
+import struct
+import sys
+from pathlib import Path
+
+from atomic_file import atomic_open
+from image_clicker import Template, load_template
+from lazy_modules import lazy_import
+from workflow_engine import DEFAULT_STEP_TIMEOUT, compile_workflow
+
+np = lazy_import('numpy')
+
+
+BUNDLE_SUFFIX = ".icwf"
+BUNDLE_MAGIC = b"ICWFB\x00\x01\n"
+# 配列の開始位置の境界（バイト）。SIMD の読み込みとページの境界に合わせやすい値
+BUNDLE_ALIGN = 64
+
+
+def _aligned(position):
+    return -(-position // BUNDLE_ALIGN) * BUNDLE_ALIGN
+
+
+def write_bundle(path, data, images_dir="images", template_cache=None):
+    """
+    ワークフローと使う画像を1ファイルに書き出す（一時ファイルに書いてから置き換える）
+    
+    Args:
+        path (str | Path): 書き出す .icwf ファイル
+        data (dict | list): save_workflow 形式の辞書、または旧形式のステップのリスト
+        images_dir (str | Path): 画像フォルダ
+        template_cache (TemplateCache): デコード済みの画像を使い回す場合のキャッシュ
+    
+    Returns:
+        dict: images（画像の数）と bytes（ファイルサイズ）
+    
+    Raises:
+        FileNotFoundError: ワークフローが使う画像が見つからない場合
+    """
+    path = Path(path)
+    images_dir = Path(images_dir)
+    if not isinstance(data, dict):
+        data = {'name': path.stem, 'workflow': data}
+    plan = compile_workflow(data)
+    
+    missing = [image for image in plan.images if not (images_dir / image).exists()]
+    if missing:
+        raise FileNotFoundError(f"画像ファイルが見つかりません: {', '.join(missing)}")
+    
+    templates = {}
+    chunks = []
+    position = 0
+    for image in plan.images:
+        image_path = images_dir / image
+        template = template_cache.get(image_path) if template_cache is not None else load_template(image_path)
+        arrays, meta = template.compile()
+        entries = []
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            position = _aligned(position)
+            entries.append([name, array.dtype.str, list(array.shape), position, array.nbytes])
+            chunks.append((position, array))
+            position += array.nbytes
+        templates[image] = {'arrays': entries, 'meta': meta}
+    
+    header = json.dumps({
+        'name': data.get('name') or path.stem,
+        'workflow': data,
+        'templates': templates,
+    }, ensure_ascii=False).encode('utf-8')
+    data_start = _aligned(len(BUNDLE_MAGIC) + 4 + len(header))
+    
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with atomic_open(path, 'wb') as f:
+        f.write(BUNDLE_MAGIC)
+        f.write(struct.pack('<I', len(header)))
+        f.write(header)
+        for offset, array in chunks:
+            f.seek(data_start + offset)
+            f.write(memoryview(array).cast('B'))
+        f.truncate(data_start + position)
+    
+    return {'images': len(templates), 'bytes': data_start + position}
+
+
+class WorkflowBundle:
+    """
+    メモリマップした .icwf ファイル
+    
+    画像の配列はファイルの内容をそのまま参照する読み取り専用の配列で、
+    実際に読まれたページだけがメモリに載ります。複数のプロセスで同じバンドルを開くとページは共有されます。
+    使い終わったら close()（または with ブロック）でメモリマップを解放してください。
+    """
+    
+    def __init__(self, path):
+        """
+        Args:
+            path (str | Path): .icwf ファイル
+        
+        Raises:
+            ValueError: バンドルの形式ではない、または壊れている場合
+        """
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        
+        try:
+            if self._map[:len(BUNDLE_MAGIC)] != BUNDLE_MAGIC:
+                raise ValueError("マジックが一致しません")
+            offset = len(BUNDLE_MAGIC)
+            (header_size,) = struct.unpack_from('<I', self._map, offset)
+            offset += 4
+            header = json.loads(self._map[offset:offset + header_size])
+            data_start = _aligned(offset + header_size)
+            
+            self.name = header['name']
+            self.data = header['workflow']
+            self.templates = {}
+            for image, entry in header['templates'].items():
+                arrays = {}
+                for name, dtype, shape, start, size in entry['arrays']:
+                    if data_start + start + size > len(self._map):
+                        raise ValueError(f"{image} の配列がファイルの範囲外です")
+                    arrays[name] = np.frombuffer(self._map, dtype=dtype, count=size // np.dtype(dtype).itemsize,
+                                                 offset=data_start + start).reshape(shape)
+                self.templates[image] = Template.from_compiled(self.path / image, arrays, entry['meta'])
+        except (ValueError, KeyError, TypeError, struct.error) as e:
+            self._map.close()
+            raise ValueError(f"ワークフローのバンドルを読み込めません: {self.path}: {e}") from e
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
+    def close(self):
+        """
+        画像の配列を手放してメモリマップを解放
+        
+        先に ImageClicker.bundled_templates などから画像を外しておいてください。
+        配列がまだどこかで使われている場合は、その最後の参照が無くなった時点で解放されます。
+        """
+        self.templates = {}
+        try:
+            self._map.close()
+        except BufferError:
+            pass
+    
+    @property
+    def steps(self):
+        """記録したステップのリスト（save_workflow 形式の workflow）"""
+        return self.data['workflow'] if isinstance(self.data, dict) else self.data
+    
+    def plan(self, default_timeout=DEFAULT_STEP_TIMEOUT):
+        """実行計画（WorkflowPlan）に変換"""
+        return compile_workflow(self.data, name=self.name, default_timeout=default_timeout, source=self.path)
+    
+    @property
+    def nbytes(self):
+        """ファイルサイズ（バイト）"""
+        return len(self._map)
+
+
+def is_bundle(path):
+    """バンドルのファイル名かどうか"""
+    return Path(path).suffix == BUNDLE_SUFFIX
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ワークフローと画像を1ファイルにまとめる")
+    parser.add_argument('workflow', help="ワークフローJSON（--info の場合はバンドル）")
+    parser.add_argument('-o', '--output', help="書き出すバンドル（省略時はワークフローと同じ場所の .icwf）")
+    parser.add_argument('--images-dir', default="images", help="画像フォルダ")
+    parser.add_argument('--info', action='store_true', help="バンドルの内容を表示")
+    args = parser.parse_args(argv)
+    
+    if args.info:
+        bundle = WorkflowBundle(args.workflow)
+        print(f"{bundle.name}: {len(bundle.steps)}ステップ / 画像 {len(bundle.templates)}個 / {bundle.nbytes:,}バイト")
+        for image, template in bundle.templates.items():
+            print(f"  {image} ({template.width}x{template.height})")
+        return 0
+    
+    source = Path(args.workflow)
+    with open(source, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        data = {'name': source.stem, 'workflow': data}
+    output = Path(args.output) if args.output else source.with_suffix(BUNDLE_SUFFIX)
+    try:
+        written = write_bundle(output, data, args.images_dir)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"エラー: {e}")
+        return 1
+    print(f"バンドルを保存しました: {output}（画像 {written['images']}個 / {written['bytes']:,}バイト）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+ワークフロー実行エンジン（GUI不要）
+記録したワークフローJSONを実行計画に変換し、使う画像をすべて事前に読み込んでから実行します
+実行中のステップの裏で次のステップの画像を探し始め、ステップごとの所要時間を記録します
+"""
+
+import json
+import threading
+import time
+from pathlib import Path
+
+from image_clicker import ChangeTracker, ImageClicker
+
+
+# ステップにタイムアウトの指定がない場合の既定値（秒）
+DEFAULT_STEP_TIMEOUT = 10
+
+
+class PlanStep:
+    """実行計画の1ステップ（クリックまたは待機）"""
+    
+    def __init__(self, step, kind, image=None, confidence=None, hint=None,
+                 timeout=DEFAULT_STEP_TIMEOUT, duration=0.0):
+        """
+        Args:
+            step (int): 記録時のステップ番号
+            kind (str): "click" または "wait"
+            image (str): クリックする画像ファイル名（imagesフォルダ内）
+            confidence (float): 信頼度（Noneなら ImageClicker の設定を使う）
+            hint (tuple): 撮影時の位置 (x1, y1, x2, y2)
+            timeout (float): 画像が見つかるまで待つ時間（秒）
+            duration (float): 待機ステップの待機時間（秒）
+        """
+        self.step = step
+        self.kind = kind
+        self.image = image
+        self.confidence = confidence
+        self.hint = hint
+        self.timeout = timeout
+        self.duration = duration
+    
+    def __repr__(self):
+        if self.kind == 'click':
+            return f"PlanStep({self.step}, click {self.image!r})"
+        return f"PlanStep({self.step}, wait {self.duration}s)"
+
+
+class WorkflowPlan:
+    """コンパイル済みのワークフロー"""
+    
+    def __init__(self, name, steps, source=None):
+        self.name = name
+        self.steps = steps
+        self.source = source
+    
+    @property
+    def images(self):
+        """計画で使う画像ファイル名（重複なし、出現順）"""
+        return list(dict.fromkeys(s.image for s in self.steps if s.kind == 'click'))
+    
+    def __len__(self):
+        return len(self.steps)
+
+
+def compile_workflow(data, name=None, default_timeout=DEFAULT_STEP_TIMEOUT, source=None):
+    """
+    ワークフローのデータを実行計画に変換
+    
+    screenshotステップは実行せず、撮影時の座標を同じ画像をクリックするステップの
+    探索ヒントとして使います。
+    
+    Args:
+        data (dict | list): save_workflow形式の辞書、または旧形式のステップのリスト
+        name (str): ワークフロー名（省略時はデータ内の名前）
+        default_timeout (float): ステップにtimeoutの指定がない場合のタイムアウト（秒）
+    
+    Returns:
+        WorkflowPlan: 実行計画
+    """
+    if isinstance(data, dict) and 'workflow' in data:
+        name = name or data.get('name')
+        steps = data['workflow']
+    else:
+        steps = data
+    
+    hints = {}
+    plan = []
+    for index, step in enumerate(steps):
+        kind = step.get('type')
+        step_data = step.get('data', {})
+        number = step.get('step', index)
+        
+        if kind == 'screenshot':
+            coords = step_data.get('coords')
+            if coords:
+                hints[step_data['filename']] = tuple(coords)
+        elif kind == 'click':
+            image = step_data['image']
+            plan.append(PlanStep(number, 'click', image=image,
+                                 confidence=step_data.get('confidence'),
+                                 hint=hints.get(image),
+                                 timeout=step_data.get('timeout', default_timeout)))
+        elif kind == 'wait':
+            plan.append(PlanStep(number, 'wait', duration=float(step_data.get('duration', 0))))
+        else:
+            raise ValueError(f"ステップ {number}: 不明なステップ種別です: {kind}")
+    
+    return WorkflowPlan(name or "workflow", plan, source)
+
+
+def load_plan(path, default_timeout=DEFAULT_STEP_TIMEOUT):
+    """ワークフローJSONファイルを読み込んで実行計画に変換"""
+    path = Path(path)
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return compile_workflow(data, name=None if isinstance(data, dict) else path.stem,
+                            default_timeout=default_timeout, source=path)
+
+
+def _box_to_hint(match):
+    """Match を探索ヒントの形式 (x1, y1, x2, y2) に変換"""
+    return (match.left, match.top, match.left + match.width, match.top + match.height)
+
+
+class _Prefetcher:
+    """
+    別スレッドで次のステップの画像を探し、見つかった位置を覚えておく
+    
+    実行中のステップと同時に動くので、ImageClicker の設定や待機の状態は変更・参照せず、
+    スレッドセーフな locate_with_ring とキャプチャだけを使います。
+    """
+    
+    def __init__(self, clicker, step):
+        self.clicker = clicker
+        self.step = step
+        self.match = None
+        # 待機の間隔は開始時に決めておく（実行中のステップがスケジューラを変更しても影響を受けない）
+        self.interval = clicker.scheduler.latency_target
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"prefetch-{step.step}", daemon=True)
+        self._thread.start()
+    
+    def _run(self):
+        with self.clicker.tracer.span('prefetch', 'workflow', template=self.step.image) as args:
+            self._search()
+            args['found'] = self.match is not None
+    
+    def _search(self):
+        tracker = ChangeTracker()
+        while not self._stop.is_set():
+            frame = self.clicker.capture_frame()
+            regions = tracker.regions(frame)
+            if regions != []:
+                match, _ = self.clicker.locate_with_ring(self.step.image, frame, self.step.hint, regions,
+                                                         self.step.confidence)
+                if match:
+                    self.match = match
+                    return
+                tracker.mark_negative(frame)
+            self._stop.wait(self.interval)
+    
+    def finish(self):
+        """探索を止め、見つかっていれば Match を返す"""
+        self._stop.set()
+        self._thread.join()
+        return self.match
+
+
+class WorkflowEngine:
+    """
+    GUIなしでワークフローを実行するエンジン
+    
+    使用例:
+        engine = WorkflowEngine(confidence=0.8, capture="auto")
+        result = engine.run(load_plan("workflows/google_search.json"))
+        print(result['success'], result['elapsed'])
+    """
+    
+    def __init__(self, clicker=None, prefetch=True, **clicker_options):
+        """
+        Args:
+            clicker (ImageClicker): 使用するImageClicker（省略時は clicker_options から作成）
+            prefetch (bool): 実行中のステップの裏で次のステップの画像を探すかどうか
+            **clicker_options: ImageClickerの引数
+        """
+        self.clicker = clicker if clicker is not None else ImageClicker(**clicker_options)
+        self.prefetch = prefetch
+    
+    def preload(self, plan):
+        """
+        計画で使う画像をすべてデコードしてキャッシュに載せる
+        
+        Raises:
+            FileNotFoundError: 見つからない画像がある場合（実行前に失敗させる）
+        """
+        missing = [image for image in plan.images if not self.clicker.has_template(image)]
+        if missing:
+            raise FileNotFoundError(f"画像ファイルが見つかりません: {', '.join(missing)}")
+        for image in plan.images:
+            self.clicker.get_template(image)
+    
+    def _next_click(self, plan, index):
+        for step in plan.steps[index + 1:]:
+            if step.kind == 'click':
+                return step
+        return None
+    
+    def run(self, plan, on_step=None, stop_on_failure=False):
+        """
+        ワークフローを実行
+        
+        Args:
+            plan (WorkflowPlan): 実行計画（compile_workflow / load_plan の結果）
+            on_step (callable): 各ステップの開始時に on_step(番号, 総数, PlanStep) を呼ぶ
+            stop_on_failure (bool): クリックに失敗したら以降のステップを実行しない
+        
+        Returns:
+            dict: 実行結果（name, success, elapsed, preload_time, steps）
+        """
+        start = time.perf_counter()
+        with self.clicker.tracer.span('preload', 'workflow', images=len(plan.images)):
+            self.preload(plan)
+        preload_time = time.perf_counter() - start
+        self.clicker.metrics.observe('preload', preload_time)
+        
+        results = []
+        prefetcher = None
+        
+        for index, step in enumerate(plan.steps):
+            if on_step:
+                on_step(index, len(plan.steps), step)
+            
+            prefetched = None
+            if prefetcher and prefetcher.step is step:
+                prefetched = prefetcher.finish()
+                prefetcher = None
+            
+            # 次のクリック対象を探しておくと、このステップが終わった後の探索は見つけた位置の周辺だけで済む
+            following = self._next_click(plan, index) if self.prefetch else None
+            if prefetcher is None and following is not None:
+                prefetcher = _Prefetcher(self.clicker, following)
+            
+            step_start = time.perf_counter()
+            with self.clicker.tracer.span(f"step {step.step} {step.kind}", 'workflow',
+                                          template=step.image) as trace_args:
+                if step.kind == 'wait':
+                    with self.clicker.tracer.span('sleep', 'workflow', seconds=step.duration):
+                        time.sleep(step.duration)
+                    result = {'step': step.step, 'type': 'wait', 'success': True}
+                else:
+                    result = self._run_click(step, prefetched, self._next_click(plan, index))
+                trace_args['success'] = result['success']
+            result['elapsed'] = time.perf_counter() - step_start
+            self.clicker.metrics.observe(f"step_{step.kind}", result['elapsed'], step.image)
+            results.append(result)
+            
+            if not result['success'] and stop_on_failure:
+                break
+        
+        if prefetcher:
+            prefetcher.finish()
+        
+        return {
+            'name': plan.name,
+            'source': str(plan.source) if plan.source else None,
+            'success': all(r['success'] for r in results) and len(results) == len(plan.steps),
+            'elapsed': time.perf_counter() - start,
+            'preload_time': preload_time,
+            'steps': results,
+        }
+    
+    def _run_click(self, step, prefetched, following=None):
+        clicker = self.clicker
+        hint = _box_to_hint(prefetched) if prefetched else step.hint
+        # 高速クリックモードでは、次のステップの画像が現れたこともクリックが効いた証拠にする
+        expect = following.image if following is not None and following.image != step.image else None
+        
+        success = clicker.click_image(step.image, timeout=step.timeout, hint=hint, expect=expect,
+                                      confidence=step.confidence)
+        wait = clicker.last_wait or {}
+        match = clicker.last_match
+        return {
+            'step': step.step,
+            'type': 'click',
+            'image': step.image,
+            'success': success,
+            'score': match.score if match else None,
+            'position': match.center if match else None,
+            'ring': clicker.last_ring,
+            'prefetched': prefetched is not None,
+            'search_time': wait.get('elapsed'),
+            'reaction_latency': wait.get('reaction_latency'),
+            'polls': wait.get('polls'),
+            'verified': clicker.last_verify,
+            'failure': None if success else clicker.last_failure,
+        }